@@ -0,0 +1,3 @@
+"""
+性能测试工具：端到端负载测试与微基准测试
+"""
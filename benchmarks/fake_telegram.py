@@ -0,0 +1,82 @@
+"""
+本地伪造的 Telegram Bot API，供离线性能测试使用
+
+作为 python-telegram-bot 的请求后端接入，所有 API 调用都在进程内应答，
+不访问网络
+"""
+import asyncio
+import json
+import time
+from collections import Counter
+from typing import Any, Dict, Optional, Tuple
+
+from telegram.request import BaseRequest, RequestData
+
+FAKE_BOT_ID = 7000000001
+
+class FakeTelegramRequest(BaseRequest):
+    """
+    进程内应答 Bot API 调用的请求后端
+
+    按方法名返回最小可用的结果，并统计各方法的调用次数
+    """
+    def __init__(self, latency: float = 0.0):
+        """
+        初始化伪造请求后端
+
+        参数:
+            latency: 每次 API 调用的模拟延迟（秒）
+        """
+        self.latency = latency
+        self.calls = Counter()
+        self._message_id = 0
+
+    @property
+    def read_timeout(self) -> Optional[float]:
+        return None
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    async def do_request(self, url: str, method: str, request_data: Optional[RequestData] = None,
+                         read_timeout=None, write_timeout=None, connect_timeout=None,
+                         pool_timeout=None) -> Tuple[int, bytes]:
+        api_method = url.rsplit('/', 1)[-1]
+        self.calls[api_method] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        params = request_data.parameters if request_data else {}
+        result = self._result(api_method, params)
+        return 200, json.dumps({'ok': True, 'result': result}).encode()
+
+    def _result(self, api_method: str, params: Dict[str, Any]) -> Any:
+        """构造 API 方法的返回结果"""
+        if api_method == 'getMe':
+            return {
+                'id': FAKE_BOT_ID, 'is_bot': True, 'first_name': 'LoadTestBot',
+                'username': 'load_test_bot', 'can_join_groups': True,
+                'can_read_all_group_messages': True, 'supports_inline_queries': False
+            }
+        if api_method.startswith('send') or api_method.startswith('copy') or api_method.startswith('edit'):
+            self._message_id += 1
+            chat_id = params.get('chat_id', 0)
+            return {
+                'message_id': self._message_id,
+                'date': int(time.time()),
+                'chat': {'id': int(chat_id), 'type': 'supergroup' if int(chat_id) < 0 else 'private'},
+                'from': {'id': FAKE_BOT_ID, 'is_bot': True, 'first_name': 'LoadTestBot'},
+                'text': params.get('text', '')
+            }
+        if api_method == 'getChatMember':
+            user_id = int(params.get('user_id', 0))
+            return {
+                'status': 'member',
+                'user': {'id': user_id, 'is_bot': False, 'first_name': f'用户{user_id}'}
+            }
+        if api_method == 'getChat':
+            chat_id = int(params.get('chat_id', 0))
+            return {'id': chat_id, 'type': 'supergroup', 'title': f'压测群组{chat_id}'}
+        return True
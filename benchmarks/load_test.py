@@ -0,0 +1,281 @@
+"""
+离线负载测试：以固定速率向完整处理器栈注入合成的群组消息
+
+机器人通过 TelegramBot.setup_managers 和 setup_application 组装，与正式启动使用相同的管理器和处理函数，
+Telegram API 由 FakeTelegramRequest 在进程内应答，数据库使用本地 mongod
+或 mongomock（需安装 mongomock-motor）。更新通过 TelegramBot._handle_webhook 注入，
+报告吞吐量、延迟分位数以及每条更新的数据库操作数和 API 调用数。
+
+用法:
+    python -m benchmarks.load_test --rate 200 --duration 30 --groups 50
+    python -m benchmarks.load_test --mongomock --rate 100 --duration 10 --json result.json
+"""
+import os
+import sys
+
+# 测试时不需要真实的机器人令牌
+os.environ.setdefault('TELEGRAM_TOKEN', '123456:LOADTEST')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import asyncio
+import json
+import logging
+import random
+import time
+from collections import Counter
+from typing import Any, Dict, List
+
+from pymongo import monitoring
+from telegram.ext import Application
+
+from benchmarks.fake_telegram import FakeTelegramRequest
+from core.state_store import MemoryStateBackend
+from core.telegram_bot import TelegramBot
+from db.database import Database
+from db.instrumentation import db_instrumentation
+from db.models import GroupPermission
+from managers import app_context
+
+logger = logging.getLogger(__name__)
+
+# 普通聊天消息样本
+CHAT_TEXTS = [
+    '大家好', '今天天气不错', '有人在吗？', '收到，谢谢', '哈哈哈哈',
+    '明天几点开会', '这个问题我也遇到过', '👍👍👍', 'ok', '晚安各位',
+    '请问这个怎么设置', '链接在这里 https://example.com/page', '好的没问题', '+1'
+]
+
+class CommandCounter(monitoring.CommandListener):
+    """统计发送到 MongoDB 的命令数"""
+    def __init__(self):
+        self.commands = Counter()
+
+    def started(self, event):
+        self.commands[event.command_name] += 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+class _WebhookRequest:
+    """_handle_webhook 所需的最小请求对象"""
+    content_type = 'application/json'
+
+    def __init__(self, body: bytes):
+        self._body = body
+
+    async def read(self) -> bytes:
+        return self._body
+
+def percentile(values: List[float], q: float) -> float:
+    """计算分位数"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+async def drop_database(uri: str, database: str):
+    """删除上一次的测试数据库"""
+    from motor.motor_asyncio import AsyncIOMotorClient
+    client = AsyncIOMotorClient(uri)
+    try:
+        await client.drop_database(database)
+    finally:
+        client.close()
+
+async def connect_database(args) -> Database:
+    """连接测试数据库"""
+    db = Database()
+    if args.mongomock:
+        from mongomock_motor import AsyncMongoMockClient
+        db.client = AsyncMongoMockClient()
+        db.db = db.client[args.database]
+        await db.init_indexes()
+        db.connected.set()
+    else:
+        await drop_database(args.mongodb_uri, args.database)
+        if not await db.connect(args.mongodb_uri, args.database):
+            raise RuntimeError(f"无法连接到 {args.mongodb_uri}")
+    return db
+
+async def seed_data(db: Database, args) -> List[int]:
+    """创建测试群组和关键词"""
+    group_ids = [-1001000000000 - i for i in range(args.groups)]
+    permissions = [perm.value for perm in GroupPermission]
+    for group_id in group_ids:
+        await db.add_group({
+            'group_id': group_id,
+            'permissions': permissions,
+            'settings': {'auto_delete': False},
+            'feature_switches': {'keywords': True, 'stats': True, 'broadcast': True}
+        })
+        for i in range(args.keywords):
+            await db.add_keyword({
+                'group_id': group_id,
+                'pattern': f'关键词{i}',
+                'type': 'text',
+                'response': f'这是关键词{i}的回复',
+                'match_type': 'exact' if i % 4 else 'regex'
+            })
+    return group_ids
+
+async def build_bot(db: Database, request: FakeTelegramRequest) -> TelegramBot:
+    """使用 TelegramBot 自身的管理器和处理函数组装机器人，省略Web服务器、Webhook和恢复机制"""
+    bot = TelegramBot()
+    bot.db = db
+    app_context.register_db(db)
+    await bot.setup_managers(MemoryStateBackend())
+    await bot.setup_application(
+        Application.builder()
+        .token(os.environ['TELEGRAM_TOKEN'])
+        .request(request)
+        .get_updates_request(FakeTelegramRequest())
+        .updater(None)
+        .build()
+    )
+    bot.running = True
+    return bot
+
+async def shutdown_bot(bot: TelegramBot):
+    """停止机器人的后台任务"""
+    bot.running = False
+    await bot.stats_manager.stop()
+    await bot.settings_manager.stop()
+    await bot.auto_delete_manager.shutdown()
+    await bot.application.shutdown()
+
+def make_update(update_id: int, group_id: int, message_id: int, user_id: int, text: str) -> bytes:
+    """构造群组文本消息更新"""
+    return json.dumps({
+        'update_id': update_id,
+        'message': {
+            'message_id': message_id,
+            'date': int(time.time()),
+            'chat': {'id': group_id, 'type': 'supergroup', 'title': f'压测群组{group_id}'},
+            'from': {'id': user_id, 'is_bot': False, 'first_name': f'用户{user_id}'},
+            'text': text
+        }
+    }).encode()
+
+async def run_load(bot: TelegramBot, group_ids: List[int], args) -> Dict[str, Any]:
+    """按固定速率注入更新，返回延迟和状态统计"""
+    rng = random.Random(args.seed)
+    message_ids = {group_id: 0 for group_id in group_ids}
+    latencies = []
+    statuses = Counter()
+    total = int(args.rate * args.duration)
+    tasks = []
+
+    async def deliver(body: bytes):
+        start = time.perf_counter()
+        response = await bot._handle_webhook(_WebhookRequest(body))
+        latencies.append(time.perf_counter() - start)
+        statuses[response.status] += 1
+
+    start = time.perf_counter()
+    for i in range(total):
+        delay = start + i / args.rate - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+        group_id = rng.choice(group_ids)
+        message_ids[group_id] += 1
+        if args.keywords and rng.random() < args.keyword_ratio:
+            text = f'关键词{rng.randrange(args.keywords)}'
+        else:
+            text = rng.choice(CHAT_TEXTS)
+        body = make_update(i + 1, group_id, message_ids[group_id], rng.randint(1, args.users), text)
+        tasks.append(asyncio.create_task(deliver(body)))
+
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - start
+    return {'total': total, 'elapsed': elapsed, 'latencies': latencies, 'statuses': statuses}
+
+def build_report(result: Dict[str, Any], db_calls: int, mongo: CommandCounter,
+                 request: FakeTelegramRequest, args) -> Dict[str, Any]:
+    """汇总测试结果"""
+    total = result['total']
+    latencies = result['latencies']
+    return {
+        'config': {
+            'rate': args.rate, 'duration': args.duration, 'groups': args.groups,
+            'users': args.users, 'keywords': args.keywords, 'keyword_ratio': args.keyword_ratio,
+            'api_latency_ms': args.api_latency_ms, 'backend': 'mongomock' if args.mongomock else 'mongod'
+        },
+        'updates': total,
+        'statuses': {str(status): count for status, count in sorted(result['statuses'].items())},
+        'elapsed_seconds': round(result['elapsed'], 3),
+        'throughput_per_second': round(total / result['elapsed'], 2) if result['elapsed'] else 0,
+        'latency_ms': {
+            'p50': round(percentile(latencies, 0.50) * 1000, 2),
+            'p95': round(percentile(latencies, 0.95) * 1000, 2),
+            'p99': round(percentile(latencies, 0.99) * 1000, 2),
+            'max': round(max(latencies) * 1000, 2) if latencies else 0
+        },
+        'db_calls_per_update': round(db_calls / total, 2) if total else 0,
+        'mongo_commands_per_update': round(sum(mongo.commands.values()) / total, 2) if total else 0,
+        'mongo_commands': dict(mongo.commands.most_common()),
+        'api_calls': dict(request.calls.most_common())
+    }
+
+def print_report(report: Dict[str, Any]):
+    """输出测试报告"""
+    latency = report['latency_ms']
+    print(f"更新数:           {report['updates']}  状态: {report['statuses']}")
+    print(f"耗时:             {report['elapsed_seconds']}s")
+    print(f"吞吐量:           {report['throughput_per_second']} 条/秒")
+    print(f"延迟(ms):         p50={latency['p50']} p95={latency['p95']} p99={latency['p99']} max={latency['max']}")
+    print(f"Database调用/条:  {report['db_calls_per_update']}")
+    print(f"Mongo命令/条:     {report['mongo_commands_per_update']}  {report['mongo_commands']}")
+    print(f"Telegram API调用: {report['api_calls']}")
+
+async def main(args):
+    mongo = CommandCounter()
+    monitoring.register(mongo)
+    request = FakeTelegramRequest(latency=args.api_latency_ms / 1000)
+
+    db = await connect_database(args)
+    group_ids = await seed_data(db, args)
+    bot = await build_bot(db, request)
+
+    # 只统计注入阶段的操作
+    db_instrumentation.configure(enabled=True)
+    db_instrumentation.reset()
+    mongo.commands.clear()
+    request.calls.clear()
+
+    try:
+        result = await run_load(bot, group_ids, args)
+    finally:
+        await shutdown_bot(bot)
+        await db.close()
+
+    db_calls = sum(row['count'] for row in db_instrumentation.snapshot())
+    report = build_report(result, db_calls, mongo, request, args)
+    print_report(report)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='离线负载测试')
+    parser.add_argument('--rate', type=float, default=100, help='每秒注入的消息数')
+    parser.add_argument('--duration', type=float, default=10, help='注入时长（秒）')
+    parser.add_argument('--groups', type=int, default=20, help='群组数')
+    parser.add_argument('--users', type=int, default=500, help='用户数')
+    parser.add_argument('--keywords', type=int, default=20, help='每个群组的关键词数')
+    parser.add_argument('--keyword-ratio', type=float, default=0.05, help='命中关键词的消息比例')
+    parser.add_argument('--api-latency-ms', type=float, default=0, help='模拟的Telegram API延迟')
+    parser.add_argument('--mongodb-uri', default='mongodb://localhost:27017')
+    parser.add_argument('--database', default='telegram_bot_loadtest')
+    parser.add_argument('--mongomock', action='store_true', help='使用mongomock代替本地mongod')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', help='将结果写入JSON文件')
+    return parser.parse_args(argv)
+
+if __name__ == '__main__':
+    logging.getLogger().setLevel(logging.WARNING)
+    asyncio.run(main(parse_args()))
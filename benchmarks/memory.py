@@ -0,0 +1,96 @@
+"""
+缓存内存基准测试：比较以原始字典和不可变模型缓存文档时的内存占用
+
+覆盖:
+    - Keyword：KeywordCache 中缓存的关键词
+    - User：用户文档
+    - Broadcast：重试队列中保存的轮播消息
+
+用法:
+    python -m benchmarks.memory                    # 每种模型10万条
+    python -m benchmarks.memory -n 20000           # 指定条数
+"""
+import os
+import sys
+
+os.environ.setdefault('TELEGRAM_TOKEN', '123456:LOADTEST')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import gc
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List
+
+from bson import ObjectId
+
+def make_keyword(i: int, now: datetime) -> Dict[str, Any]:
+    """生成与数据库中格式相同的关键词文档"""
+    return {
+        '_id': ObjectId(), 'group_id': -1000000000000 - i % 50, 'pattern': f'关键词{i}',
+        'type': 'exact', 'response': f'回复内容{i}', 'media': None, 'buttons': [],
+        'created_at': now, 'updated_at': now,
+    }
+
+def make_user(i: int, now: datetime) -> Dict[str, Any]:
+    """生成与数据库中格式相同的用户文档"""
+    return {
+        '_id': ObjectId(), 'user_id': 100000000 + i, 'role': 'user', 'username': f'user{i}',
+        'first_name': f'用户{i}', 'last_name': None, 'is_banned': False, 'total_messages': i % 1000,
+        'created_at': now, 'updated_at': now,
+    }
+
+def make_broadcast(i: int, now: datetime) -> Dict[str, Any]:
+    """生成与数据库中格式相同的轮播消息文档"""
+    return {
+        '_id': ObjectId(), 'group_id': -1000000000000 - i % 50, 'text': f'轮播内容{i}',
+        'media': None, 'buttons': [], 'start_time': now, 'end_time': now + timedelta(days=30),
+        'repeat_type': 'hourly', 'interval': 60, 'schedule_time': None, 'last_broadcast': None,
+        'created_at': now, 'updated_at': now,
+    }
+
+def measure(build: Callable[[], List[Any]]) -> int:
+    """返回 build 构造的对象在构造后仍占用的字节数"""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    objects = build()
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del objects
+    return used
+
+def run_case(name: str, model, make: Callable[[int, datetime], Dict[str, Any]], count: int):
+    """比较一种模型以字典和模型缓存时的内存与构造耗时"""
+    now = datetime.now()
+    # 嵌套的值（ObjectId、字符串、时间）两种表示共享，只统计容器本身
+    docs = [make(i, now) for i in range(count)]
+    dict_bytes = measure(lambda: [dict(doc) for doc in docs])
+    model_bytes = measure(lambda: [model.from_dict(doc) for doc in docs])
+
+    from_dict = model.from_dict
+    start = time.perf_counter()
+    for doc in docs:
+        from_dict(doc)
+    per_call = (time.perf_counter() - start) / count
+
+    print(f"{name:<10} 字典 {dict_bytes / count:7.1f} B/条 {dict_bytes / 2 ** 20:7.1f} MiB | "
+          f"模型 {model_bytes / count:7.1f} B/条 {model_bytes / 2 ** 20:7.1f} MiB | "
+          f"节省 {1 - model_bytes / dict_bytes:6.1%} | from_dict {per_call * 1e6:.2f} µs")
+
+def main(args) -> int:
+    from db.models import Broadcast, Keyword, User
+    print(f"每种模型 {args.count} 条")
+    run_case('Keyword', Keyword, make_keyword, args.count)
+    run_case('User', User, make_user, args.count)
+    run_case('Broadcast', Broadcast, make_broadcast, args.count)
+    return 0
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='缓存内存基准测试')
+    parser.add_argument('-n', '--count', type=int, default=100000, help='每种模型的条数')
+    return parser.parse_args(argv)
+
+if __name__ == '__main__':
+    sys.exit(main(parse_args()))
@@ -0,0 +1,312 @@
+"""
+热点函数微基准测试，结果与 JSON 基线比较以发现性能回退
+
+覆盖:
+    - KeywordManager.match_keyword：不同关键词数量和匹配类型
+    - format_rank_rows / get_string_display_width：中文与表情用户名
+    - _should_send_broadcast / _calculate_next_send_time：大量轮播消息
+    - CallbackHandler.handle：按前缀分发
+
+用法:
+    python -m benchmarks.micro                 # 运行并与基线比较，回退时返回非零退出码
+    python -m benchmarks.micro --save          # 运行并写入基线
+    python -m benchmarks.micro -k keyword      # 只运行名称包含 keyword 的用例
+"""
+import os
+import sys
+
+os.environ.setdefault('TELEGRAM_TOKEN', '123456:LOADTEST')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import asyncio
+import json
+import logging
+import platform
+import random
+import statistics
+import time
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Tuple
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines.json')
+
+# 已注册的用例 {名称: 构造函数}，构造函数返回待测的协程函数
+BENCHMARKS: Dict[str, Callable[[], Awaitable[Callable[[], Awaitable[Any]]]]] = {}
+
+def benchmark(name: str):
+    """注册基准测试用例"""
+    def decorator(factory):
+        BENCHMARKS[name] = factory
+        return factory
+    return decorator
+
+#######################################
+# 测试数据
+#######################################
+
+CJK_NAMES = ['张伟', '王秀英', '李娜娜', '刘洋', '陈静', '杨帆', '赵敏', '黄晓明']
+EMOJI_NAMES = ['🌟小星星🌟', '🐱猫猫', 'Alice 🎉', '🔥🔥火火🔥🔥', 'Bob_的_账号😀']
+LONG_NAMES = ['这是一个非常非常长的中文昵称用于测试截断逻辑', 'An Extremely Long Latin Display Name Here']
+
+# 固定的当前时间，测试数据和被测代码都使用它，结果与运行时刻无关
+FIXTURE_NOW = datetime(2024, 1, 15, 12, 0)
+
+class FixedDatetime(datetime):
+    """now() 固定返回 FIXTURE_NOW 的 datetime"""
+    @classmethod
+    def now(cls, tz=None):
+        return FIXTURE_NOW
+
+class KeywordStore:
+    """内存中的关键词集合，提供 match_keyword 所需的 iter_keywords 和 keyword_cache"""
+    def __init__(self, keywords: List[Dict[str, Any]]):
+        from db.keyword_cache import KeywordCache
+        self.keywords = keywords
+        self.keyword_cache = KeywordCache()
+
+    async def iter_keywords(self, group_id: int) -> AsyncIterator[Dict[str, Any]]:
+        for keyword in self.keywords:
+            yield keyword
+
+def make_keywords(count: int, regex_ratio: float) -> List[Dict[str, Any]]:
+    """生成关键词"""
+    keywords = []
+    regex_count = int(count * regex_ratio)
+    for i in range(count):
+        if i < regex_count:
+            keywords.append({'_id': f'kw{i}', 'pattern': rf'^(价格|报价){i}\d*$', 'match_type': 'regex'})
+        else:
+            keywords.append({'_id': f'kw{i}', 'pattern': f'关键词{i}', 'match_type': 'exact'})
+    return keywords
+
+def make_broadcasts(count: int) -> List[Dict[str, Any]]:
+    """生成覆盖各重复类型的轮播消息"""
+    rng = random.Random(1)
+    now = FIXTURE_NOW
+    broadcasts = []
+    for i in range(count):
+        repeat_type = ('once', 'hourly', 'daily', 'custom')[i % 4]
+        broadcasts.append({
+            '_id': f'bc{i}',
+            'group_id': -1000000000000 - i % 50,
+            'start_time': now - timedelta(days=rng.randint(1, 30)),
+            'end_time': now + timedelta(days=rng.randint(1, 30)),
+            'repeat_type': repeat_type,
+            'interval': rng.choice([5, 15, 30, 60, 120]),
+            'schedule_time': f"{rng.randint(0, 23)}:{rng.randint(0, 59):02d}",
+            'last_broadcast': now - timedelta(minutes=rng.randint(1, 600)) if i % 3 else None
+        })
+    return broadcasts
+
+#######################################
+# 关键词匹配
+#######################################
+
+def _keyword_case(count: int, regex_ratio: float, hit: str):
+    async def factory():
+        from managers.keyword_manager import KeywordManager
+        manager = KeywordManager(KeywordStore(make_keywords(count, regex_ratio)), apply_defaults=False)
+        texts = {
+            'miss': '今天大家都在聊什么呢',
+            'exact_last': f'关键词{count - 1}',
+            'regex_last': f'报价{int(count * regex_ratio) - 1}',
+        }
+        text = texts[hit]
+
+        async def run():
+            return await manager.match_keyword(-100, text, None)
+        return run
+    return factory
+
+for _count in (10, 100, 1000):
+    benchmark(f'keyword_match[exact-{_count}-miss]')(_keyword_case(_count, 0.0, 'miss'))
+    benchmark(f'keyword_match[exact-{_count}-hit]')(_keyword_case(_count, 0.0, 'exact_last'))
+    benchmark(f'keyword_match[regex50-{_count}-miss]')(_keyword_case(_count, 0.5, 'miss'))
+    benchmark(f'keyword_match[regex50-{_count}-hit]')(_keyword_case(_count, 0.5, 'regex_last'))
+
+#######################################
+# 排行榜格式化
+#######################################
+
+@benchmark('display_width[cjk_emoji]')
+async def _display_width():
+    from handlers.command_handlers import get_string_display_width
+    names = CJK_NAMES + EMOJI_NAMES + LONG_NAMES
+
+    async def run():
+        for name in names:
+            get_string_display_width(name)
+    return run
+
+@benchmark('format_rank_rows[15]')
+async def _format_rank_rows():
+    from handlers.command_handlers import format_rank_rows, memory_cache
+    names = CJK_NAMES + EMOJI_NAMES + LONG_NAMES
+    stats = [{'_id': 1000 + i, 'total_messages': 500 - i * 7} for i in range(15)]
+    # 预先填充用户名缓存，避免调用 Telegram API
+    for i, stat in enumerate(stats):
+        await memory_cache.set(f"-100:{stat['_id']}", names[i % len(names)], 86400)
+    context = SimpleNamespace(bot=None)
+
+    async def run():
+        return await format_rank_rows(stats, 1, -100, context)
+    return run
+
+#######################################
+# 轮播调度
+#######################################
+
+def _broadcast_case(method: str, count: int):
+    async def factory():
+        import managers.enhanced_broadcast_manager as broadcast_module
+        from managers.enhanced_broadcast_manager import EnhancedBroadcastManager
+        broadcast_module.datetime = FixedDatetime
+        manager = EnhancedBroadcastManager(SimpleNamespace(), SimpleNamespace(), apply_defaults=False)
+        manager.cache_cleanup_task.cancel()
+        broadcasts = make_broadcasts(count)
+
+        if method == 'should_send':
+            async def run():
+                for broadcast in broadcasts:
+                    await manager._should_send_broadcast(dict(broadcast))
+        else:
+            async def run():
+                for broadcast in broadcasts:
+                    manager._calculate_next_send_time(broadcast)
+        return run
+    return factory
+
+benchmark('should_send_broadcast[1000]')(_broadcast_case('should_send', 1000))
+benchmark('calculate_next_send_time[1000]')(_broadcast_case('next_send_time', 1000))
+
+#######################################
+# 回调分发
+#######################################
+
+# 与 register_all_handlers 中的注册顺序一致
+CALLBACK_PREFIXES = [
+    'settings_', 'auto_delete_', 'auto_delete:', 'switch_toggle_', 'stats_edit_',
+    'kwform_', 'keyword_detail_', 'keyword_preview_', 'keyword_delete_',
+    'keyword_confirm_delete_', 'keyword_list_page_',
+    'bcform_', 'broadcast_detail_', 'bc_preview_', 'bc_delete_', 'bc_confirm_delete_',
+    'bc_recalibrate_', 'bc_force_send_', 'bc_edit_', 'bc_save_edit_',
+    'rank_page_', 'rank_next_', 'rank_prev_', 'show_manageable_groups', 'gpick_'
+]
+
+def _callback_case(data: str):
+    async def factory():
+        from core.callback_handler import CallbackHandler
+        handler = CallbackHandler()
+
+        async def noop(update, context, data):
+            pass
+        for prefix in CALLBACK_PREFIXES:
+            handler.register(prefix, noop)
+        update = SimpleNamespace(callback_query=SimpleNamespace(data=data))
+
+        async def run():
+            return await handler.handle(update, None)
+        return run
+    return factory
+
+benchmark('callback_dispatch[first]')(_callback_case('settings_select_-1001234567890'))
+benchmark('callback_dispatch[middle]')(_callback_case('bc_preview_65f0c2a1b3e4d5f6a7b8c9d0'))
+benchmark('callback_dispatch[last]')(_callback_case('gpick_settings_page_2'))
+benchmark('callback_dispatch[unmatched]')(_callback_case('unknown_action_1'))
+benchmark('callback_dispatch[compact]')(_callback_case('~bdZfDCobPk1fanuMnQo8vY46M6'))
+
+#######################################
+# 运行与基线比较
+#######################################
+
+async def measure(run: Callable[[], Awaitable[Any]], rounds: int, min_time: float) -> Dict[str, float]:
+    """
+    测量单次调用耗时
+
+    先校准每轮的调用次数，使每轮至少持续 min_time 秒，再执行多轮取统计值
+
+    返回:
+        每次调用的耗时统计（微秒）
+    """
+    iterations = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(iterations):
+            await run()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            break
+        iterations *= 2 if elapsed < min_time / 10 else max(2, int(min_time / elapsed) + 1)
+
+    samples = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for _ in range(iterations):
+            await run()
+        samples.append((time.perf_counter() - start) / iterations * 1e6)
+    return {
+        'median_us': round(statistics.median(samples), 3),
+        'min_us': round(min(samples), 3),
+        'iterations': iterations
+    }
+
+def compare(results: Dict[str, Dict[str, float]], baseline: Dict[str, Any],
+            tolerance: float) -> List[Tuple[str, float, float]]:
+    """
+    与基线比较，使用各轮中的最小值以降低系统噪声的影响
+
+    返回:
+        回退的用例列表 [(名称, 基线耗时, 当前耗时)]
+    """
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get('results', {}).get(name)
+        if base and result['min_us'] > base['min_us'] * (1 + tolerance):
+            regressions.append((name, base['min_us'], result['min_us']))
+    return regressions
+
+async def main(args) -> int:
+    logging.disable(logging.CRITICAL)
+    results = {}
+    for name, factory in BENCHMARKS.items():
+        if args.k and args.k not in name:
+            continue
+        run = await factory()
+        results[name] = await measure(run, args.rounds, args.min_time)
+        print(f"{name:<40} {results[name]['median_us']:>12.2f} us  (min {results[name]['min_us']:.2f})")
+
+    if args.save:
+        baseline = {'python': platform.python_version(), 'machine': platform.machine(), 'results': {}}
+        if os.path.exists(args.baseline):
+            with open(args.baseline, encoding='utf-8') as f:
+                baseline = json.load(f)
+        baseline['results'].update(results)
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(baseline, f, ensure_ascii=False, indent=2, sort_keys=True)
+        print(f"基线已写入 {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print("未找到基线文件，使用 --save 生成")
+        return 0
+    with open(args.baseline, encoding='utf-8') as f:
+        baseline = json.load(f)
+    regressions = compare(results, baseline, args.tolerance)
+    for name, before, after in regressions:
+        print(f"性能回退: {name} {before:.2f}us -> {after:.2f}us (+{(after / before - 1) * 100:.0f}%)")
+    return 1 if regressions else 0
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='微基准测试')
+    parser.add_argument('-k', help='只运行名称包含该字符串的用例')
+    parser.add_argument('--save', action='store_true', help='将结果写入基线')
+    parser.add_argument('--baseline', default=BASELINE_FILE, help='基线文件路径')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='允许的耗时回退比例')
+    parser.add_argument('--rounds', type=int, default=5, help='每个用例的测量轮数')
+    parser.add_argument('--min-time', type=float, default=0.05, help='每轮最短时长（秒）')
+    return parser.parse_args(argv)
+
+if __name__ == '__main__':
+    sys.exit(asyncio.run(main(parse_args())))
@@ -41,6 +41,35 @@ DEFAULT_GROUPS = [
 TIMEZONE_STR = os.getenv('TIMEZONE', 'Asia/Shanghai')
 TIMEZONE = pytz.timezone(TIMEZONE_STR)
 
+# 日志设置
+LOGGING_SETTINGS = {
+    'profile': os.getenv('LOG_PROFILE', 'development'),
+    'file': 'bot.log',
+    'profiles': {
+        # 开发环境：INFO级别，不采样不限流
+        'development': {
+            'level': 'INFO',
+        },
+        # 生产环境：消息热路径日志按日志器限流，超出每秒预算的INFO/DEBUG日志直接丢弃
+        'production': {
+            'level': 'INFO',
+            'hot_loggers': {
+                'handlers.message_handlers': {'max_per_second': 20},
+                'managers.keyword_manager': {'max_per_second': 10},
+                'managers.stats_manager': {'sample': 0.1, 'max_per_second': 10},
+                'handlers.command_auto_delete_middleware': {'max_per_second': 5},
+                'managers.enhanced_broadcast_manager': {'max_per_second': 20},
+                'managers.broadcast_manager': {'max_per_second': 20},
+                'db.database': {'max_per_second': 20},
+            },
+            'levels': {
+                'httpx': 'WARNING',
+                'aiohttp.access': 'WARNING',
+            },
+        },
+    },
+}
+
 # 统计设置
 DEFAULT_SETTINGS = {
     'min_bytes': 0,              # 默认最低字节数
@@ -50,6 +79,18 @@ DEFAULT_SETTINGS = {
     'cleanup_days': 30,          # 统计数据保留天数
 }
 
+# 统计摘要设置
+STATS_SUMMARY_SETTINGS = {
+    'window_days': 30,           # 摘要覆盖的天数（1~62）
+    'refresh_interval': 3600,    # 摘要重建间隔（秒）
+}
+
+# 统计去重设置
+STATS_DEDUPE_SETTINGS = {
+    'window_size': 1024,         # 每个群组追踪的最近消息ID数量
+    'max_chats': 10000,          # 同时追踪的最大群组数
+}
+
 # 轮播消息设置
 BROADCAST_SETTINGS = {
     'min_interval': 5,           # 最小轮播间隔（分钟）
@@ -94,6 +135,18 @@ STATE_MANAGEMENT_SETTINGS = {
     'max_concurrent_states': 5   # 每个用户最大并发状态数
 }
 
+# 设置流程状态配置
+SETTING_STATE_SETTINGS = {
+    'state_timeout': 600,        # 设置状态无操作后的过期时间（秒）
+    'wheel_tick': 60,            # 过期时间轮的刻度（秒），过期清理按刻度进行
+}
+
+# 交互状态持久化配置（多步表单）
+STATE_PERSISTENCE_SETTINGS = {
+    'ttl': 86400,                # 持久化状态的有效期（秒），由MongoDB TTL索引删除
+    'hot_size': 1000,            # 内存中保留的活跃用户状态数
+}
+
 # 消息回调配置
 CALLBACK_SETTINGS = {
     'answer_timeout': 10,        # 回调应答超时时间（秒）
@@ -107,6 +160,32 @@ ERROR_HANDLING_SETTINGS = {
     'error_report_channel': None # 错误报告频道ID
 }
 
+# 数据库埋点设置
+DB_INSTRUMENTATION_SETTINGS = {
+    'enabled': True,             # 是否记录Database方法的调用统计（可用 /dbstats on|off 运行时切换）
+    'slow_threshold_ms': 200,    # 超过该耗时的操作记录慢查询日志
+    'sample_size': 1024,         # 每个方法用于计算分位数的最近样本数
+}
+
+# 采样分析设置（/profile 命令）
+PROFILER_SETTINGS = {
+    'default_seconds': 10,       # 默认采样时长
+    'max_seconds': 60,           # 允许的最长采样时长
+    'interval_ms': 5,            # 采样间隔
+}
+
+# 群组标题目录设置
+GROUP_DIRECTORY_SETTINGS = {
+    'refresh_concurrency': 5,    # 后台刷新标题时并发的 get_chat 请求数
+    'title_ttl_hours': 168,      # 标题超过该时长未更新时在下次显示菜单时后台刷新
+    'page_size': 10,             # 群组选择菜单每页显示的群组数
+}
+
+# Webhook设置
+WEBHOOK_SETTINGS = {
+    'update_dedupe_window': 4096,  # 追踪的最近update_id数量，用于丢弃重复投递
+}
+
 # 防休眠设置
 KEEP_ALIVE_INTERVAL = 300        # 防休眠请求间隔（秒）
 
@@ -71,6 +71,12 @@ def validate_config(config_module):
         if min_interval < 1:  # 最小1分钟
             raise ConfigValidationError(f"最小轮播间隔({min_interval})不能小于1分钟")
             
+        # 验证统计摘要窗口，活跃天位图须保持在有符号64位整数范围内
+        summary_settings = getattr(config_module, 'STATS_SUMMARY_SETTINGS', {})
+        window_days = summary_settings.get('window_days', 30)
+        if not 0 < window_days <= 62:
+            raise ConfigValidationError(f"统计摘要窗口天数({window_days})必须在1到62之间")
+            
         # 验证时区设置
         timezone_str = getattr(config_module, 'TIMEZONE_STR', None)
         if not timezone_str:
@@ -9,6 +9,12 @@ from core.state_machine import (
     FormStateMachine, 
     StateMachineManager
 )
+from core.state_store import (
+    StateBackend,
+    MemoryStateBackend,
+    MongoStateBackend,
+    PersistentStateStore
+)
 
 # 将TelegramBot的导入移到最后，并改为函数导入方式
 __all__ = [
@@ -19,6 +25,10 @@ __all__ = [
     'StateMachine',
     'FormStateMachine',
     'StateMachineManager',
+    'StateBackend',
+    'MemoryStateBackend',
+    'MongoStateBackend',
+    'PersistentStateStore',
     'get_telegram_bot'
 ]
 
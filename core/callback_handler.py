@@ -2,32 +2,142 @@
 统一的回调处理框架，用于管理和分发回调查询
 """
 import logging
+import time
 from typing import Dict, Callable, Any, List, Tuple, Optional
 from telegram import Update
 from telegram.ext import CallbackContext
 
+from utils.callback_codec import callback_codec
+from utils.metrics import HANDLER_LATENCY, metrics
+
 logger = logging.getLogger(__name__)
 
+UNMATCHED_CALLBACKS = metrics.counter(
+    'bot_callback_unmatched_total', '未找到处理函数的回调查询数'
+)
+EXPIRED_CALLBACKS = metrics.counter(
+    'bot_callback_expired_total', '令牌过期或无法解码的紧凑回调数据数'
+)
+
+class CallbackData(str):
+    """
+    路由后的回调数据
+
+    仍是原始回调字符串，兼容按字符串解析的处理函数；另外携带
+    匹配到的前缀、前缀之后的负载以及参数。未指定参数类型时参数在首次访问时才解析，
+    不使用 args 的处理函数无需承担解析开销
+    """
+    __slots__ = ('prefix', 'payload', '_args')
+
+    def __new__(cls, data: str, prefix: str, args: Optional[Tuple[Any, ...]] = None):
+        obj = super().__new__(cls, data)
+        obj.prefix = prefix
+        obj.payload = data[len(prefix):]
+        obj._args = args
+        return obj
+
+    @property
+    def args(self) -> Tuple[Any, ...]:
+        """负载按 '_' 拆分后的参数，整数形式的参数转换为int"""
+        if self._args is None:
+            payload = self.payload
+            self._args = tuple(_auto_arg(part) for part in payload.split('_')) if payload else ()
+        return self._args
+
+def _auto_arg(part: str) -> Any:
+    """整数形式的参数转换为int，其余保持字符串"""
+    try:
+        return int(part)
+    except ValueError:
+        return part
+
+class _TrieNode:
+    """前缀树节点"""
+    __slots__ = ('children', 'route')
+
+    def __init__(self):
+        self.children: Dict[str, '_TrieNode'] = {}
+        self.route: Optional[Tuple[str, Callable, Optional[Tuple[Callable, ...]]]] = None
+
 class CallbackHandler:
     """
     统一的回调处理框架，管理并分发回调查询到对应的处理函数
+
+    前缀存放在字符前缀树中，分发时取最长匹配前缀，耗时只与回调数据长度有关，
+    与注册顺序和前缀数量无关
     """
     def __init__(self):
         """初始化回调处理器"""
         self.handlers: Dict[str, Callable] = {}  # 前缀到处理函数的映射
+        self._root = _TrieNode()
         logger.info("初始化回调处理器")
         
-    def register(self, prefix: str, handler: Callable):
+    def register(self, prefix: str, handler: Callable, arg_types: Optional[Tuple[Callable, ...]] = None):
         """
         注册回调处理函数
         
         参数:
             prefix: 回调数据前缀
-            handler: 处理函数，接收(update, context, data)参数
+            handler: 处理函数，接收(update, context, data)参数，data 为 CallbackData
+            arg_types: 负载按 '_' 拆分后各参数的类型，最后一个参数包含剩余部分；
+                为None时参数在首次访问时解析，整数形式的参数自动转换为int
         """
+        node = self._root
+        for char in prefix:
+            node = node.children.setdefault(char, _TrieNode())
+        node.route = (prefix, handler, arg_types)
         self.handlers[prefix] = handler
         logger.info(f"已注册回调处理函数: {prefix}")
         
+    def route(self, data: str) -> Optional[Tuple[Callable, CallbackData]]:
+        """
+        查找最长匹配前缀的处理函数并解析参数
+        
+        紧凑编码的回调数据先解码为原始格式，参数直接使用解码出的类型化参数
+        
+        参数:
+            data: 回调数据字符串
+            
+        返回:
+            (处理函数, 解析后的回调数据)，没有匹配、参数类型不符或无法解码时返回None
+        """
+        decoded_args = encoded_prefix = None
+        if callback_codec.is_encoded(data):
+            decoded = callback_codec.decode(data)
+            if decoded is None:
+                return None
+            encoded_prefix = callback_codec.prefix_of(data)
+            data, decoded_args = decoded
+        
+        node = self._root
+        matched = node.route
+        for char in data:
+            node = node.children.get(char)
+            if node is None:
+                break
+            if node.route is not None:
+                matched = node.route
+        if matched is None:
+            return None
+        
+        prefix, handler, arg_types = matched
+        if prefix == encoded_prefix:
+            # 匹配的前缀与编码时的前缀一致，直接使用解码出的参数
+            args = decoded_args
+        elif arg_types is None:
+            # 参数在首次访问 CallbackData.args 时解析
+            args = None
+        else:
+            payload = data[len(prefix):]
+            parts = payload.split('_', len(arg_types) - 1) if arg_types else []
+            if len(parts) != len(arg_types):
+                return None
+            try:
+                args = tuple(convert(part) for convert, part in zip(arg_types, parts))
+            except ValueError:
+                return None
+        return handler, CallbackData(data, prefix, args)
+        
     async def handle(self, update: Update, context: CallbackContext) -> bool:
         """
         处理回调查询
@@ -47,20 +157,28 @@ class CallbackHandler:
         if not data:
             return False
         
-        # 尝试匹配处理函数
-        for prefix, handler in self.handlers.items():
-            if data.startswith(prefix):
-                try:
-                    # 调用匹配的处理函数
-                    await handler(update, context, data)
-                    return True
-                except Exception as e:
-                    logger.error(f"处理回调 {prefix} 出错: {e}", exc_info=True)
-                    await self.handle_error(update, e)
-                    return True
-        
-        logger.warning(f"未找到回调处理函数: {data}")
-        return False
+        routed = self.route(data)
+        if routed is None and callback_codec.is_encoded(data):
+            EXPIRED_CALLBACKS.inc()
+            logger.info(f"回调数据已过期或无效: {data}")
+            await query.answer("按钮已过期，请重新打开菜单", show_alert=True)
+            return True
+        if routed is None:
+            UNMATCHED_CALLBACKS.inc()
+            logger.warning(f"未找到回调处理函数: {data}")
+            return False
+        
+        handler, callback_data = routed
+        start = time.perf_counter()
+        try:
+            # 调用匹配的处理函数
+            await handler(update, context, callback_data)
+        except Exception as e:
+            logger.error(f"处理回调 {callback_data.prefix} 出错: {e}", exc_info=True)
+            await self.handle_error(update, e)
+        finally:
+            HANDLER_LATENCY.observe(time.perf_counter() - start, kind='callback', name=callback_data.prefix)
+        return True
     
     async def handle_error(self, update: Update, error: Exception):
         """
@@ -77,8 +195,7 @@ class CallbackHandler:
             except Exception as e:
                 logger.error(f"错误处理失败: {e}")
     
-    @staticmethod
-    def parse_data(data: str) -> Tuple[str, List[str]]:
+    def parse_data(self, data: str) -> Tuple[str, List[Any]]:
         """
         解析回调数据
         
@@ -86,23 +203,13 @@ class CallbackHandler:
             data: 回调数据字符串
             
         返回:
-            (前缀, 参数列表)
+            (匹配的前缀, 参数列表)，没有匹配时返回 (data, [])
         """
-        parts = data.split('_')
-        if len(parts) < 2:
+        routed = self.route(data)
+        if routed is None:
             return data, []
-        
-        # 确定前缀的长度
-        prefix_parts = 1
-        for i in range(1, min(3, len(parts))):
-            potential_prefix = '_'.join(parts[:i])
-            if potential_prefix in ["settings", "kwform", "bcform", "auto_delete", "switch_toggle"]:
-                prefix_parts = i
-                break
-        
-        prefix = '_'.join(parts[:prefix_parts])
-        args = parts[prefix_parts:]
-        return prefix, args
+        _, callback_data = routed
+        return callback_data.prefix, list(callback_data.args)
     
     @staticmethod
     def build_data(*parts: Any) -> str:
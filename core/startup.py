@@ -0,0 +1,143 @@
+"""
+启动依赖图，并发执行互不依赖的初始化步骤并记录各阶段耗时
+"""
+import asyncio
+import inspect
+import logging
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# 各启动步骤的耗时
+STARTUP_STEP_SECONDS = metrics.gauge(
+    'bot_startup_step_seconds', '启动步骤耗时', ('step', 'phase')
+)
+
+class StartupStep:
+    """启动图中的单个步骤"""
+    __slots__ = ('name', 'func', 'requires', 'deferred', 'status', 'started', 'duration', 'error')
+
+    def __init__(self, name: str, func: Callable[[], Any], requires: Iterable[str], deferred: bool):
+        self.name = name
+        self.func = func
+        self.requires = tuple(requires)
+        self.deferred = deferred
+        self.status = 'pending'  # pending / ok / failed / skipped
+        self.started = None      # 相对启动开始的偏移（秒）
+        self.duration = None
+        self.error = None
+
+class StartupGraph:
+    """
+    启动依赖图
+
+    步骤在其依赖全部成功后立即开始，互不依赖的步骤并发执行。
+    步骤分为关键步骤和延后步骤：关键步骤决定初始化是否成功，
+    延后步骤在Webhook开始服务后再执行，失败只记录日志
+    """
+    def __init__(self):
+        self.steps: Dict[str, StartupStep] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._origin = time.perf_counter()
+
+    def add(self, name: str, func: Callable[[], Any], requires: Iterable[str] = (),
+            deferred: bool = False):
+        """
+        添加步骤
+
+        依赖必须先于该步骤添加，因此图中不会出现环
+
+        参数:
+            name: 步骤名称
+            func: 无参的函数或协程函数，返回False表示步骤失败
+            requires: 依赖的步骤名称
+            deferred: 是否延后到Webhook开始服务后执行
+        """
+        if name in self.steps:
+            raise ValueError(f"启动步骤重复: {name}")
+        for dependency in requires:
+            if dependency not in self.steps:
+                raise ValueError(f"启动步骤 {name} 依赖未定义的步骤 {dependency}")
+            if self.steps[dependency].deferred and not deferred:
+                raise ValueError(f"关键步骤 {name} 不能依赖延后步骤 {dependency}")
+        self.steps[name] = StartupStep(name, func, requires, deferred)
+
+    async def _run_step(self, step: StartupStep) -> bool:
+        """等待依赖完成后执行步骤"""
+        for dependency in step.requires:
+            if not await self._tasks[dependency]:
+                step.status = 'skipped'
+                logger.warning("启动步骤 %s 已跳过: 依赖 %s 未成功", step.name, dependency)
+                return False
+
+        start = time.perf_counter()
+        step.started = start - self._origin
+        try:
+            result = step.func()
+            if inspect.isawaitable(result):
+                result = await result
+            step.status = 'failed' if result is False else 'ok'
+        except Exception as e:
+            step.status = 'failed'
+            step.error = e
+            logger.error("启动步骤 %s 失败: %s", step.name, e, exc_info=True)
+        step.duration = time.perf_counter() - start
+        STARTUP_STEP_SECONDS.set(
+            step.duration, step=step.name, phase='deferred' if step.deferred else 'critical'
+        )
+        return step.status == 'ok'
+
+    async def run(self, deferred: bool = False) -> bool:
+        """
+        执行一个阶段的所有步骤
+
+        参数:
+            deferred: False执行关键步骤，True执行延后步骤
+
+        返回:
+            该阶段的步骤是否全部成功
+        """
+        steps = [step for step in self.steps.values() if step.deferred == deferred]
+        for step in steps:
+            self._tasks[step.name] = asyncio.create_task(
+                self._run_step(step), name=f"startup:{step.name}"
+            )
+        results = await asyncio.gather(*(self._tasks[step.name] for step in steps))
+        return all(results)
+
+    def failed_steps(self, deferred: Optional[bool] = None) -> List[str]:
+        """返回失败或被跳过的步骤名称"""
+        return [
+            step.name for step in self.steps.values()
+            if step.status in ('failed', 'skipped') and (deferred is None or step.deferred == deferred)
+        ]
+
+    def report(self, deferred: Optional[bool] = None) -> str:
+        """
+        生成启动耗时报告
+
+        参数:
+            deferred: 只包含指定阶段的步骤，None表示全部
+
+        返回:
+            按开始时间排序的各步骤耗时
+        """
+        steps = [
+            step for step in self.steps.values()
+            if step.started is not None and (deferred is None or step.deferred == deferred)
+        ]
+        steps.sort(key=lambda step: step.started)
+        lines = []
+        for step in steps:
+            lines.append(
+                f"  {step.name:<22} +{step.started * 1000:>7.0f}ms  {step.duration * 1000:>7.0f}ms"
+                f"  {step.status}{'  (延后)' if step.deferred else ''}"
+            )
+        if steps:
+            wall = max(step.started + step.duration for step in steps) - steps[0].started
+            serial = sum(step.duration for step in steps)
+            lines.append(f"  总计 {wall * 1000:.0f}ms（串行执行需 {serial * 1000:.0f}ms）")
+        return '\n'.join(lines)
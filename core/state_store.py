@@ -0,0 +1,189 @@
+"""
+交互状态持久化，用于多步表单在重启后继续
+
+状态写入时同步写入后端（写穿），读取时优先使用内存中的热数据，
+不在内存中的状态在用户下一次操作时从后端加载
+"""
+import copy
+import logging
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+class StateBackend:
+    """
+    状态持久化后端接口，读写失败时抛出异常
+    """
+    async def load(self, namespace: str, user_id: int) -> Optional[Dict[str, Any]]:
+        """读取状态，不存在时返回None"""
+        raise NotImplementedError
+
+    async def save(self, namespace: str, user_id: int, data: Dict[str, Any]):
+        """保存状态"""
+        raise NotImplementedError
+
+    async def delete(self, namespace: str, user_id: int):
+        """删除状态"""
+        raise NotImplementedError
+
+    async def user_ids(self, namespace: str) -> List[int]:
+        """保存了状态的用户ID"""
+        raise NotImplementedError
+
+class MemoryStateBackend(StateBackend):
+    """
+    内存后端，不跨进程持久化，用于测试和压测
+    """
+    def __init__(self):
+        self._data: Dict[str, Dict[int, Dict[str, Any]]] = {}
+
+    async def load(self, namespace: str, user_id: int) -> Optional[Dict[str, Any]]:
+        return copy.deepcopy(self._data.get(namespace, {}).get(user_id))
+
+    async def save(self, namespace: str, user_id: int, data: Dict[str, Any]):
+        self._data.setdefault(namespace, {})[user_id] = copy.deepcopy(data)
+
+    async def delete(self, namespace: str, user_id: int):
+        self._data.get(namespace, {}).pop(user_id, None)
+
+    async def user_ids(self, namespace: str) -> List[int]:
+        return list(self._data.get(namespace, {}))
+
+class MongoStateBackend(StateBackend):
+    """
+    MongoDB后端，状态保存在 interaction_states 集合中，由TTL索引删除过期状态
+    """
+    def __init__(self, db):
+        """
+        初始化后端
+
+        参数:
+            db: 数据库实例
+        """
+        self.db = db
+
+    async def load(self, namespace: str, user_id: int) -> Optional[Dict[str, Any]]:
+        return await self.db.load_interaction_state(namespace, user_id)
+
+    async def save(self, namespace: str, user_id: int, data: Dict[str, Any]):
+        await self.db.save_interaction_state(namespace, user_id, data)
+
+    async def delete(self, namespace: str, user_id: int):
+        await self.db.delete_interaction_state(namespace, user_id)
+
+    async def user_ids(self, namespace: str) -> List[int]:
+        return await self.db.get_interaction_state_users(namespace)
+
+class PersistentStateStore:
+    """
+    带热数据LRU的持久化状态存储
+
+    最近使用的状态保留在内存中，超出容量时淘汰最久未使用的状态；
+    被淘汰的状态仍在后端，下次使用时重新加载
+    """
+    def __init__(self, backend: StateBackend, namespace: str, hot_size: int = 1000,
+                 on_evict: Optional[Callable[[int], None]] = None):
+        """
+        初始化状态存储
+
+        参数:
+            backend: 持久化后端
+            namespace: 状态类型
+            hot_size: 内存中保留的状态数
+            on_evict: 状态被淘汰出内存时的回调，接收用户ID
+        """
+        self.backend = backend
+        self.namespace = namespace
+        self.hot_size = hot_size
+        self.on_evict = on_evict
+        self._hot: 'OrderedDict[int, Dict[str, Any]]' = OrderedDict()
+        self._persisted: Set[int] = set()
+
+    async def start(self) -> int:
+        """
+        加载已持久化状态的用户ID，状态本身在使用时才加载
+
+        返回:
+            已持久化状态的用户数
+        """
+        self._persisted.update(await self.backend.user_ids(self.namespace))
+        logger.info(f"{self.namespace} 状态: {len(self._persisted)} 个用户有未完成的状态")
+        return len(self._persisted)
+
+    def has_state(self, user_id: int) -> bool:
+        """用户是否有状态（在内存或后端中）"""
+        return user_id in self._hot or user_id in self._persisted
+
+    def needs_load(self, user_id: int) -> bool:
+        """用户的状态是否只在后端中"""
+        return user_id in self._persisted and user_id not in self._hot
+
+    def _put(self, user_id: int, snapshot: Dict[str, Any]):
+        """写入热数据并淘汰超出容量的状态"""
+        self._hot[user_id] = snapshot
+        self._hot.move_to_end(user_id)
+        while len(self._hot) > self.hot_size:
+            evicted, _ = self._hot.popitem(last=False)
+            if self.on_evict:
+                self.on_evict(evicted)
+
+    async def load(self, user_id: int) -> Optional[Dict[str, Any]]:
+        """
+        获取用户的状态
+
+        参数:
+            user_id: 用户ID
+
+        返回:
+            状态数据的副本或None
+        """
+        snapshot = self._hot.get(user_id)
+        if snapshot is not None:
+            self._hot.move_to_end(user_id)
+            return copy.deepcopy(snapshot)
+        if user_id not in self._persisted:
+            return None
+        snapshot = await self.backend.load(self.namespace, user_id)
+        if snapshot is None:
+            # 已被TTL索引删除
+            self._persisted.discard(user_id)
+            return None
+        self._put(user_id, snapshot)
+        logger.info(f"已加载用户 {user_id} 的 {self.namespace} 状态")
+        return copy.deepcopy(snapshot)
+
+    async def save(self, user_id: int, data: Dict[str, Any]) -> bool:
+        """
+        保存用户的状态，与内存中的状态相同时跳过写入；写入后端失败时抛出异常
+
+        参数:
+            user_id: 用户ID
+            data: 状态数据
+
+        返回:
+            是否写入了后端
+        """
+        if self._hot.get(user_id) == data:
+            self._hot.move_to_end(user_id)
+            return False
+        snapshot = copy.deepcopy(data)
+        # 写入失败时异常直接抛出，不缓存快照，下次保存时重试
+        await self.backend.save(self.namespace, user_id, snapshot)
+        self._persisted.add(user_id)
+        self._put(user_id, snapshot)
+        return True
+
+    async def delete(self, user_id: int):
+        """
+        删除用户的状态
+
+        参数:
+            user_id: 用户ID
+        """
+        if not self.has_state(user_id):
+            return
+        # 先删除后端中的状态，失败时内存中的状态保持不变，下次重试
+        await self.backend.delete(self.namespace, user_id)
+        self._hot.pop(user_id, None)
+        self._persisted.discard(user_id)
@@ -24,8 +24,15 @@ from telegram.error import BadRequest, Forbidden, TelegramError, TimedOut, Retry
 from telegram.ext import MessageHandler, filters
 from managers.recovery_manager import RecoveryManager
 from db.database import Database
+from db.instrumentation import db_instrumentation
 from db.models import UserRole, GroupPermission
 from core.callback_handler import CallbackHandler
+from core.startup import StartupGraph
+from core.state_store import StateBackend, PersistentStateStore, MongoStateBackend
+from core.webhook_filter import WebhookUpdateFilter
+from utils.callback_codec import callback_codec
+from utils.metrics import metrics
+from utils.logging_utils import setup_logging
 from managers.auto_delete_manager import (
     AutoDeleteManager, MessageType, send_auto_delete_message, 
     send_error_message, send_warning_message, send_success_message,
@@ -36,21 +43,21 @@ from managers.auto_delete_manager import (
 from managers.recovery_manager import RecoveryManager
 from managers.settings_manager import SettingsManager
 from managers.stats_manager import StatsManager
+from managers.group_directory import GroupDirectory
 from config import (
     TELEGRAM_TOKEN, MONGODB_URI, MONGODB_DB, DEFAULT_SUPERADMINS,
     DEFAULT_SETTINGS, BROADCAST_SETTINGS, KEYWORD_SETTINGS, 
-    WEB_HOST, WEB_PORT
+    WEB_HOST, WEB_PORT, WEBHOOK_SETTINGS, DB_INSTRUMENTATION_SETTINGS,
+    LOGGING_SETTINGS, GROUP_DIRECTORY_SETTINGS, STATE_PERSISTENCE_SETTINGS, CALLBACK_SETTINGS
 )
 
-# 配置日志
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO,
-    handlers=[
-        logging.StreamHandler(),
-        logging.FileHandler('bot.log', encoding='utf-8')
-    ]
+# Webhook请求耗时
+WEBHOOK_LATENCY = metrics.histogram(
+    'bot_webhook_request_duration_seconds', 'Webhook请求处理耗时', ('status',)
 )
+
+# 配置日志
+setup_logging(LOGGING_SETTINGS)
 logger = logging.getLogger(__name__)
 
 class ActivityMiddleware:
@@ -86,6 +93,11 @@ class TelegramBot:
         self.shutdown_event = asyncio.Event()
         self.cleanup_task = None
         
+        # 启动依赖图，以及是否为首次初始化（需要应用默认设置）
+        self._startup = None
+        self._startup_task = None
+        self._apply_defaults = False
+        
         # 各种管理器
         self.settings_manager = None
         self.keyword_manager = None
@@ -96,210 +108,319 @@ class TelegramBot:
         self.auto_delete_manager = None
         self.recovery_manager = None
         self.recovery_system = None
+        self.group_directory = None
+        self.form_state = None
         
         # 最后活动时间，用于检测系统休眠
         self.last_active_time = datetime.now()
         
+        # Webhook更新预过滤器
+        self.webhook_filter = WebhookUpdateFilter(
+            dedupe_window=WEBHOOK_SETTINGS.get('update_dedupe_window', 4096)
+        )
+        webhook_updates = metrics.gauge(
+            'bot_webhook_updates', 'Webhook预过滤累计更新数', ('result',)
+        )
+        for result in ('received', 'dropped', 'duplicates'):
+            webhook_updates.set_function(
+                lambda result=result: getattr(self.webhook_filter, result), result=result
+            )
+        
     async def initialize(self):
-        """初始化机器人"""
+        """
+        初始化机器人
+        
+        初始化步骤按依赖关系组成启动图，互不依赖的步骤并发执行；
+        应用默认设置、标准化轮播时间和初始化验证等非关键步骤
+        延后到 start 之后执行
+        """
         try:
-            # 验证配置
+            logger.info("开始初始化机器人")
+            self._startup = self._build_startup_graph()
+            success = await self._startup.run()
+            logger.info("启动耗时:\n%s", self._startup.report(deferred=False))
+            if not success:
+                logger.error(f"初始化步骤失败: {', '.join(self._startup.failed_steps(deferred=False))}")
+                return False
+            logger.info("机器人初始化完成")
+            return True
+        except Exception as e:
+            logger.error(f"机器人初始化失败: {e}", exc_info=True)
+            return False
+
+    def _build_startup_graph(self) -> StartupGraph:
+        """
+        构建启动依赖图
+        
+        返回:
+            包含关键步骤和延后步骤的启动图
+        """
+        import config
+        graph = StartupGraph()
+        
+        def validate():
+            """验证配置"""
             from config_validator import validate_config, ConfigValidationError
-            import config
             try:
                 validate_config(config)
             except ConfigValidationError as e:
                 logger.error(f"配置验证失败: {e}")
                 return False
-                    
-            logger.info("开始初始化机器人")
-            
-            # 连接数据库
-            try:
-                self.db = Database()
-                if not await self.db.connect(MONGODB_URI, MONGODB_DB):
-                    logger.error("数据库连接失败")
-                    return False
-                
-                # 注册数据库到上下文
-                from managers.app_context import register_db
-                register_db(self.db)
-                
-                # 标准化轮播消息时间字段
-                logger.info("开始标准化轮播消息时间字段...")
-                await self.db.normalize_broadcast_datetimes()
-                logger.info("标准化轮播消息时间字段完成")
-            except Exception as e:
-                logger.error(f"数据库连接错误: {e}", exc_info=True)
+        
+        async def connect_database():
+            """连接数据库"""
+            db_instrumentation.configure(**DB_INSTRUMENTATION_SETTINGS)
+            self.db = Database()
+            if not await self.db.connect(MONGODB_URI, MONGODB_DB):
+                logger.error("数据库连接失败")
                 return False
-    
-            # 获取初始化标志，检查机器人是否已经初始化过
+            # 注册数据库到上下文
+            from managers.app_context import register_db
+            register_db(self.db)
+        
+        async def load_system_flag():
+            """获取初始化标志，检查机器人是否已经初始化过"""
             initialized = await self.db.get_system_flag("bot_initialized")
-            apply_defaults = not initialized
+            self._apply_defaults = not initialized
             logger.info(f"机器人初始化状态: {'已初始化' if initialized else '首次初始化'}")
-            
-            # 初始化错误跟踪器
-            self.error_tracker = ErrorTracker()
-            logger.info("错误跟踪器已初始化")
-            
-            # 初始化回调处理器
-            self.callback_handler = CallbackHandler()
-            logger.info("回调处理器已初始化")
-            
-            # 初始化设置管理器
-            self.settings_manager = SettingsManager(self.db)
-            await self.settings_manager.start(apply_defaults_if_missing=apply_defaults)
-            # 注册到上下文
-            from managers.app_context import register_settings_manager
-            register_settings_manager(self.settings_manager)
-            logger.info("设置管理器已初始化")
-            
-            # 初始化关键词管理器
-            from managers.keyword_manager import KeywordManager
-            self.keyword_manager = KeywordManager(self.db, apply_defaults=apply_defaults)
-            # 注册到上下文
-            from managers.app_context import register_keyword_manager
-            register_keyword_manager(self.keyword_manager)
-            
-            # 注册内置关键词处理函数
-            self.keyword_manager.register_built_in_handler('日排行', self._handle_daily_rank)
-            self.keyword_manager.register_built_in_handler('月排行', self._handle_monthly_rank)
-            logger.info("关键词管理器已初始化")
-            
-            # 初始化统计管理器
-            self.stats_manager = StatsManager(self.db)
-            # 注册到上下文
-            from managers.app_context import register_stats_manager
-            register_stats_manager(self.stats_manager)
-            logger.info("统计管理器已初始化")
-            
-            # 初始化自动删除管理器
-            self.auto_delete_manager = AutoDeleteManager(self.db, apply_defaults=apply_defaults)
-            # 注册到上下文
-            from managers.app_context import register_auto_delete_manager
-            register_auto_delete_manager(self.auto_delete_manager)
-            logger.info("自动删除管理器已初始化")
-            
-            # 初始化应用程序
-            self.application = Application.builder().token(TELEGRAM_TOKEN).build()
-            
-            # 将bot实例存储在application的bot_data中，以便于在回调函数中访问
-            self.application.bot_data['bot_instance'] = self
-            
-            # 注册机器人实例到上下文
-            from managers.app_context import register_bot_instance
-            register_bot_instance(self)
-            
-            # 为自动删除管理器设置机器人实例
-            self.auto_delete_manager.set_bot(self.application.bot)
-            
-            # 注册处理函数
-            from handlers import register_all_handlers
-            register_all_handlers(self.application, self.callback_handler)
-            
-            # 初始化应用程序
-            await self.application.initialize()
-            
-            # 初始化恢复管理器（需要在应用程序初始化之后）
+        
+        async def setup_superadmins():
+            """设置超级管理员"""
+            await asyncio.gather(*(
+                self.db.add_user({'user_id': admin_id, 'role': UserRole.SUPERADMIN.value})
+                for admin_id in DEFAULT_SUPERADMINS
+            ))
+            logger.info(f"已设置超级管理员: {DEFAULT_SUPERADMINS}")
+        
+        async def start_managers():
+            """初始化各管理器，默认设置在延后步骤中应用"""
+            await self.setup_managers(MongoStateBackend(self.db))
+        
+        async def build_application():
+            """初始化应用程序并注册处理函数"""
+            await self.setup_application(Application.builder().token(TELEGRAM_TOKEN).build())
+        
+        async def start_recovery_manager():
+            """初始化恢复管理器（需要在应用程序初始化之后）"""
             self.recovery_manager = RecoveryManager(self)
             # 注册到上下文
             from managers.app_context import register_recovery_manager
             register_recovery_manager(self.recovery_manager)
             await self.recovery_manager.start()
             logger.info("恢复管理器已初始化")
-            
-            # 尝试初始化增强版轮播功能
+        
+        def create_broadcast_manager():
+            """初始化轮播管理器，增强版初始化失败时降级为原始版本"""
             try:
                 # 检查配置是否启用增强功能
-                enable_enhanced = config.BROADCAST_SETTINGS.get('enable_enhanced_features', False)
-                
-                if enable_enhanced:
-                    # 导入增强版轮播管理器
+                if config.BROADCAST_SETTINGS.get('enable_enhanced_features', False):
                     from managers.enhanced_broadcast_manager import EnhancedBroadcastManager
-                    # 创建增强版轮播管理器
-                    self.broadcast_manager = EnhancedBroadcastManager(self.db, self, apply_defaults=apply_defaults)
+                    self.broadcast_manager = EnhancedBroadcastManager(self.db, self, apply_defaults=self._apply_defaults)
                     logger.info("增强版轮播管理器已初始化")
                 else:
-                    # 使用原始版轮播管理器
                     from managers.broadcast_manager import BroadcastManager
-                    self.broadcast_manager = BroadcastManager(self.db, self, apply_defaults=apply_defaults)
+                    self.broadcast_manager = BroadcastManager(self.db, self, apply_defaults=self._apply_defaults)
                     logger.info("使用原始版轮播管理器")
             except Exception as e:
                 logger.error(f"初始化增强版轮播功能出错: {e}", exc_info=True)
-                # 使用原始版本的轮播管理器
                 from managers.broadcast_manager import BroadcastManager
-                self.broadcast_manager = BroadcastManager(self.db, self, apply_defaults=apply_defaults)
+                self.broadcast_manager = BroadcastManager(self.db, self, apply_defaults=self._apply_defaults)
                 logger.warning("降级使用原始版本的轮播管理器")
-                        
-            # 设置超级管理员
-            for admin_id in DEFAULT_SUPERADMINS:
-                await self.db.add_user({'user_id': admin_id, 'role': UserRole.SUPERADMIN.value})
-                logger.info(f"已设置超级管理员: {admin_id}")
+        
+        async def start_web_server():
+            """
+            启动Web服务器
             
-            # 设置Web应用
+            不依赖数据库，尽早开始响应健康检查；机器人启动前Webhook请求返回503，
+            由Telegram稍后重试
+            """
             self.web_app = web.Application()
             self.web_app.router.add_get('/', self._handle_healthcheck)
             self.web_app.router.add_get('/health', self._handle_healthcheck)
+            self.web_app.router.add_get('/metrics', self._handle_metrics)
+            self.web_app.router.add_post(f"/webhook/{TELEGRAM_TOKEN}", self._handle_webhook)
             
-            # 设置Webhook
-            webhook_domain = os.getenv('WEBHOOK_DOMAIN', 'your-render-app-name.onrender.com')
-            webhook_url = f"https://{webhook_domain}/webhook/{TELEGRAM_TOKEN}"
-            webhook_path = f"/webhook/{TELEGRAM_TOKEN}"
-            self.web_app.router.add_post(webhook_path, self._handle_webhook)
-            
-            # 启动Web服务器
             self.web_runner = web.AppRunner(self.web_app)
             await self.web_runner.setup()
             site = web.TCPSite(self.web_runner, WEB_HOST, WEB_PORT)
             await site.start()
             logger.info(f"Web服务器已在 {WEB_HOST}:{WEB_PORT} 启动")
-            
-            # 设置Webhook
+        
+        async def set_webhook():
+            """设置Webhook"""
+            webhook_domain = os.getenv('WEBHOOK_DOMAIN', 'your-render-app-name.onrender.com')
+            webhook_url = f"https://{webhook_domain}/webhook/{TELEGRAM_TOKEN}"
             await self.application.bot.set_webhook(
                 url=webhook_url,
                 allowed_updates=["message", "callback_query", "my_chat_member"]
             )
             self.application.updater = None
             logger.info(f"Webhook已设置为 {webhook_url}")
-
-            # 初始化统计恢复系统
+        
+        def create_recovery_system():
+            """初始化统计恢复系统"""
             from recovery.statistics_recovery import StatisticsRecoverySystem
             self.recovery_system = StatisticsRecoverySystem(self)
-            logger.info("统计恢复系统已初始化")
-            
-            # 验证初始化
-            if not await self._verify_initialization():
-                logger.error("初始化验证失败")
-                return False
-                
-            logger.info("机器人初始化完成")
-            return True
-            
-        except Exception as e:
-            logger.error(f"机器人初始化失败: {e}", exc_info=True)
-            return False
+        
+        async def normalize_broadcasts():
+            """标准化轮播消息时间字段"""
+            count = await self.db.normalize_broadcast_datetimes()
+            logger.info(f"标准化轮播消息时间字段完成，共 {count} 条")
+        
+        async def apply_settings_defaults():
+            """首次初始化时应用默认设置"""
+            if self._apply_defaults:
+                await self.settings_manager.apply_default_settings()
+        
+        async def apply_auto_delete_defaults():
+            """首次初始化时应用默认自动删除设置"""
+            if self._apply_defaults:
+                await self.auto_delete_manager._apply_default_settings()
+        
+        # 关键步骤
+        graph.add('config', validate)
+        graph.add('web_server', start_web_server, requires=('config',))
+        graph.add('database', connect_database, requires=('config',))
+        graph.add('system_flag', load_system_flag, requires=('database',))
+        graph.add('superadmins', setup_superadmins, requires=('database',))
+        graph.add('managers', start_managers, requires=('system_flag',))
+        graph.add('application', build_application, requires=('managers',))
+        graph.add('recovery_manager', start_recovery_manager, requires=('application',))
+        graph.add('broadcast_manager', create_broadcast_manager, requires=('managers',))
+        graph.add('statistics_recovery', create_recovery_system, requires=('managers',))
+        graph.add('webhook', set_webhook, requires=('application', 'web_server'))
+        
+        # 延后步骤，Webhook开始服务后执行
+        # get_due_broadcasts 每次查询前也会标准化，启动时无需等待
+        graph.add('normalize_broadcasts', normalize_broadcasts, requires=('database',), deferred=True)
+        graph.add('settings_defaults', apply_settings_defaults, requires=('managers',), deferred=True)
+        graph.add('auto_delete_defaults', apply_auto_delete_defaults, requires=('managers',), deferred=True)
+        graph.add('verify', self._verify_initialization,
+                  requires=('superadmins', 'settings_defaults', 'auto_delete_defaults'), deferred=True)
+        return graph
+
+    async def setup_managers(self, state_backend: StateBackend):
+        """
+        创建并启动各管理器，注册到应用上下文
 
+        参数:
+            state_backend: 表单状态的持久化后端
+        """
+        from managers.app_context import (
+            register_settings_manager, register_keyword_manager,
+            register_stats_manager, register_auto_delete_manager
+        )
+        from managers.keyword_manager import KeywordManager
+        
+        # 初始化错误跟踪器
+        self.error_tracker = ErrorTracker()
+        # 初始化回调处理器
+        self.callback_handler = CallbackHandler()
+        
+        # 初始化设置管理器
+        self.settings_manager = SettingsManager(self.db)
+        
+        # 初始化关键词管理器
+        self.keyword_manager = KeywordManager(self.db, apply_defaults=self._apply_defaults)
+        # 注册内置关键词处理函数
+        self.keyword_manager.register_built_in_handler('日排行', self._handle_daily_rank)
+        self.keyword_manager.register_built_in_handler('月排行', self._handle_monthly_rank)
+        
+        # 初始化统计管理器
+        self.stats_manager = StatsManager(self.db)
+        
+        # 初始化群组标题目录
+        self.group_directory = GroupDirectory(
+            self.db,
+            refresh_concurrency=GROUP_DIRECTORY_SETTINGS['refresh_concurrency'],
+            title_ttl=timedelta(hours=GROUP_DIRECTORY_SETTINGS['title_ttl_hours'])
+        )
+        # 初始化表单状态存储
+        self.form_state = PersistentStateStore(
+            state_backend, 'form',
+            hot_size=STATE_PERSISTENCE_SETTINGS['hot_size']
+        )
+        await asyncio.gather(
+            self.settings_manager.start(apply_defaults_if_missing=False),
+            self.stats_manager.start(),
+            self.form_state.start()
+        )
+        
+        # 初始化自动删除管理器
+        self.auto_delete_manager = AutoDeleteManager(self.db)
+        auto_delete_depth = metrics.gauge(
+            'bot_auto_delete_pending', '等待删除的消息数', ('source',)
+        )
+        auto_delete_depth.set_function(self.auto_delete_manager.message_queue.qsize, source='queue')
+        auto_delete_depth.set_function(lambda: len(self.auto_delete_manager.delete_tasks), source='tasks')
+        
+        # 注册到上下文
+        register_settings_manager(self.settings_manager)
+        register_keyword_manager(self.keyword_manager)
+        register_stats_manager(self.stats_manager)
+        register_auto_delete_manager(self.auto_delete_manager)
+        logger.info("管理器已初始化")
+        
+    async def setup_application(self, application: Application):
+        """
+        绑定应用程序、注册处理函数并初始化应用程序，需要在 setup_managers 之后调用
+
+        参数:
+            application: 未初始化的应用程序实例
+        """
+        self.application = application
+        
+        # 将bot实例存储在application的bot_data中，以便于在回调函数中访问
+        self.application.bot_data['bot_instance'] = self
+        
+        # 注册机器人实例到上下文
+        from managers.app_context import register_bot_instance
+        register_bot_instance(self)
+        
+        # 为自动删除管理器设置机器人实例
+        self.auto_delete_manager.set_bot(self.application.bot)
+        
+        # 按钮令牌的有效期
+        callback_codec.configure(max_age=CALLBACK_SETTINGS.get('max_callback_age'))
+        
+        # 注册处理函数
+        from handlers import register_all_handlers
+        from handlers.form_state_handlers import attach_form_state
+        register_all_handlers(self.application, self.callback_handler)
+        attach_form_state(self.form_state, self.application)
+        
+        # 初始化应用程序
+        await self.application.initialize()
+        
+    async def _run_deferred_startup(self):
+        """执行延后的启动步骤并输出耗时报告"""
+        if not self._startup:
+            return
+        success = await self._startup.run(deferred=True)
+        logger.info("延后启动步骤耗时:\n%s", self._startup.report(deferred=True))
+        if not success:
+            logger.error(f"延后启动步骤失败: {', '.join(self._startup.failed_steps(deferred=True))}")
     
     async def _verify_initialization(self):
         """验证初始化是否成功"""
         # 验证超级管理员
+        superadmins = {
+            user['user_id'] for user in await self.db.get_users_by_role(UserRole.SUPERADMIN.value)
+        }
         for admin_id in DEFAULT_SUPERADMINS:
-            user = await self.db.get_user(admin_id)
-            if not user or user['role'] != UserRole.SUPERADMIN.value:
+            if admin_id not in superadmins:
                 logger.error(f"超级管理员 {admin_id} 初始化失败")
                 return False
         
         # 验证完成，设置初始化标志
-        initialized = await self.db.get_system_flag("bot_initialized")
-        if not initialized:
+        if self._apply_defaults:
             await self.db.set_system_flag("bot_initialized", True)
             logger.info("已设置机器人初始化标志")
         
         # 记录群组数量
-        groups = await self.db.find_all_groups()
         logger.info("初始化验证成功")
         logger.info(f"超级管理员: {DEFAULT_SUPERADMINS}")
-        logger.info(f"已授权群组数量: {len(groups)}")
+        logger.info(f"已授权群组数量: {await self.db.count_groups()}")
         return True
         
     @classmethod
@@ -367,6 +488,9 @@ class TelegramBot:
         await self._start_broadcast_task()
         await self._start_cleanup_task()
         await self._start_ping_task()
+        
+        # Webhook已开始服务，执行延后的启动步骤
+        self._startup_task = asyncio.create_task(self._run_deferred_startup())
         logger.info("机器人成功启动")
         return True
     
@@ -378,6 +502,11 @@ class TelegramBot:
         if self.shutdown_event:
             self.shutdown_event.set()
             
+        # 取消尚未完成的延后启动步骤
+        if self._startup_task and not self._startup_task.done():
+            logger.info("取消延后启动步骤")
+            self._startup_task.cancel()
+            
         # 关闭恢复管理器
         if self.recovery_manager:
             logger.info("关闭恢复管理器")
@@ -388,6 +517,11 @@ class TelegramBot:
             logger.info("开始关闭设置管理器")
             await self.settings_manager.stop()
             
+        # 停止统计管理器
+        if self.stats_manager:
+            logger.info("开始关闭统计管理器")
+            await self.stats_manager.stop()
+            
         # 取消清理任务
         if self.cleanup_task:
             logger.info("取消清理任务")
@@ -586,7 +720,21 @@ class TelegramBot:
         
         return web.Response(text="Healthy", status=200)
     
+    async def _handle_metrics(self, request):
+        """导出Prometheus格式的运行指标"""
+        return web.Response(
+            text=metrics.render(),
+            content_type='text/plain'
+        )
+    
     async def _handle_webhook(self, request):
+        """处理Webhook请求，并记录处理耗时"""
+        start = time.perf_counter()
+        response = await self._process_webhook(request)
+        WEBHOOK_LATENCY.observe(time.perf_counter() - start, status=str(response.status))
+        return response
+    
+    async def _process_webhook(self, request):
         """处理Webhook请求"""
         try:
             # 验证内容类型
@@ -595,7 +743,11 @@ class TelegramBot:
                 return web.Response(status=415)
                 
             # 解析更新数据
-            update_data = await request.json()
+            try:
+                update_data = self.webhook_filter.decode(await request.read())
+            except ValueError as e:
+                logger.warning(f"收到无法解析的更新数据: {e}")
+                return web.Response(status=400)
             logger.debug(f"收到webhook更新: {update_data}")
             
             # 检查应用程序是否已初始化和启动
@@ -603,11 +755,27 @@ class TelegramBot:
                 logger.warning("应用程序尚未完全初始化，暂时无法处理更新")
                 return web.Response(status=503, text="Bot not fully initialized yet")
             
+            # 重复投递的更新直接确认，不再重复执行处理器
+            if self.webhook_filter.is_duplicate(update_data):
+                logger.debug(f"丢弃重复投递的更新: {update_data.get('update_id')}")
+                return web.Response(status=200)
+            
+            # 没有处理器会消费的更新直接确认，不构建Update对象
+            if not self.webhook_filter.accepts(update_data):
+                self.last_active_time = datetime.now()
+                if self.recovery_manager:
+                    self.recovery_manager.update_activity()
+                return web.Response(status=200)
+            
             # 创建更新对象
             update = Update.de_json(update_data, self.application.bot)
             if update:
-                # 处理更新
-                await self.application.process_update(update)
+                # 处理更新，失败时释放update_id以便Telegram重试
+                try:
+                    await self.application.process_update(update)
+                except Exception:
+                    self.webhook_filter.release(update_data)
+                    raise
                 logger.debug("成功处理更新")
             else:
                 logger.warning("收到无效的更新数据")
@@ -658,8 +826,10 @@ class TelegramBot:
             return
         
         # 检查关键词是否已存在
-        existing_keywords = await self.db.get_keywords(group_id)
-        existing_patterns = [kw.get('pattern', '') for kw in existing_keywords]
+        existing_patterns = {
+            kw.get('pattern', '')
+            async for kw in self.db.iter_keywords(group_id, projection={'pattern': 1})
+        }
         
         # 添加日排行关键词
         if '日排行' not in existing_patterns:
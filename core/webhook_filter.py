@@ -0,0 +1,140 @@
+"""
+Webhook更新预过滤，在构建Update对象之前丢弃不会被任何处理器消费的更新
+"""
+import json
+import logging
+import time
+from typing import Dict, Any
+
+try:
+    import orjson
+    _loads = orjson.loads
+except ImportError:  # 未安装orjson时回退到标准库
+    orjson = None
+    _loads = json.loads
+
+from utils.dedupe_utils import MonotonicIdWindow
+
+logger = logging.getLogger(__name__)
+
+# 会被处理器消费的更新类型，与 set_webhook 的 allowed_updates 保持一致
+DISPATCH_UPDATE_TYPES = frozenset({'message', 'callback_query', 'my_chat_member'})
+
+# 消息中会被处理器消费的内容字段（文本/命令、图片、视频、文档、动图，以及用于更新群组标题目录的改名消息）
+DISPATCH_MESSAGE_FIELDS = frozenset({'text', 'photo', 'video', 'document', 'animation', 'new_chat_title'})
+
+class WebhookUpdateFilter:
+    """
+    Webhook更新预过滤器
+
+    使用快速JSON解析器解码原始请求体，只对会被处理器消费的更新构建Update对象，
+    编辑消息、表情回应、服务消息等直接丢弃；Telegram重复投递的更新按 update_id 去重
+    """
+    def __init__(self, update_types=DISPATCH_UPDATE_TYPES, message_fields=DISPATCH_MESSAGE_FIELDS,
+                 dedupe_window: int = 4096):
+        """
+        初始化预过滤器
+
+        参数:
+            update_types: 需要分发的更新类型
+            message_fields: 消息中需要分发的内容字段
+            dedupe_window: 追踪的最近 update_id 数量
+        """
+        self.update_types = update_types
+        self.message_fields = message_fields
+        self.received = 0
+        self.dropped = 0
+        self.duplicates = 0
+        self.decode_seconds = 0.0
+        self._update_ids = MonotonicIdWindow(dedupe_window)
+
+    def decode(self, raw: bytes) -> Dict[str, Any]:
+        """
+        解码Webhook请求体
+
+        参数:
+            raw: 原始请求体
+
+        返回:
+            更新数据字典
+
+        异常:
+            ValueError: 请求体不是合法的JSON对象
+        """
+        start = time.perf_counter()
+        try:
+            data = _loads(raw)
+        finally:
+            self.decode_seconds += time.perf_counter() - start
+        if not isinstance(data, dict):
+            raise ValueError("更新数据必须是JSON对象")
+        self.received += 1
+        return data
+
+    def is_duplicate(self, data: Dict[str, Any]) -> bool:
+        """
+        检查更新是否为重复投递，并记录其 update_id
+
+        参数:
+            data: 更新数据字典
+
+        返回:
+            是否重复
+        """
+        update_id = data.get('update_id')
+        if not isinstance(update_id, int):
+            return False
+        if self._update_ids.check_and_add(update_id):
+            self.duplicates += 1
+            return True
+        return False
+
+    def release(self, data: Dict[str, Any]):
+        """
+        处理失败时释放 update_id，使Telegram的重试能够再次被处理
+
+        参数:
+            data: 更新数据字典
+        """
+        update_id = data.get('update_id')
+        if isinstance(update_id, int):
+            self._update_ids.discard(update_id)
+
+    def accepts(self, data: Dict[str, Any]) -> bool:
+        """
+        检查更新是否需要分发给处理器
+
+        参数:
+            data: 更新数据字典
+
+        返回:
+            是否需要分发
+        """
+        for key, value in data.items():
+            if key == 'update_id':
+                continue
+            if key not in self.update_types:
+                break
+            if key == 'message':
+                if isinstance(value, dict) and not self.message_fields.isdisjoint(value):
+                    return True
+                break
+            return True
+
+        self.dropped += 1
+        return False
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        获取预过滤统计
+
+        返回:
+            包含接收数、丢弃数、重复数和平均解码耗时的字典
+        """
+        return {
+            'parser': 'orjson' if orjson else 'json',
+            'received': self.received,
+            'dropped': self.dropped,
+            'duplicates': self.duplicates,
+            'avg_decode_us': round(self.decode_seconds / self.received * 1e6, 2) if self.received else 0
+        }
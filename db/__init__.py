@@ -1,11 +1,22 @@
 """
 数据库模块初始化文件
 """
-from db.models import UserRole, GroupPermission
+from db.models import UserRole, GroupPermission, Model, User, Group, Keyword, Broadcast, MessageStat
 from db.database import Database
+from db.instrumentation import DatabaseInstrumentation, db_instrumentation
+from db.keyword_cache import KeywordCache
 
 __all__ = [
     'UserRole',
     'GroupPermission',
-    'Database'
+    'Model',
+    'User',
+    'Group',
+    'Keyword',
+    'Broadcast',
+    'MessageStat',
+    'Database',
+    'DatabaseInstrumentation',
+    'db_instrumentation',
+    'KeywordCache'
 ]
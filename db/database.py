@@ -3,17 +3,32 @@
 """
 import logging
 import asyncio
-from datetime import datetime, timedelta
-from typing import Optional, List, Dict, Any, Tuple
+import re
+from datetime import datetime, timedelta, timezone
+from typing import Optional, List, Dict, Any, Tuple, AsyncIterator, Callable, Union
 from motor.motor_asyncio import AsyncIOMotorClient
-from pymongo import ASCENDING, DESCENDING
+from pymongo import ASCENDING, DESCENDING, UpdateOne
+from pymongo.errors import DuplicateKeyError
 from bson import ObjectId
 
 from db.models import UserRole, GroupPermission
+from db.instrumentation import db_instrumentation
+from db.keyword_cache import KeywordCache
 
 # 配置日志
 logger = logging.getLogger(__name__)
 
+# 消息统计按月分区，集合名为 message_stats_YYYYMM
+STATS_PARTITION_PREFIX = 'message_stats_'
+# 分区之前的旧版统计集合
+LEGACY_STATS_COLLECTION = 'message_stats'
+# 流式读取时每批从服务器获取的文档数
+DEFAULT_BATCH_SIZE = 100
+# 一次性返回列表的查询最多返回的文档数，需要完整结果时使用 iter_* 流式遍历
+DEFAULT_LIST_LIMIT = 1000
+# 活跃天位图最高位为第 window_days 位，须保持在有符号64位整数范围内
+MAX_SUMMARY_WINDOW_DAYS = 62
+
 class Database:
     """数据库操作类，处理与MongoDB的交互"""
     def __init__(self):
@@ -24,6 +39,12 @@ class Database:
         self.database = None
         self._reconnect_task = None
         self.connected = asyncio.Event()
+        # 已初始化索引的统计分区
+        self._stats_partitions = set()
+        # 是否仍存在旧版未分区的统计数据
+        self._legacy_stats = False
+        # 关键词文档缓存，匹配时写入，增删改时失效
+        self.keyword_cache = KeywordCache()
         
     async def connect(self, mongodb_uri: str, database: str) -> bool:
         """连接到MongoDB"""
@@ -41,13 +62,19 @@ class Database:
             collections = await self.db.list_collection_names()
             required_collections = [
                 'users', 'groups', 'keywords', 'broadcasts', 
-                'message_stats', 'admin_groups'
+                'admin_groups'
             ]
             
-            for collection in required_collections:
-                if collection not in collections:
-                    logger.warning(f"创建集合: {collection}")
-                    await self.db.create_collection(collection)
+            missing_collections = [name for name in required_collections if name not in collections]
+            for collection in missing_collections:
+                logger.warning(f"创建集合: {collection}")
+            await asyncio.gather(*(self.db.create_collection(name) for name in missing_collections))
+            
+            # 旧版统计集合中仍有数据时，查询路由需要把它一并纳入
+            if LEGACY_STATS_COLLECTION in collections:
+                self._legacy_stats = await self.db[LEGACY_STATS_COLLECTION].estimated_document_count() > 0
+                if self._legacy_stats:
+                    logger.info("检测到旧版未分区的统计数据，将在保留期满后自动清理")
             
             # 初始化索引
             await self.init_indexes()
@@ -141,50 +168,47 @@ class Database:
             logger.info("数据库连接已关闭")
 
     async def init_indexes(self):
-        """初始化所有集合的索引"""
+        """初始化所有集合的索引，各集合的索引并发创建"""
+        from config import STATE_PERSISTENCE_SETTINGS
         try:
-            # 用户索引
-            await self.db.users.create_index(
-                [("user_id", ASCENDING)],
-                unique=True
-            )
-            
-            # 群组索引
-            await self.db.groups.create_index(
-                [("group_id", ASCENDING)],
-                unique=True
+            await asyncio.gather(
+                # 用户索引
+                self.db.users.create_index([("user_id", ASCENDING)], unique=True),
+                # 群组索引
+                self.db.groups.create_index([("group_id", ASCENDING)], unique=True),
+                # 群组选择器按标题排序分页
+                self.db.groups.create_index([("title", ASCENDING), ("group_id", ASCENDING)]),
+                # 关键词索引
+                self.db.keywords.create_index([
+                    ("group_id", ASCENDING),
+                    ("pattern", ASCENDING)
+                ]),
+                # 关键词列表分页，按创建顺序稳定排序
+                self.db.keywords.create_index([
+                    ("group_id", ASCENDING),
+                    ("_id", ASCENDING)
+                ]),
+                # 轮播消息索引
+                self.db.broadcasts.create_index([
+                    ("group_id", ASCENDING),
+                    ("end_time", ASCENDING)
+                ]),
+                # 消息统计索引 - 当前月份分区，其余分区首次写入时创建
+                self.get_stats_collection(datetime.now().strftime('%Y-%m-%d')),
+                # 群组管理员索引
+                self.db.admin_groups.create_index([
+                    ("admin_id", ASCENDING),
+                    ("group_id", ASCENDING)
+                ], unique=True),
+                # 系统标志索引
+                self.db.system_flags.create_index([("name", ASCENDING)], unique=True),
+                # 交互状态索引，updated_at 上的TTL索引自动删除过期状态
+                self.db.interaction_states.create_index([("namespace", ASCENDING), ("user_id", ASCENDING)]),
+                self.db.interaction_states.create_index(
+                    [("updated_at", ASCENDING)],
+                    expireAfterSeconds=STATE_PERSISTENCE_SETTINGS['ttl']
+                )
             )
-            
-            # 关键词索引
-            await self.db.keywords.create_index([
-                ("group_id", ASCENDING),
-                ("pattern", ASCENDING)
-            ])
-            
-            # 轮播消息索引
-            await self.db.broadcasts.create_index([
-                ("group_id", ASCENDING),
-                ("end_time", ASCENDING)
-            ])
-            
-            # 消息统计索引
-            await self.db.message_stats.create_index([
-                ("group_id", ASCENDING),
-                ("user_id", ASCENDING),
-                ("date", ASCENDING)
-            ])
-            
-            # 群组管理员索引
-            await self.db.admin_groups.create_index([
-                ("admin_id", ASCENDING),
-                ("group_id", ASCENDING)
-            ], unique=True)
-
-            # 系统标志索引
-            await self.db.system_flags.create_index([
-                ("name", ASCENDING)
-            ], unique=True)
-            
             logger.info("索引初始化完成")
         except Exception as e:
             logger.error(f"索引初始化失败: {e}", exc_info=True)
@@ -352,6 +376,33 @@ class Database:
             logger.error(f"添加群组失败: {e}", exc_info=True)
             raise
 
+    async def update_group_titles(self, titles: Dict[int, str]) -> int:
+        """
+        批量更新群组标题，只更新已存在的群组
+        
+        参数:
+            titles: {群组ID: 标题}
+            
+        返回:
+            被修改的群组数量
+        """
+        await self.ensure_connected()
+        if not titles:
+            return 0
+        now = datetime.now()
+        try:
+            result = await self.db.groups.bulk_write([
+                UpdateOne(
+                    {'group_id': group_id},
+                    {'$set': {'title': title, 'title_updated_at': now}}
+                )
+                for group_id, title in titles.items()
+            ], ordered=False)
+            return result.modified_count
+        except Exception as e:
+            logger.error(f"更新群组标题失败: {e}", exc_info=True)
+            return 0
+
     async def remove_group(self, group_id: int):
         """
         删除群组
@@ -376,6 +427,7 @@ class Database:
                         {'group_id': group_id},
                         session=session
                     )
+                    self.keyword_cache.invalidate_group(group_id)
                     await self.db.broadcasts.delete_many(
                         {'group_id': group_id},
                         session=session
@@ -457,6 +509,39 @@ class Database:
             logger.error(f"获取群组列表失败: {e}", exc_info=True)
             return []
 
+    async def count_groups(self) -> int:
+        """
+        获取群组数量
+        
+        返回:
+            群组数量
+        """
+        await self.ensure_connected()
+        try:
+            return await self.db.groups.count_documents({})
+        except Exception as e:
+            logger.error(f"获取群组数量失败: {e}", exc_info=True)
+            return 0
+
+    async def iter_all_groups(self, batch_size: int = DEFAULT_BATCH_SIZE,
+                              projection: Optional[Dict[str, Any]] = None) -> AsyncIterator[Dict[str, Any]]:
+        """
+        流式遍历所有群组
+
+        中途出错时记录日志后重新抛出，避免调用方把不完整的结果当作完整结果
+
+        参数:
+            batch_size: 每批从服务器获取的文档数
+            projection: 可选的字段投影
+        """
+        await self.ensure_connected()
+        try:
+            async for group in self.db.groups.find({}, projection).batch_size(batch_size):
+                yield group
+        except Exception as e:
+            logger.error(f"遍历群组列表失败: {e}", exc_info=True)
+            raise
+
     async def get_group_settings(self, group_id: int) -> Dict[str, Any]:
         """
         获取群组设置
@@ -529,6 +614,47 @@ class Database:
             logger.error(f"更新群组设置字段失败: {e}", exc_info=True)
             raise
 
+    async def apply_group_settings_defaults(
+        self,
+        defaults: Union[Dict[str, Any], Callable[[Dict[str, Any]], Dict[str, Any]]]
+    ) -> int:
+        """
+        为所有群组补充缺失的设置项
+        
+        在内存中逐个群组计算缺失的设置键，再用一次 bulk_write 写入。
+        每个更新使用 $ifNull 只写入仍不存在的字段，不会覆盖期间被修改的设置
+        
+        参数:
+            defaults: 默认设置字典，或根据群组当前设置返回默认设置的函数
+            
+        返回:
+            被修改的群组数量
+        """
+        await self.ensure_connected()
+        operations = []
+        async for group in self.iter_all_groups(projection={'settings': 1}):
+            settings = group.get('settings') or {}
+            group_defaults = defaults(settings) if callable(defaults) else defaults
+            missing = {key: value for key, value in group_defaults.items() if key not in settings}
+            if not missing:
+                continue
+            updates = {
+                f'settings.{key}': {'$ifNull': [f'$settings.{key}', {'$literal': value}]}
+                for key, value in missing.items()
+            }
+            updates['updated_at'] = '$$NOW'
+            operations.append(UpdateOne({'_id': group['_id']}, [{'$set': updates}]))
+        
+        if not operations:
+            return 0
+        try:
+            result = await self.db.groups.bulk_write(operations, ordered=False)
+            logger.info(f"已为 {result.modified_count} 个群组补充默认设置")
+            return result.modified_count
+        except Exception as e:
+            logger.error(f"批量应用默认设置失败: {e}", exc_info=True)
+            raise
+
     #######################################
     # 管理员群组关系方法
     #######################################
@@ -602,6 +728,58 @@ class Database:
             logger.error(f"获取可管理群组列表失败: {e}", exc_info=True)
             return []
 
+    async def get_manageable_groups_page(self, user_id: int, page: int, page_size: int,
+                                         search: Optional[str] = None) -> Tuple[List[Dict[str, Any]], int]:
+        """
+        分页获取用户可管理的群组，按标题排序，可按标题或群组ID搜索
+        
+        参数:
+            user_id: 用户ID
+            page: 页码，从1开始
+            page_size: 每页数量
+            search: 搜索关键字，匹配标题（不区分大小写）或群组ID
+            
+        返回:
+            (当前页的群组列表, 匹配的群组总数)
+        """
+        await self.ensure_connected()
+        try:
+            user = await self.get_user(user_id)
+            if not user:
+                return [], 0
+
+            conditions = []
+            if user['role'] == UserRole.ADMIN.value:
+                group_ids = [
+                    g['group_id'] async for g in self.db.admin_groups.find(
+                        {'admin_id': user_id}, {'group_id': 1, '_id': 0}
+                    )
+                ]
+                conditions.append({'group_id': {'$in': group_ids}})
+            elif user['role'] != UserRole.SUPERADMIN.value:
+                return [], 0
+
+            if search:
+                search_conditions = [{'title': {'$regex': re.escape(search), '$options': 'i'}}]
+                if search.lstrip('-').isdigit():
+                    search_conditions.append({'group_id': int(search)})
+                conditions.append({'$or': search_conditions})
+            query = {'$and': conditions} if conditions else {}
+
+            projection = {'group_id': 1, 'title': 1, 'title_updated_at': 1, 'permissions': 1}
+            groups, total = await asyncio.gather(
+                self.db.groups.find(query, projection)
+                    .sort([('title', ASCENDING), ('group_id', ASCENDING)])
+                    .skip((page - 1) * page_size)
+                    .limit(page_size)
+                    .to_list(page_size),
+                self.db.groups.count_documents(query)
+            )
+            return groups, total
+        except Exception as e:
+            logger.error(f"分页获取可管理群组失败: {e}", exc_info=True)
+            return [], 0
+
     async def add_admin_group(self, admin_id: int, group_id: int):
         """
         添加管理员与群组的关联
@@ -688,6 +866,7 @@ class Database:
                 },
                 upsert=True
             )
+            self.keyword_cache.invalidate_pattern(keyword_data['group_id'], keyword_data['pattern'])
             logger.info(f"已添加关键词: {keyword_data['pattern']}")
             return result
         except Exception as e:
@@ -716,6 +895,7 @@ class Database:
                 'group_id': group_id,
                 '_id': obj_id
             })
+            self.keyword_cache.invalidate(obj_id, group_id)
             
             if result.deleted_count == 0:
                 logger.warning(f"未找到要删除的关键词: group_id={group_id}, keyword_id={keyword_id}")
@@ -725,12 +905,13 @@ class Database:
             logger.error(f"删除关键词失败: {e}", exc_info=True)
             raise
 
-    async def get_keywords(self, group_id: int) -> List[Dict[str, Any]]:
+    async def get_keywords(self, group_id: int, limit: int = DEFAULT_LIST_LIMIT) -> List[Dict[str, Any]]:
         """
-        获取群组的关键词列表
+        获取群组的关键词列表，最多返回 limit 条
         
         参数:
             group_id: 群组ID
+            limit: 最多返回的关键词数
             
         返回:
             关键词列表
@@ -739,14 +920,61 @@ class Database:
         try:
             return await self.db.keywords.find({
                 'group_id': group_id
-            }).to_list(None)
+            }).limit(limit).to_list(limit)
         except Exception as e:
             logger.error(f"获取关键词列表失败: {e}", exc_info=True)
             return []
 
+    async def get_keywords_page(self, group_id: int, page: int,
+                                page_size: int) -> Tuple[List[Dict[str, Any]], int]:
+        """
+        分页获取群组的关键词，只返回 _id 和 pattern，按创建顺序排序
+        
+        参数:
+            group_id: 群组ID
+            page: 页码，从1开始
+            page_size: 每页数量
+            
+        返回:
+            (当前页的关键词列表, 关键词总数)
+        """
+        await self.ensure_connected()
+        try:
+            keywords, total = await asyncio.gather(
+                self.db.keywords.find({'group_id': group_id}, {'pattern': 1})
+                    .sort('_id', ASCENDING)
+                    .skip((max(page, 1) - 1) * page_size)
+                    .limit(page_size)
+                    .to_list(page_size),
+                self.db.keywords.count_documents({'group_id': group_id})
+            )
+            return keywords, total
+        except Exception as e:
+            logger.error(f"分页获取关键词列表失败: {e}", exc_info=True)
+            return [], 0
+
+    async def iter_keywords(self, group_id: int, batch_size: int = DEFAULT_BATCH_SIZE,
+                            projection: Optional[Dict[str, Any]] = None) -> AsyncIterator[Dict[str, Any]]:
+        """
+        流式遍历群组的关键词，中途出错时重新抛出异常
+
+        参数:
+            group_id: 群组ID
+            batch_size: 每批从服务器获取的文档数
+            projection: 可选的字段投影
+        """
+        await self.ensure_connected()
+        try:
+            cursor = self.db.keywords.find({'group_id': group_id}, projection)
+            async for keyword in cursor.batch_size(batch_size):
+                yield keyword
+        except Exception as e:
+            logger.error(f"遍历关键词列表失败: {e}", exc_info=True)
+            raise
+
     async def get_keyword_by_id(self, group_id: int, keyword_id: str) -> Optional[Dict[str, Any]]:
         """
-        通过ID获取关键词
+        通过ID获取关键词，优先使用关键词缓存
         
         参数:
             group_id: 群组ID
@@ -755,64 +983,252 @@ class Database:
         返回:
             关键词数据或None
         """
+        try:
+            obj_id = ObjectId(keyword_id)
+        except Exception:
+            obj_id = None
+        
+        if obj_id is not None:
+            keyword = self.keyword_cache.get(obj_id)
+            if keyword is not None:
+                return keyword
+        
+        generation = self.keyword_cache.generation()
         await self.ensure_connected()
         try:
-            logger.info(f"尝试获取关键词 - group_id: {group_id}, keyword_id: {keyword_id}")
-            
-            # 首先尝试作为ObjectId查询
-            try:
-                obj_id = ObjectId(keyword_id)
-                logger.info(f"已转换为ObjectId: {obj_id}")
-                
-                # 尝试方法1：使用提供的群组ID和对象ID查询
-                result = await self.db.keywords.find_one({
-                    'group_id': group_id,
-                    '_id': obj_id
-                })
-                
-                if result:
-                    logger.info(f"使用group_id={group_id}和ObjectId查找成功")
-                    return result
-                    
-                # 尝试方法2：仅使用对象ID查询
-                logger.warning(f"使用group_id={group_id}查找失败，尝试仅用ID查询")
-                alt_result = await self.db.keywords.find_one({'_id': obj_id})
-                
-                if alt_result:
-                    actual_group_id = alt_result.get('group_id')
-                    logger.warning(f"找到关键词，但群组ID不匹配: 预期={group_id}, 实际={actual_group_id}")
-                    return alt_result
-                
-            except Exception as e:
-                logger.info(f"'{keyword_id}'不是有效的ObjectId，尝试作为关键词模式查找")
-                
-            # 尝试作为关键词模式查询
-            pattern_result = await self.db.keywords.find_one({
-                'group_id': group_id,
-                'pattern': keyword_id
-            })
-            
-            if pattern_result:
-                logger.info(f"使用pattern='{keyword_id}'查找成功")
-                return pattern_result
+            if obj_id is not None:
+                # _id 唯一，一次查询即可，群组不匹配时仍返回（兼容旧数据）
+                keyword = await self.db.keywords.find_one({'_id': obj_id})
+                if keyword and keyword.get('group_id') != group_id:
+                    logger.debug("关键词 %s 的群组ID不匹配: 预期=%s, 实际=%s",
+                                 keyword_id, group_id, keyword.get('group_id'))
+            else:
+                # 不是有效的ObjectId时作为关键词模式查询
+                keyword = await self.db.keywords.find_one({'group_id': group_id, 'pattern': keyword_id})
             
-            logger.warning(f"关键词ID或模式 '{keyword_id}' 在数据库中不存在")
-            return None
+            if keyword:
+                keyword = self.keyword_cache.put(keyword, generation)
+            else:
+                logger.debug("关键词ID或模式 '%s' 在数据库中不存在", keyword_id)
+            return keyword
                     
         except Exception as e:
             logger.error(f"获取关键词失败: {e}", exc_info=True)
             return None
 
+    #######################################
+    # 消息统计分区路由
+    #######################################
+
+    @staticmethod
+    def stats_partition_name(date: str) -> str:
+        """
+        获取日期所属的统计分区集合名
+
+        参数:
+            date: 日期字符串 (YYYY-MM-DD)
+
+        返回:
+            分区集合名，如 message_stats_202501
+        """
+        return f"{STATS_PARTITION_PREFIX}{date[:4]}{date[5:7]}"
+
+    def stats_partitions(self, start_date: str, end_date: str) -> List[str]:
+        """
+        获取日期范围涉及的所有统计分区
+
+        参数:
+            start_date: 开始日期 (YYYY-MM-DD)
+            end_date: 结束日期 (YYYY-MM-DD)
+
+        返回:
+            分区集合名列表（按月份升序），存在旧版未分区数据时追加旧集合
+        """
+        year, month = int(start_date[:4]), int(start_date[5:7])
+        end_year, end_month = int(end_date[:4]), int(end_date[5:7])
+        partitions = []
+        while (year, month) <= (end_year, end_month):
+            partitions.append(f"{STATS_PARTITION_PREFIX}{year:04d}{month:02d}")
+            month += 1
+            if month > 12:
+                year, month = year + 1, 1
+        if self._legacy_stats:
+            partitions.append(LEGACY_STATS_COLLECTION)
+        return partitions
+
+    async def get_stats_collection(self, date: str):
+        """
+        获取日期对应的统计分区集合，首次使用时创建索引
+
+        参数:
+            date: 日期字符串 (YYYY-MM-DD)
+
+        返回:
+            分区集合对象
+        """
+        name = self.stats_partition_name(date)
+        if name not in self._stats_partitions:
+            collection = self.db[name]
+            await collection.create_index([
+                ("group_id", ASCENDING),
+                ("user_id", ASCENDING),
+                ("date", ASCENDING)
+            ])
+            # 同一条消息只记录一次，作为内存去重之外的兜底
+            await collection.create_index(
+                [("group_id", ASCENDING), ("message_id", ASCENDING)],
+                unique=True,
+                partialFilterExpression={'message_id': {'$exists': True}}
+            )
+            self._stats_partitions.add(name)
+            logger.info(f"已初始化统计分区: {name}")
+        return self.db[name]
+
+    def _stats_cursor(self, match: Dict[str, Any], start_date: str, end_date: str,
+                      pipeline: Optional[List[Dict[str, Any]]] = None, **options):
+        """
+        构建跨分区的聚合游标
+
+        首个分区作为聚合入口，其余分区通过 $unionWith 合并，
+        每个分区先各自执行 $match，再统一执行后续管道
+        """
+        partitions = self.stats_partitions(start_date, end_date)
+        stages = [{'$match': match}]
+        for name in partitions[1:]:
+            stages.append({'$unionWith': {'coll': name, 'pipeline': [{'$match': match}]}})
+        stages.extend(pipeline or [])
+        return self.db[partitions[0]].aggregate(stages, **options)
+
+    async def aggregate_stats(self, match: Dict[str, Any], start_date: str, end_date: str,
+                              pipeline: Optional[List[Dict[str, Any]]] = None,
+                              **options) -> List[Dict[str, Any]]:
+        """
+        在日期范围涉及的分区上执行聚合
+
+        参数:
+            match: 过滤条件（应包含日期条件）
+            start_date: 开始日期 (YYYY-MM-DD)
+            end_date: 结束日期 (YYYY-MM-DD)
+            pipeline: $match 之后的聚合阶段
+            options: 传递给 aggregate 的选项，如 maxTimeMS
+
+        返回:
+            聚合结果列表
+        """
+        await self.ensure_connected()
+        return await self._stats_cursor(match, start_date, end_date, pipeline, **options).to_list(None)
+
+    async def iter_stats(self, match: Dict[str, Any], start_date: str, end_date: str,
+                         pipeline: Optional[List[Dict[str, Any]]] = None,
+                         batch_size: int = DEFAULT_BATCH_SIZE,
+                         **options) -> AsyncIterator[Dict[str, Any]]:
+        """
+        流式读取跨分区聚合结果，内存占用与批大小相关而非结果总数
+
+        参数:
+            match: 过滤条件（应包含日期条件）
+            start_date: 开始日期 (YYYY-MM-DD)
+            end_date: 结束日期 (YYYY-MM-DD)
+            pipeline: $match 之后的聚合阶段
+            batch_size: 每批从服务器获取的文档数
+            options: 传递给 aggregate 的选项，如 maxTimeMS
+        """
+        await self.ensure_connected()
+        cursor = self._stats_cursor(match, start_date, end_date, pipeline, batchSize=batch_size, **options)
+        async for doc in cursor:
+            yield doc
+
+    async def count_stats_users(self, match: Dict[str, Any], start_date: str, end_date: str) -> int:
+        """
+        统计日期范围内符合条件的不同用户数，用于计算排行总页数
+
+        参数:
+            match: 过滤条件（应包含日期条件）
+            start_date: 开始日期 (YYYY-MM-DD)
+            end_date: 结束日期 (YYYY-MM-DD)
+
+        返回:
+            用户数
+        """
+        result = await self.aggregate_stats(match, start_date, end_date, [
+            {'$group': {'_id': '$user_id'}},
+            {'$count': 'total'}
+        ])
+        return result[0]['total'] if result else 0
+
+    async def count_stats(self, query: Dict[str, Any], start_date: str, end_date: str) -> int:
+        """
+        统计日期范围涉及分区中符合条件的记录数
+
+        参数:
+            query: 过滤条件
+            start_date: 开始日期 (YYYY-MM-DD)
+            end_date: 结束日期 (YYYY-MM-DD)
+
+        返回:
+            记录数
+        """
+        await self.ensure_connected()
+        counts = await asyncio.gather(*[
+            self.db[name].count_documents(query)
+            for name in self.stats_partitions(start_date, end_date)
+        ])
+        return sum(counts)
+
+    async def drop_stats_before(self, cutoff_date: str) -> int:
+        """
+        清理早于截止日期的统计数据
+
+        整月早于截止日期的分区直接删除集合，截止日期所在月份的分区
+        只删除早于截止日期的记录
+
+        参数:
+            cutoff_date: 截止日期 (YYYY-MM-DD)，早于该日期的数据将被清理
+
+        返回:
+            被删除的分区数量
+        """
+        await self.ensure_connected()
+        cutoff_partition = self.stats_partition_name(cutoff_date)
+        names = await self.db.list_collection_names(
+            filter={'name': {'$regex': f'^{STATS_PARTITION_PREFIX}\\d{{6}}$'}}
+        )
+
+        dropped = 0
+        for name in sorted(names):
+            if name < cutoff_partition:
+                await self.db.drop_collection(name)
+                self._stats_partitions.discard(name)
+                dropped += 1
+                logger.info(f"已删除过期统计分区: {name}")
+            elif name == cutoff_partition:
+                result = await self.db[name].delete_many({'date': {'$lt': cutoff_date}})
+                if result.deleted_count:
+                    logger.info(f"已从分区 {name} 清理 {result.deleted_count} 条过期统计")
+
+        # 旧版未分区集合中的数据按原方式清理，清空后删除集合
+        if self._legacy_stats:
+            await self.db[LEGACY_STATS_COLLECTION].delete_many({'date': {'$lt': cutoff_date}})
+            if await self.db[LEGACY_STATS_COLLECTION].estimated_document_count() == 0:
+                await self.db.drop_collection(LEGACY_STATS_COLLECTION)
+                self._legacy_stats = False
+                logger.info("旧版统计集合已清空并删除")
+
+        return dropped
+
     #######################################
     # 消息统计方法
     #######################################
-    
-    async def add_message_stat(self, stat_data: Dict[str, Any]):
+
+    async def add_message_stat(self, stat_data: Dict[str, Any]) -> bool:
         """
         添加消息统计
-        
+
         参数:
             stat_data: 统计数据
+
+        返回:
+            是否插入了新记录，消息已记录过时返回False
         """
         await self.ensure_connected()
         try:
@@ -821,11 +1237,16 @@ class Database:
             for field in required_fields:
                 if field not in stat_data:
                     raise ValueError(f"缺少必要字段 '{field}'")
-                    
-            await self.db.message_stats.insert_one({
+
+            collection = await self.get_stats_collection(stat_data['date'])
+            await collection.insert_one({
                 **stat_data,
                 'created_at': datetime.now()
             })
+            return True
+        except DuplicateKeyError:
+            logger.debug(f"消息统计已存在: group_id={stat_data['group_id']}, message_id={stat_data.get('message_id')}")
+            return False
         except Exception as e:
             logger.error(f"添加消息统计失败: {e}", exc_info=True)
             raise
@@ -833,22 +1254,23 @@ class Database:
     async def get_recent_message_count(self, user_id: int, seconds: int = 60) -> int:
         """
         获取用户最近的消息数量
-        
+
         参数:
             user_id: 用户ID
             seconds: 时间范围（秒）
-            
+
         返回:
             消息数量
         """
         await self.ensure_connected()
         try:
-            since = datetime.now() - timedelta(seconds=seconds)
-            count = await self.db.message_stats.count_documents({
-                'user_id': user_id,
-                'created_at': {'$gte': since}
-            })
-            return count
+            now = datetime.now()
+            since = now - timedelta(seconds=seconds)
+            return await self.count_stats(
+                {'user_id': user_id, 'created_at': {'$gte': since}},
+                since.strftime('%Y-%m-%d'),
+                now.strftime('%Y-%m-%d')
+            )
         except Exception as e:
             logger.error(f"获取最近消息数量失败: {e}", exc_info=True)
             return 0
@@ -856,30 +1278,32 @@ class Database:
     async def add_message_with_transaction(self, message_data: dict):
         """
         使用事务添加消息
-        
+
         参数:
             message_data: 消息数据
         """
         await self.ensure_connected()
+        # 分区集合需在事务外创建
+        collection = await self.get_stats_collection(message_data['date'])
         async with await self.client.start_session() as session:
             async with session.start_transaction():
                 try:
                     # 添加消息统计
-                    await self.db.message_stats.insert_one(
+                    await collection.insert_one(
                         {
                             **message_data,
                             'created_at': datetime.now()
                         },
                         session=session
                     )
-                    
+
                     # 更新用户统计
                     await self.db.users.update_one(
                         {'user_id': message_data['user_id']},
                         {'$inc': {'total_messages': 1}},
                         session=session
                     )
-                    
+
                     logger.info(f"已添加消息统计: user_id={message_data['user_id']}")
                 except Exception as e:
                     await session.abort_transaction()
@@ -889,17 +1313,15 @@ class Database:
     async def cleanup_old_stats(self, days: int = 30):
         """
         清理旧的统计数据
-        
+
         参数:
             days: 保留天数
         """
         await self.ensure_connected()
         try:
             cutoff_date = (datetime.now() - timedelta(days=days)).strftime('%Y-%m-%d')
-            result = await self.db.message_stats.delete_many({
-                'date': {'$lt': cutoff_date}
-            })
-            logger.info(f"已清理 {days} 天前的统计数据，共 {result.deleted_count} 条")
+            dropped = await self.drop_stats_before(cutoff_date)
+            logger.info(f"已清理 {days} 天前的统计数据，共删除 {dropped} 个分区")
         except Exception as e:
             logger.error(f"清理统计数据失败: {e}", exc_info=True)
             raise
@@ -910,17 +1332,15 @@ class Database:
         try:
             # 清理过期的统计数据
             cutoff_date = (datetime.now() - timedelta(days=30)).strftime('%Y-%m-%d')
-            stats_result = await self.db.message_stats.delete_many({
-                'date': {'$lt': cutoff_date}
-            })
-            
+            dropped = await self.drop_stats_before(cutoff_date)
+
             # 清理过期的轮播消息
             now = datetime.now()
             broadcast_result = await self.db.broadcasts.delete_many({
                 'end_time': {'$lt': now}
             })
-            
-            logger.info(f"数据清理完成: 删除了 {stats_result.deleted_count} 条统计数据和 {broadcast_result.deleted_count} 条过期轮播消息")
+
+            logger.info(f"数据清理完成: 删除了 {dropped} 个统计分区和 {broadcast_result.deleted_count} 条过期轮播消息")
         except Exception as e:
             logger.error(f"数据清理失败: {e}", exc_info=True)
             raise
@@ -928,69 +1348,223 @@ class Database:
     #######################################
     # 统计聚合方法
     #######################################
-    
-    async def get_daily_stats(self, group_id: int, date: str) -> List[Dict[str, Any]]:
+
+    @staticmethod
+    def _rank_pipeline(skip: int = 0, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """构建按用户汇总并排序的排行管道，分页条件下推到服务器"""
+        pipeline = [
+            {'$group': {
+                '_id': '$user_id',
+                'total_messages': {'$sum': '$total_messages'},
+                'total_size': {'$sum': '$total_size'}
+            }},
+            {'$sort': {'total_messages': -1, '_id': 1}}
+        ]
+        if skip:
+            pipeline.append({'$skip': skip})
+        if limit:
+            pipeline.append({'$limit': limit})
+        return pipeline
+
+    async def get_daily_stats(self, group_id: int, date: str,
+                              skip: int = 0, limit: Optional[int] = None) -> List[Dict[str, Any]]:
         """
         获取指定日期的统计数据
-        
+
         参数:
             group_id: 群组ID
             date: 日期字符串 (YYYY-MM-DD)
-            
+            skip: 跳过的记录数
+            limit: 返回的最大记录数，None表示不限制
+
         返回:
             统计数据列表
         """
         await self.ensure_connected()
         try:
-            pipeline = [
-                {'$match': {'group_id': group_id, 'date': date}},
-                {'$group': {
-                    '_id': '$user_id',
-                    'total_messages': {'$sum': '$total_messages'},
-                    'total_size': {'$sum': '$total_size'}
-                }},
-                {'$sort': {'total_messages': -1}}
-            ]
-            return await self.db.message_stats.aggregate(pipeline).to_list(None)
+            return await self.aggregate_stats(
+                {'group_id': group_id, 'date': date}, date, date,
+                self._rank_pipeline(skip, limit)
+            )
         except Exception as e:
             logger.error(f"获取日统计数据失败: {e}", exc_info=True)
             return []
 
-    async def get_monthly_stats(self, group_id: int, start_date: str, end_date: str) -> List[Dict[str, Any]]:
+    async def get_monthly_stats(self, group_id: int, start_date: str, end_date: str,
+                                skip: int = 0, limit: Optional[int] = None) -> List[Dict[str, Any]]:
         """
         获取指定月份的统计数据
-        
+
         参数:
             group_id: 群组ID
             start_date: 开始日期 (YYYY-MM-DD)
             end_date: 结束日期 (YYYY-MM-DD)
-            
+            skip: 跳过的记录数
+            limit: 返回的最大记录数，None表示不限制
+
         返回:
             统计数据列表
         """
         await self.ensure_connected()
         try:
-            pipeline = [
-                {
-                    '$match': {
-                        'group_id': group_id,
-                        'date': {'$gte': start_date, '$lte': end_date}
-                    }
-                },
-                {
-                    '$group': {
-                        '_id': '$user_id',
-                        'total_messages': {'$sum': '$total_messages'},
-                        'total_size': {'$sum': '$total_size'}
-                    }
-                },
-                {'$sort': {'total_messages': -1}}
-            ]
-            return await self.db.message_stats.aggregate(pipeline).to_list(None)
+            match = {
+                'group_id': group_id,
+                'date': {'$gte': start_date, '$lte': end_date}
+            }
+            return await self.aggregate_stats(
+                match, start_date, end_date, self._rank_pipeline(skip, limit)
+            )
         except Exception as e:
             logger.error(f"获取月统计数据失败: {e}", exc_info=True)
             return []
 
+    #######################################
+    # 统计摘要方法
+    #######################################
+
+    @staticmethod
+    def _active_day_bit(window_end: datetime) -> Dict[str, Any]:
+        """构建把日期映射为活跃天位图中某一位的表达式，第0位对应窗口结束日"""
+        return {'$toLong': {'$pow': [2, {'$toInt': {'$divide': [
+            {'$subtract': [window_end, {'$dateFromString': {'dateString': '$_id.date'}}]},
+            86400000
+        ]}}]}}
+
+    async def rebuild_stats_summaries(self, window_days: int = 30) -> Tuple[str, ObjectId]:
+        """
+        重建用户和群组的活跃度摘要
+
+        在服务器端按窗口聚合统计分区，结果通过 $merge 写入摘要集合，
+        每个摘要文档包含消息总数、总字节数和活跃天位图，群组摘要额外包含去重用户数。
+        摘要只包含 _id 早于截止点的统计记录，之后写入的记录由调用方实时补齐
+
+        参数:
+            window_days: 摘要窗口天数，不超过 MAX_SUMMARY_WINDOW_DAYS
+
+        返回:
+            (本次摘要的窗口结束日期 YYYY-MM-DD, 截止点ObjectId)
+
+        抛出:
+            ValueError: 窗口天数超出位图范围
+        """
+        if not 0 < window_days <= MAX_SUMMARY_WINDOW_DAYS:
+            raise ValueError(f"摘要窗口天数必须在1到{MAX_SUMMARY_WINDOW_DAYS}之间: {window_days}")
+        await self.ensure_connected()
+        now = datetime.now()
+        cutoff = ObjectId.from_datetime(datetime.now(timezone.utc))
+        end_date = now.strftime('%Y-%m-%d')
+        start_date = (now - timedelta(days=window_days)).strftime('%Y-%m-%d')
+        window_end = datetime.strptime(end_date, '%Y-%m-%d')
+        match = {'date': {'$gte': start_date, '$lte': end_date}, '_id': {'$lt': cutoff}}
+        stamp = {'window_days': window_days, 'window_end': end_date, 'updated_at': now}
+        per_day = {'$group': {
+            '_id': {'group_id': '$group_id', 'user_id': '$user_id', 'date': '$date'},
+            'messages': {'$sum': '$total_messages'},
+            'size': {'$sum': '$total_size'}
+        }}
+
+        # 用户摘要：(群组, 用户, 日期) -> (群组, 用户)
+        await self.aggregate_stats(match, start_date, end_date, [
+            per_day,
+            {'$set': {'bit': self._active_day_bit(window_end)}},
+            {'$group': {
+                '_id': {'group_id': '$_id.group_id', 'user_id': '$_id.user_id'},
+                'total_messages': {'$sum': '$messages'},
+                'total_size': {'$sum': '$size'},
+                'active_days': {'$sum': '$bit'}
+            }},
+            {'$set': stamp},
+            {'$merge': {'into': 'user_stat_summaries', 'whenMatched': 'replace', 'whenNotMatched': 'insert'}}
+        ])
+
+        # 群组摘要：(群组, 日期) 汇总消息数和活跃天位图
+        await self.aggregate_stats(match, start_date, end_date, [
+            {'$group': {
+                '_id': {'group_id': '$group_id', 'date': '$date'},
+                'messages': {'$sum': '$total_messages'},
+                'size': {'$sum': '$total_size'}
+            }},
+            {'$set': {'bit': self._active_day_bit(window_end)}},
+            {'$group': {
+                '_id': '$_id.group_id',
+                'total_messages': {'$sum': '$messages'},
+                'total_size': {'$sum': '$size'},
+                'active_days': {'$sum': '$bit'}
+            }},
+            {'$set': stamp},
+            {'$merge': {'into': 'group_stat_summaries', 'whenMatched': 'replace', 'whenNotMatched': 'insert'}}
+        ])
+
+        # 群组摘要：(群组, 用户) 计数得到去重用户数，不构建用户数组
+        await self.aggregate_stats(match, start_date, end_date, [
+            {'$group': {'_id': {'group_id': '$group_id', 'user_id': '$user_id'}}},
+            {'$group': {'_id': '$_id.group_id', 'unique_users': {'$sum': 1}}},
+            {'$merge': {'into': 'group_stat_summaries', 'whenMatched': 'merge', 'whenNotMatched': 'discard'}}
+        ])
+
+        # 清除已移出窗口的旧摘要
+        stale = {'window_end': {'$ne': end_date}}
+        await self.db.user_stat_summaries.delete_many(stale)
+        await self.db.group_stat_summaries.delete_many(stale)
+
+        logger.info(f"统计摘要已重建: 窗口={start_date}~{end_date}")
+        return end_date, cutoff
+
+    async def get_user_stat_summary(self, group_id: int, user_id: int) -> Optional[Dict[str, Any]]:
+        """
+        获取用户活跃度摘要
+
+        参数:
+            group_id: 群组ID
+            user_id: 用户ID
+
+        返回:
+            摘要文档或None
+        """
+        await self.ensure_connected()
+        try:
+            return await self.db.user_stat_summaries.find_one(
+                {'_id': {'group_id': group_id, 'user_id': user_id}}
+            )
+        except Exception as e:
+            logger.error(f"获取用户统计摘要失败: {e}", exc_info=True)
+            return None
+
+    async def get_group_stat_summary(self, group_id: int) -> Optional[Dict[str, Any]]:
+        """
+        获取群组活跃度摘要
+
+        参数:
+            group_id: 群组ID
+
+        返回:
+            摘要文档或None
+        """
+        await self.ensure_connected()
+        try:
+            return await self.db.group_stat_summaries.find_one({'_id': group_id})
+        except Exception as e:
+            logger.error(f"获取群组统计摘要失败: {e}", exc_info=True)
+            return None
+
+    async def count_user_stat_summaries(self, group_id: int, user_ids: List[int]) -> int:
+        """
+        统计给定用户中已有活跃度摘要的人数
+
+        参数:
+            group_id: 群组ID
+            user_ids: 用户ID列表
+
+        返回:
+            已有摘要的用户数
+        """
+        if not user_ids:
+            return 0
+        await self.ensure_connected()
+        return await self.db.user_stat_summaries.count_documents({
+            '_id': {'$in': [{'group_id': group_id, 'user_id': user_id} for user_id in user_ids]}
+        })
+
     #######################################
     # 轮播消息方法
     #######################################
@@ -1096,12 +1670,13 @@ class Database:
             logger.error(f"删除轮播消息失败: {e}", exc_info=True)
             return False
 
-    async def get_broadcasts(self, group_id: int) -> List[Dict[str, Any]]:
+    async def get_broadcasts(self, group_id: int, limit: int = DEFAULT_LIST_LIMIT) -> List[Dict[str, Any]]:
         """
-        获取群组的轮播消息列表
+        获取群组的轮播消息列表，最多返回 limit 条
         
         参数:
             group_id: 群组ID
+            limit: 最多返回的轮播消息数
             
         返回:
             轮播消息列表
@@ -1110,11 +1685,30 @@ class Database:
         try:
             return await self.db.broadcasts.find({
                 'group_id': group_id
-            }).to_list(None)
+            }).limit(limit).to_list(limit)
         except Exception as e:
             logger.error(f"获取轮播消息列表失败: {e}", exc_info=True)
             return []
 
+    async def iter_broadcasts(self, group_id: int, batch_size: int = DEFAULT_BATCH_SIZE,
+                              projection: Optional[Dict[str, Any]] = None) -> AsyncIterator[Dict[str, Any]]:
+        """
+        流式遍历群组的轮播消息，中途出错时重新抛出异常
+
+        参数:
+            group_id: 群组ID
+            batch_size: 每批从服务器获取的文档数
+            projection: 可选的字段投影
+        """
+        await self.ensure_connected()
+        try:
+            cursor = self.db.broadcasts.find({'group_id': group_id}, projection)
+            async for broadcast in cursor.batch_size(batch_size):
+                yield broadcast
+        except Exception as e:
+            logger.error(f"遍历轮播消息列表失败: {e}", exc_info=True)
+            raise
+
     async def get_active_broadcasts(self) -> List[Dict[str, Any]]:
         """
         获取所有活动的轮播消息
@@ -1143,12 +1737,12 @@ class Database:
         """获取所有应该发送的轮播消息"""
         await self.ensure_connected()
         now = datetime.now()
-        logger.info(f"查询应该发送的轮播消息，当前时间: {now}")
+        logger.debug("查询应该发送的轮播消息，当前时间: %s", now)
         
         try:
             # 1. 首先确保所有轮播消息的时间字段都是datetime类型
             normalized_count = await self.normalize_broadcast_datetimes()
-            logger.info(f"标准化了 {normalized_count} 条轮播消息的时间字段")
+            logger.debug("标准化了 %s 条轮播消息的时间字段", normalized_count)
             
             # 2. 查询未发送过的轮播消息
             not_sent_query = {
@@ -1161,12 +1755,13 @@ class Database:
             }
             
             not_sent_broadcasts = await self.db.broadcasts.find(not_sent_query).to_list(None)
-            logger.info(f"找到 {len(not_sent_broadcasts)} 个未发送过的轮播消息")
+            logger.debug("找到 %s 个未发送过的轮播消息", len(not_sent_broadcasts))
             
             # 打印详细日志
-            for bc in not_sent_broadcasts:
-                logger.info(f"未发送轮播: ID={bc['_id']}, 群组={bc.get('group_id')}, "
-                           f"开始时间={bc.get('start_time')}, 结束时间={bc.get('end_time')}")
+            if logger.isEnabledFor(logging.DEBUG):
+                for bc in not_sent_broadcasts:
+                    logger.debug("未发送轮播: ID=%s, 群组=%s, 开始时间=%s, 结束时间=%s",
+                                 bc['_id'], bc.get('group_id'), bc.get('start_time'), bc.get('end_time'))
             
             # 3. 查询已发送但应再次发送的轮播消息
             interval_query = {
@@ -1178,7 +1773,7 @@ class Database:
             }
             
             interval_broadcasts = await self.db.broadcasts.find(interval_query).to_list(None)
-            logger.info(f"找到 {len(interval_broadcasts)} 个可能需要再次发送的轮播消息")
+            logger.debug("找到 %s 个可能需要再次发送的轮播消息", len(interval_broadcasts))
             
             # 不检查间隔时间，直接全部添加到待发送列表，让轮播管理器基于锚点时间判断
             due_interval_broadcasts = []
@@ -1488,3 +2083,89 @@ class Database:
         except Exception as e:
             logger.error(f"设置系统标志失败: {e}", exc_info=True)
             return False
+
+    #######################################
+    # 交互状态持久化方法
+    #######################################
+
+    async def save_interaction_state(self, namespace: str, user_id: int, data: Dict[str, Any]):
+        """
+        保存用户的交互状态（表单等），过期时间由 updated_at 上的TTL索引控制，失败时抛出异常
+        
+        参数:
+            namespace: 状态类型
+            user_id: 用户ID
+            data: 状态数据
+        """
+        await self.ensure_connected()
+        try:
+            await self.db.interaction_states.update_one(
+                {'_id': f"{namespace}:{user_id}"},
+                {'$set': {
+                    'namespace': namespace,
+                    'user_id': user_id,
+                    'data': data,
+                    'updated_at': datetime.now()
+                }},
+                upsert=True
+            )
+        except Exception as e:
+            logger.error(f"保存交互状态失败: {e}", exc_info=True)
+            raise
+
+    async def load_interaction_state(self, namespace: str, user_id: int) -> Optional[Dict[str, Any]]:
+        """
+        读取用户的交互状态，失败时抛出异常，以免与状态不存在混淆
+        
+        参数:
+            namespace: 状态类型
+            user_id: 用户ID
+            
+        返回:
+            状态数据，不存在时返回None
+        """
+        await self.ensure_connected()
+        try:
+            doc = await self.db.interaction_states.find_one(
+                {'_id': f"{namespace}:{user_id}"}, {'data': 1}
+            )
+            return doc['data'] if doc else None
+        except Exception as e:
+            logger.error(f"读取交互状态失败: {e}", exc_info=True)
+            raise
+
+    async def delete_interaction_state(self, namespace: str, user_id: int):
+        """
+        删除用户的交互状态，失败时抛出异常
+        
+        参数:
+            namespace: 状态类型
+            user_id: 用户ID
+        """
+        await self.ensure_connected()
+        try:
+            await self.db.interaction_states.delete_one({'_id': f"{namespace}:{user_id}"})
+        except Exception as e:
+            logger.error(f"删除交互状态失败: {e}", exc_info=True)
+            raise
+
+    async def get_interaction_state_users(self, namespace: str) -> List[int]:
+        """
+        获取保存了指定类型交互状态的用户ID
+        
+        参数:
+            namespace: 状态类型
+            
+        返回:
+            用户ID列表
+        """
+        await self.ensure_connected()
+        try:
+            cursor = self.db.interaction_states.find({'namespace': namespace}, {'user_id': 1, '_id': 0})
+            return [doc['user_id'] async for doc in cursor]
+        except Exception as e:
+            logger.error(f"获取交互状态用户失败: {e}", exc_info=True)
+            return []
+
+# 为所有公开的协程方法添加调用统计、耗时和慢查询记录
+db_instrumentation.instrument(Database)
@@ -0,0 +1,221 @@
+"""
+数据库操作埋点，记录 Database 各方法的调用次数、耗时分位数、错误率和慢查询
+"""
+import asyncio
+import functools
+import logging
+import time
+from collections import deque
+from typing import Any, Callable, Dict, List
+
+from utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# 数据库操作耗时
+DB_LATENCY = metrics.histogram(
+    'bot_db_operation_duration_seconds', 'Database方法耗时', ('method',)
+)
+DB_ERRORS = metrics.counter(
+    'bot_db_operation_errors_total', 'Database方法抛出的异常数', ('method',)
+)
+
+# 不参与埋点的方法
+EXCLUDED_METHODS = frozenset({'ensure_connected'})
+
+def query_shape(value: Any, depth: int = 0) -> Any:
+    """
+    提取查询结构，保留字段名和操作符，将具体值替换为类型名
+
+    参数:
+        value: 查询条件、管道或普通参数
+        depth: 当前嵌套深度
+
+    返回:
+        查询结构
+    """
+    if depth > 4:
+        return '...'
+    if isinstance(value, dict):
+        return {key: query_shape(item, depth + 1) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        if value and all(isinstance(item, dict) for item in value):
+            return [query_shape(item, depth + 1) for item in value]
+        return f"[{len(value)}]"
+    return type(value).__name__
+
+class MethodStats:
+    """单个方法的累计统计"""
+    def __init__(self, sample_size: int):
+        """
+        初始化方法统计
+
+        参数:
+            sample_size: 用于计算分位数的最近耗时样本数
+        """
+        self.count = 0
+        self.errors = 0
+        self.slow = 0
+        self.total_seconds = 0.0
+        self.samples = deque(maxlen=sample_size)
+
+    def percentile(self, q: float) -> float:
+        """
+        计算最近样本的耗时分位数
+
+        参数:
+            q: 分位数 (0-1)
+
+        返回:
+            耗时（秒）
+        """
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+class DatabaseInstrumentation:
+    """
+    Database 方法埋点
+
+    可在运行时开关；关闭时包装函数直接调用原方法，不做任何记录
+    """
+    def __init__(self, enabled: bool = True, slow_threshold_ms: float = 200, sample_size: int = 1024):
+        """
+        初始化埋点
+
+        参数:
+            enabled: 是否启用
+            slow_threshold_ms: 慢查询阈值（毫秒）
+            sample_size: 每个方法保留的耗时样本数
+        """
+        self.enabled = enabled
+        self.slow_threshold = slow_threshold_ms / 1000
+        self.sample_size = sample_size
+        self._stats: Dict[str, MethodStats] = {}
+
+    def configure(self, enabled: bool = None, slow_threshold_ms: float = None, sample_size: int = None):
+        """
+        更新埋点设置
+
+        参数:
+            enabled: 是否启用
+            slow_threshold_ms: 慢查询阈值（毫秒）
+            sample_size: 每个方法保留的耗时样本数，修改后清空已有统计
+        """
+        if enabled is not None:
+            self.enabled = enabled
+        if slow_threshold_ms is not None:
+            self.slow_threshold = slow_threshold_ms / 1000
+        if sample_size is not None and sample_size != self.sample_size:
+            self.sample_size = sample_size
+            self._stats.clear()
+        logger.info(
+            f"数据库埋点设置: enabled={self.enabled}, "
+            f"slow_threshold={self.slow_threshold * 1000:.0f}ms, sample_size={self.sample_size}"
+        )
+
+    def reset(self):
+        """清空已记录的统计"""
+        self._stats.clear()
+
+    def record(self, method: str, elapsed: float, failed: bool, args: tuple, kwargs: dict):
+        """
+        记录一次方法调用
+
+        参数:
+            method: 方法名
+            elapsed: 耗时（秒）
+            failed: 是否抛出异常
+            args: 位置参数（不含self）
+            kwargs: 关键字参数
+        """
+        stats = self._stats.get(method)
+        if stats is None:
+            stats = self._stats[method] = MethodStats(self.sample_size)
+        stats.count += 1
+        stats.total_seconds += elapsed
+        stats.samples.append(elapsed)
+        DB_LATENCY.observe(elapsed, method=method)
+        if failed:
+            stats.errors += 1
+            DB_ERRORS.inc(method=method)
+        if elapsed >= self.slow_threshold:
+            stats.slow += 1
+            shape = [query_shape(arg) for arg in args]
+            if kwargs:
+                shape.append(query_shape(kwargs))
+            logger.warning(f"慢查询: {method} 耗时 {elapsed * 1000:.1f}ms, 查询结构: {shape}")
+
+    def wrap(self, method: str, func: Callable) -> Callable:
+        """
+        包装协程方法
+
+        参数:
+            method: 方法名
+            func: 协程方法
+
+        返回:
+            包装后的方法
+        """
+        @functools.wraps(func)
+        async def wrapper(db, *args, **kwargs):
+            if not self.enabled:
+                return await func(db, *args, **kwargs)
+            start = time.perf_counter()
+            failed = False
+            try:
+                return await func(db, *args, **kwargs)
+            except Exception:
+                failed = True
+                raise
+            finally:
+                self.record(method, time.perf_counter() - start, failed, args, kwargs)
+        return wrapper
+
+    def instrument(self, cls):
+        """
+        为类中所有公开的协程方法添加埋点（异步生成器不在此列）
+
+        参数:
+            cls: 待埋点的类
+
+        返回:
+            原类
+        """
+        for name, func in list(vars(cls).items()):
+            if name.startswith('_') or name in EXCLUDED_METHODS:
+                continue
+            if asyncio.iscoroutinefunction(func):
+                setattr(cls, name, self.wrap(name, func))
+        return cls
+
+    def snapshot(self, sort_by: str = 'p99', limit: int = None) -> List[Dict[str, Any]]:
+        """
+        获取各方法的统计快照
+
+        参数:
+            sort_by: 排序字段，如 p99、count、errors、total_ms
+            limit: 返回条数
+
+        返回:
+            按排序字段降序排列的统计列表
+        """
+        rows = []
+        for method, stats in self._stats.items():
+            rows.append({
+                'method': method,
+                'count': stats.count,
+                'errors': stats.errors,
+                'error_rate': stats.errors / stats.count if stats.count else 0.0,
+                'slow': stats.slow,
+                'total_ms': stats.total_seconds * 1000,
+                'p50': stats.percentile(0.5) * 1000,
+                'p95': stats.percentile(0.95) * 1000,
+                'p99': stats.percentile(0.99) * 1000
+            })
+        rows.sort(key=lambda row: row.get(sort_by, 0), reverse=True)
+        return rows[:limit] if limit else rows
+
+# 全局埋点实例
+db_instrumentation = DatabaseInstrumentation()
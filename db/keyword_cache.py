@@ -0,0 +1,123 @@
+"""
+关键词文档缓存，匹配成功时写入，回复时直接使用，避免再次查询数据库
+
+文档以不可变的 Keyword 模型缓存，比原始字典占用更少内存，也不会被调用方意外修改
+"""
+from collections import OrderedDict
+from typing import Any, Dict, Mapping, Optional, Tuple
+
+from bson import ObjectId
+
+from db.models import Keyword
+from utils.metrics import record_cache
+
+class KeywordCache:
+    """
+    按 ObjectId 缓存关键词文档的LRU缓存
+
+    同时维护 (群组ID, 模式) 到 ObjectId 的索引，按模式更新关键词时
+    可以找到并失效对应的缓存项。
+
+    每次失效都会递增失效代数并记录到对应群组。调用方在读取数据库前取得当前代数，
+    写入缓存时传给 put；读取期间该群组发生过失效时，读到的文档可能已过期，不会写入缓存
+    """
+    def __init__(self, max_size: int = 1024):
+        """
+        初始化缓存
+
+        参数:
+            max_size: 最多缓存的关键词数
+        """
+        self.max_size = max_size
+        self._docs: 'OrderedDict[ObjectId, Keyword]' = OrderedDict()
+        self._by_pattern: Dict[Tuple[int, str], ObjectId] = {}
+        self._generation = 0
+        # 群组ID -> 该群组最近一次失效时的代数
+        self._group_generations: Dict[int, int] = {}
+        # 无法确定群组的失效对所有群组生效
+        self._min_generation = 0
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    def generation(self) -> int:
+        """获取当前失效代数，在读取数据库前调用"""
+        return self._generation
+
+    def _bump(self, group_id: Optional[int]):
+        """递增失效代数并记录到群组"""
+        self._generation += 1
+        if group_id is None:
+            self._min_generation = self._generation
+        else:
+            self._group_generations[group_id] = self._generation
+
+    def put(self, keyword: Mapping[str, Any], generation: Optional[int] = None) -> Keyword:
+        """
+        缓存关键词文档
+
+        参数:
+            keyword: 完整的关键词文档或 Keyword 对象
+            generation: 读取该文档前获取的失效代数，读取后群组已失效时不写入缓存
+
+        返回:
+            Keyword 对象
+        """
+        if not isinstance(keyword, Keyword):
+            keyword = Keyword.from_dict(keyword)
+        if generation is not None and generation < max(
+            self._min_generation, self._group_generations.get(keyword.group_id, 0)
+        ):
+            return keyword
+        keyword_id = keyword.id
+        self._docs[keyword_id] = keyword
+        self._docs.move_to_end(keyword_id)
+        self._by_pattern[(keyword.group_id, keyword.pattern)] = keyword_id
+        while len(self._docs) > self.max_size:
+            _, evicted = self._docs.popitem(last=False)
+            self._by_pattern.pop((evicted.group_id, evicted.pattern), None)
+        return keyword
+
+    def get(self, keyword_id: ObjectId) -> Optional[Keyword]:
+        """
+        获取缓存的关键词
+
+        参数:
+            keyword_id: 关键词ID
+
+        返回:
+            Keyword 对象或None
+        """
+        keyword = self._docs.get(keyword_id)
+        record_cache('keyword_doc', keyword is not None)
+        if keyword is not None:
+            self._docs.move_to_end(keyword_id)
+        return keyword
+
+    def invalidate(self, keyword_id: ObjectId, group_id: Optional[int] = None):
+        """
+        使指定ID的关键词失效
+
+        参数:
+            keyword_id: 关键词ID
+            group_id: 关键词所属群组，未缓存且未给出时失效代数对所有群组生效
+        """
+        keyword = self._docs.pop(keyword_id, None)
+        if keyword is not None:
+            self._by_pattern.pop((keyword.group_id, keyword.pattern), None)
+            group_id = keyword.group_id
+        self._bump(group_id)
+
+    def invalidate_pattern(self, group_id: int, pattern: str):
+        """使指定群组中指定模式的关键词失效"""
+        keyword_id = self._by_pattern.pop((group_id, pattern), None)
+        if keyword_id is not None:
+            self._docs.pop(keyword_id, None)
+        self._bump(group_id)
+
+    def invalidate_group(self, group_id: int):
+        """使指定群组的所有关键词失效"""
+        for keyword_id in [kid for kid, kw in self._docs.items() if kw.group_id == group_id]:
+            keyword = self._docs.pop(keyword_id)
+            self._by_pattern.pop((keyword.group_id, keyword.pattern), None)
+        self._bump(group_id)
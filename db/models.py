@@ -1,8 +1,14 @@
 """
 数据模型定义
+
+User、Group、Keyword、Broadcast、MessageStat 为字段保存在 __slots__ 中的不可变对象，
+用作内存中长期缓存的表示；同时提供只读的映射接口（get、[]、in），
+可以直接替换原先缓存的BSON字典。嵌套的列表和字典不复制，与原始文档共享
 """
+from collections.abc import Mapping
 from enum import Enum
-from typing import Dict, Any, Optional, List, Union
+from types import MappingProxyType
+from typing import Dict, Any, Optional, List, Union, Tuple
 from datetime import datetime
 
 class UserRole(Enum):
@@ -18,8 +24,149 @@ class GroupPermission(Enum):
     BROADCAST = "broadcast"
     AUTO_DELETE = 'auto_delete'
 
-class User:
+_NO_EXTRA = MappingProxyType({})
+
+class Model(Mapping):
+    """
+    不可变模型基类
+
+    子类在 _fields 中按 (字段名, 文档键) 声明字段，字段保存在 __slots__ 中，_id 对应 id 字段，
+    其余未声明的键保存在只读的 extra_data 中。_defaults 声明字段为None时使用的默认值，
+    可调用对象作为工厂函数，构造函数和 from_dict 使用相同的默认值。
+
+    映射接口与原始文档一致：文档中值为None的键仍然存在，没有默认值且文档中没有的键不存在。
+
+    不可变只针对对象本身：from_dict 不复制嵌套的值，media、buttons、settings 等
+    列表和字典与原始文档共享，调用方不应修改
+    """
+    __slots__ = ('extra_data', '_absent')
+    _fields: Tuple[Tuple[str, str], ...] = ()
+    _defaults: Dict[str, Any] = {}
+    # 构造时值为None则视为不存在的字段，如尚未写入数据库的 _id
+    _optional: Tuple[str, ...] = ('id',)
+    # 文档键 -> (字段名, 在 _absent 中的位)
+    _keys: Dict[str, Tuple[str, int]] = {}
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._keys = {key: (field, 1 << i) for i, (field, key) in enumerate(cls._fields)}
+
+    def _init(self, values: Dict[str, Any], extra: Dict[str, Any], data: Optional[Dict[str, Any]] = None):
+        """
+        按字段名设置所有字段并应用默认值，只在构造时调用
+
+        参数:
+            values: 字段名到值的映射
+            extra: 未声明的键
+            data: 来源文档；给出时文档中没有的键记为不存在，否则 _optional 中值为None的字段记为不存在
+        """
+        absent = 0
+        for i, (field, key) in enumerate(self._fields):
+            value = values.get(field)
+            if value is None:
+                default = self._defaults.get(field)
+                value = default() if callable(default) else default
+            if value is None and (key not in data if data is not None else field in self._optional):
+                absent |= 1 << i
+            object.__setattr__(self, field, value)
+        object.__setattr__(self, '_absent', absent)
+        object.__setattr__(self, 'extra_data', MappingProxyType(extra) if extra else _NO_EXTRA)
+
+    @classmethod
+    def _load(cls, data: Dict[str, Any], values: Dict[str, Any]):
+        """由子类的 from_dict 调用，不经过构造函数创建对象"""
+        obj = cls.__new__(cls)
+        obj._init(values, {key: value for key, value in data.items() if key not in cls._keys}, data)
+        return obj
+
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为字典"""
+        return dict(self)
+
+    def replace(self, **changes):
+        """
+        返回修改了指定字段的新对象
+
+        参数:
+            **changes: 字段名到新值的映射
+
+        返回:
+            新的模型对象
+        """
+        data = self.to_dict()
+        for name, value in changes.items():
+            data[self._field_key(name)] = value
+        return type(self).from_dict(data)
+
+    @classmethod
+    def _field_key(cls, name: str) -> str:
+        for field_name, key in cls._fields:
+            if field_name == name:
+                return key
+        return name
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} 是不可变对象")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"{type(self).__name__} 是不可变对象")
+
+    def __reduce__(self):
+        return type(self).from_dict, (self.to_dict(),)
+
+    # 只读映射接口，兼容按字典访问的代码
+
+    def __getitem__(self, key: str) -> Any:
+        spec = self._keys.get(key)
+        if spec is None:
+            return self.extra_data[key]
+        name, bit = spec
+        if self._absent & bit:
+            raise KeyError(key)
+        return getattr(self, name)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        spec = self._keys.get(key)
+        if spec is None:
+            return self.extra_data.get(key, default)
+        name, bit = spec
+        if self._absent & bit:
+            return default
+        return getattr(self, name)
+
+    def __contains__(self, key) -> bool:
+        spec = self._keys.get(key)
+        if spec is None:
+            return key in self.extra_data
+        return not self._absent & spec[1]
+
+    def __iter__(self):
+        absent = self._absent
+        for i, (_, key) in enumerate(self._fields):
+            if not absent & (1 << i):
+                yield key
+        yield from self.extra_data
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def __repr__(self) -> str:
+        fields = ', '.join(f"{name}={getattr(self, name)!r}" for name, _ in self._fields)
+        return f"{type(self).__name__}({fields})"
+
+class User(Model):
     """用户模型"""
+    _fields = (
+        ('id', '_id'), ('user_id', 'user_id'), ('role', 'role'), ('username', 'username'),
+        ('first_name', 'first_name'), ('last_name', 'last_name'), ('is_banned', 'is_banned'),
+        ('total_messages', 'total_messages'), ('created_at', 'created_at'), ('updated_at', 'updated_at'),
+    )
+    __slots__ = tuple(field for field, _ in _fields)
+    _defaults = {
+        'role': UserRole.USER.value, 'is_banned': False, 'total_messages': 0,
+        'created_at': datetime.now, 'updated_at': datetime.now,
+    }
+
     def __init__(
         self,
         user_id: int,
@@ -31,55 +178,26 @@ class User:
         total_messages: int = 0,
         created_at: Optional[datetime] = None,
         updated_at: Optional[datetime] = None,
+        id: Any = None,
         **kwargs
     ):
-        self.user_id = user_id
-        self.role = role
-        self.username = username
-        self.first_name = first_name
-        self.last_name = last_name
-        self.is_banned = is_banned
-        self.total_messages = total_messages
-        self.created_at = created_at or datetime.now()
-        self.updated_at = updated_at or datetime.now()
-        self.extra_data = kwargs
-        
+        self._init({
+            'id': id, 'user_id': user_id, 'role': role, 'username': username,
+            'first_name': first_name, 'last_name': last_name, 'is_banned': is_banned,
+            'total_messages': total_messages, 'created_at': created_at, 'updated_at': updated_at,
+        }, kwargs)
+
     @classmethod
     def from_dict(cls, data: Dict[str, Any]) -> 'User':
-        """从字典创建用户对象"""
-        return cls(
-            user_id=data.get('user_id'),
-            role=data.get('role', UserRole.USER.value),
-            username=data.get('username'),
-            first_name=data.get('first_name'),
-            last_name=data.get('last_name'),
-            is_banned=data.get('is_banned', False),
-            total_messages=data.get('total_messages', 0),
-            created_at=data.get('created_at'),
-            updated_at=data.get('updated_at'),
-            **{k: v for k, v in data.items() if k not in [
-                'user_id', 'role', 'username', 'first_name', 'last_name',
-                'is_banned', 'total_messages', 'created_at', 'updated_at'
-            ]}
-        )
-        
-    def to_dict(self) -> Dict[str, Any]:
-        """转换为字典"""
-        result = {
-            'user_id': self.user_id,
-            'role': self.role,
-            'username': self.username,
-            'first_name': self.first_name,
-            'last_name': self.last_name,
-            'is_banned': self.is_banned,
-            'total_messages': self.total_messages,
-            'created_at': self.created_at,
-            'updated_at': self.updated_at
-        }
-        # 添加额外数据
-        result.update(self.extra_data)
-        return result
-        
+        """从数据库文档创建用户对象"""
+        return cls._load(data, {
+            'id': data.get('_id'), 'user_id': data.get('user_id'), 'role': data.get('role'),
+            'username': data.get('username'), 'first_name': data.get('first_name'),
+            'last_name': data.get('last_name'), 'is_banned': data.get('is_banned'),
+            'total_messages': data.get('total_messages'),
+            'created_at': data.get('created_at'), 'updated_at': data.get('updated_at'),
+        })
+
     @property
     def full_name(self) -> str:
         """获取完整名称"""
@@ -95,8 +213,20 @@ class User:
         """检查是否为超级管理员"""
         return self.role == UserRole.SUPERADMIN.value
 
-class Group:
+class Group(Model):
     """群组模型"""
+    _fields = (
+        ('id', '_id'), ('group_id', 'group_id'), ('name', 'name'), ('permissions', 'permissions'),
+        ('settings', 'settings'), ('feature_switches', 'feature_switches'),
+        ('created_at', 'created_at'), ('updated_at', 'updated_at'),
+    )
+    __slots__ = tuple(field for field, _ in _fields)
+    _defaults = {
+        'permissions': list, 'settings': dict,
+        'feature_switches': lambda: {'keywords': True, 'stats': True, 'broadcast': True},
+        'created_at': datetime.now, 'updated_at': datetime.now,
+    }
+
     def __init__(
         self,
         group_id: int,
@@ -106,56 +236,24 @@ class Group:
         feature_switches: Optional[Dict[str, bool]] = None,
         created_at: Optional[datetime] = None,
         updated_at: Optional[datetime] = None,
+        id: Any = None,
         **kwargs
     ):
-        self.group_id = group_id
-        self.name = name
-        self.permissions = permissions or []
-        self.settings = settings or {}
-        self.feature_switches = feature_switches or {
-            'keywords': True,
-            'stats': True,
-            'broadcast': True
-        }
-        self.created_at = created_at or datetime.now()
-        self.updated_at = updated_at or datetime.now()
-        self.extra_data = kwargs
-        
+        self._init({
+            'id': id, 'group_id': group_id, 'name': name, 'permissions': permissions,
+            'settings': settings, 'feature_switches': feature_switches,
+            'created_at': created_at, 'updated_at': updated_at,
+        }, kwargs)
+
     @classmethod
     def from_dict(cls, data: Dict[str, Any]) -> 'Group':
-        """从字典创建群组对象"""
-        return cls(
-            group_id=data.get('group_id'),
-            name=data.get('name'),
-            permissions=data.get('permissions', []),
-            settings=data.get('settings', {}),
-            feature_switches=data.get('feature_switches', {
-                'keywords': True,
-                'stats': True,
-                'broadcast': True
-            }),
-            created_at=data.get('created_at'),
-            updated_at=data.get('updated_at'),
-            **{k: v for k, v in data.items() if k not in [
-                'group_id', 'name', 'permissions', 'settings',
-                'feature_switches', 'created_at', 'updated_at'
-            ]}
-        )
-        
-    def to_dict(self) -> Dict[str, Any]:
-        """转换为字典"""
-        result = {
-            'group_id': self.group_id,
-            'name': self.name,
-            'permissions': self.permissions,
-            'settings': self.settings,
-            'feature_switches': self.feature_switches,
-            'created_at': self.created_at,
-            'updated_at': self.updated_at
-        }
-        # 添加额外数据
-        result.update(self.extra_data)
-        return result
+        """从数据库文档创建群组对象"""
+        return cls._load(data, {
+            'id': data.get('_id'), 'group_id': data.get('group_id'), 'name': data.get('name'),
+            'permissions': data.get('permissions'), 'settings': data.get('settings'),
+            'feature_switches': data.get('feature_switches'),
+            'created_at': data.get('created_at'), 'updated_at': data.get('updated_at'),
+        })
         
     def has_permission(self, permission: Union[GroupPermission, str]) -> bool:
         """检查是否有指定权限"""
@@ -165,24 +263,37 @@ class Group:
             perm_value = permission
             
         # 首先检查权限列表
-        if perm_value not in self.permissions:
+        if perm_value not in (self.permissions or ()):
             return False
             
         # 然后检查功能开关
-        return self.feature_switches.get(perm_value, True)
+        return (self.feature_switches or {}).get(perm_value, True)
         
-    def update_settings(self, new_settings: Dict[str, Any]) -> None:
-        """更新设置"""
-        self.settings.update(new_settings)
-        self.updated_at = datetime.now()
+    def update_settings(self, new_settings: Dict[str, Any]) -> 'Group':
+        """返回更新了设置的新群组对象"""
+        return self.replace(settings={**(self.settings or {}), **new_settings}, updated_at=datetime.now())
         
-    def toggle_feature(self, feature: str, enabled: bool) -> None:
-        """切换功能开关"""
-        self.feature_switches[feature] = enabled
-        self.updated_at = datetime.now()
+    def toggle_feature(self, feature: str, enabled: bool) -> 'Group':
+        """返回切换了功能开关的新群组对象"""
+        return self.replace(
+            feature_switches={**(self.feature_switches or {}), feature: enabled},
+            updated_at=datetime.now()
+        )
 
-class Keyword:
+class Keyword(Model):
     """关键词模型"""
+    _fields = (
+        ('id', '_id'), ('group_id', 'group_id'), ('pattern', 'pattern'), ('type', 'type'),
+        ('match_type', 'match_type'), ('response', 'response'), ('media', 'media'),
+        ('buttons', 'buttons'), ('created_at', 'created_at'), ('updated_at', 'updated_at'),
+    )
+    __slots__ = tuple(field for field, _ in _fields)
+    _defaults = {
+        'match_type': 'exact', 'response': '', 'buttons': list,
+        'created_at': datetime.now, 'updated_at': datetime.now,
+    }
+    _optional = ('id', 'type')
+
     def __init__(
         self,
         group_id: int,
@@ -193,54 +304,36 @@ class Keyword:
         buttons: Optional[List[Dict[str, str]]] = None,
         created_at: Optional[datetime] = None,
         updated_at: Optional[datetime] = None,
+        type: Optional[str] = None,
+        id: Any = None,
         **kwargs
     ):
-        self.group_id = group_id
-        self.pattern = pattern
-        self.match_type = match_type
-        self.response = response or ''
-        self.media = media
-        self.buttons = buttons or []
-        self.created_at = created_at or datetime.now()
-        self.updated_at = updated_at or datetime.now()
-        self.extra_data = kwargs
-        
+        self._init({
+            'id': id, 'group_id': group_id, 'pattern': pattern, 'type': type,
+            'match_type': match_type, 'response': response, 'media': media, 'buttons': buttons,
+            'created_at': created_at, 'updated_at': updated_at,
+        }, kwargs)
+
     @classmethod
     def from_dict(cls, data: Dict[str, Any]) -> 'Keyword':
-        """从字典创建关键词对象"""
-        return cls(
-            group_id=data.get('group_id'),
-            pattern=data.get('pattern'),
-            match_type=data.get('match_type', 'exact'),
-            response=data.get('response', ''),
-            media=data.get('media'),
-            buttons=data.get('buttons', []),
-            created_at=data.get('created_at'),
-            updated_at=data.get('updated_at'),
-            **{k: v for k, v in data.items() if k not in [
-                'group_id', 'pattern', 'match_type', 'response',
-                'media', 'buttons', 'created_at', 'updated_at'
-            ]}
-        )
-        
-    def to_dict(self) -> Dict[str, Any]:
-        """转换为字典"""
-        result = {
-            'group_id': self.group_id,
-            'pattern': self.pattern,
-            'match_type': self.match_type,
-            'response': self.response,
-            'media': self.media,
-            'buttons': self.buttons,
-            'created_at': self.created_at,
-            'updated_at': self.updated_at
-        }
-        # 添加额外数据
-        result.update(self.extra_data)
-        return result
-
-class Broadcast:
+        """从数据库文档创建关键词对象"""
+        return cls._load(data, {
+            'id': data.get('_id'), 'group_id': data.get('group_id'), 'pattern': data.get('pattern'),
+            'type': data.get('type'), 'match_type': data.get('match_type'),
+            'response': data.get('response'), 'media': data.get('media'), 'buttons': data.get('buttons'),
+            'created_at': data.get('created_at'), 'updated_at': data.get('updated_at'),
+        })
+
+class Broadcast(Model):
     """轮播消息模型"""
+    _fields = (
+        ('id', '_id'), ('group_id', 'group_id'), ('start_time', 'start_time'), ('end_time', 'end_time'),
+        ('interval', 'interval'), ('text', 'text'), ('media', 'media'), ('buttons', 'buttons'),
+        ('last_broadcast', 'last_broadcast'), ('created_at', 'created_at'), ('updated_at', 'updated_at'),
+    )
+    __slots__ = tuple(field for field, _ in _fields)
+    _defaults = {'text': '', 'buttons': list, 'created_at': datetime.now, 'updated_at': datetime.now}
+
     def __init__(
         self,
         group_id: int,
@@ -253,58 +346,25 @@ class Broadcast:
         last_broadcast: Optional[datetime] = None,
         created_at: Optional[datetime] = None,
         updated_at: Optional[datetime] = None,
+        id: Any = None,
         **kwargs
     ):
-        self.group_id = group_id
-        self.start_time = start_time
-        self.end_time = end_time
-        self.interval = interval
-        self.text = text or ''
-        self.media = media
-        self.buttons = buttons or []
-        self.last_broadcast = last_broadcast
-        self.created_at = created_at or datetime.now()
-        self.updated_at = updated_at or datetime.now()
-        self.extra_data = kwargs
-        
+        self._init({
+            'id': id, 'group_id': group_id, 'start_time': start_time, 'end_time': end_time,
+            'interval': interval, 'text': text, 'media': media, 'buttons': buttons,
+            'last_broadcast': last_broadcast, 'created_at': created_at, 'updated_at': updated_at,
+        }, kwargs)
+
     @classmethod
     def from_dict(cls, data: Dict[str, Any]) -> 'Broadcast':
-        """从字典创建轮播消息对象"""
-        return cls(
-            group_id=data.get('group_id'),
-            start_time=data.get('start_time'),
-            end_time=data.get('end_time'),
-            interval=data.get('interval'),
-            text=data.get('text', ''),
-            media=data.get('media'),
-            buttons=data.get('buttons', []),
-            last_broadcast=data.get('last_broadcast'),
-            created_at=data.get('created_at'),
-            updated_at=data.get('updated_at'),
-            **{k: v for k, v in data.items() if k not in [
-                'group_id', 'start_time', 'end_time', 'interval',
-                'text', 'media', 'buttons', 'last_broadcast',
-                'created_at', 'updated_at'
-            ]}
-        )
-        
-    def to_dict(self) -> Dict[str, Any]:
-        """转换为字典"""
-        result = {
-            'group_id': self.group_id,
-            'start_time': self.start_time,
-            'end_time': self.end_time,
-            'interval': self.interval,
-            'text': self.text,
-            'media': self.media,
-            'buttons': self.buttons,
-            'last_broadcast': self.last_broadcast,
-            'created_at': self.created_at,
-            'updated_at': self.updated_at
-        }
-        # 添加额外数据
-        result.update(self.extra_data)
-        return result
+        """从数据库文档创建轮播消息对象"""
+        return cls._load(data, {
+            'id': data.get('_id'), 'group_id': data.get('group_id'),
+            'start_time': data.get('start_time'), 'end_time': data.get('end_time'),
+            'interval': data.get('interval'), 'text': data.get('text'), 'media': data.get('media'),
+            'buttons': data.get('buttons'), 'last_broadcast': data.get('last_broadcast'),
+            'created_at': data.get('created_at'), 'updated_at': data.get('updated_at'),
+        })
         
     def is_active(self, current_time: Optional[datetime] = None) -> bool:
         """检查是否处于活动状态"""
@@ -328,13 +388,20 @@ class Broadcast:
         time_diff = (current_time - self.last_broadcast).total_seconds()
         return time_diff >= self.interval
         
-    def update_last_broadcast(self, broadcast_time: Optional[datetime] = None) -> None:
-        """更新最后发送时间"""
-        self.last_broadcast = broadcast_time or datetime.now()
-        self.updated_at = datetime.now()
+    def update_last_broadcast(self, broadcast_time: Optional[datetime] = None) -> 'Broadcast':
+        """返回更新了最后发送时间的新轮播消息对象"""
+        return self.replace(last_broadcast=broadcast_time or datetime.now(), updated_at=datetime.now())
 
-class MessageStat:
+class MessageStat(Model):
     """消息统计模型"""
+    _fields = (
+        ('id', '_id'), ('group_id', 'group_id'), ('user_id', 'user_id'), ('date', 'date'),
+        ('total_messages', 'total_messages'), ('total_size', 'total_size'),
+        ('media_type', 'media_type'), ('created_at', 'created_at'),
+    )
+    __slots__ = tuple(field for field, _ in _fields)
+    _defaults = {'total_messages': 1, 'total_size': 0, 'created_at': datetime.now}
+
     def __init__(
         self,
         group_id: int,
@@ -344,45 +411,21 @@ class MessageStat:
         total_size: int = 0,
         media_type: Optional[str] = None,
         created_at: Optional[datetime] = None,
+        id: Any = None,
         **kwargs
     ):
-        self.group_id = group_id
-        self.user_id = user_id
-        self.date = date
-        self.total_messages = total_messages
-        self.total_size = total_size
-        self.media_type = media_type
-        self.created_at = created_at or datetime.now()
-        self.extra_data = kwargs
-        
+        self._init({
+            'id': id, 'group_id': group_id, 'user_id': user_id, 'date': date,
+            'total_messages': total_messages, 'total_size': total_size,
+            'media_type': media_type, 'created_at': created_at,
+        }, kwargs)
+
     @classmethod
     def from_dict(cls, data: Dict[str, Any]) -> 'MessageStat':
-        """从字典创建消息统计对象"""
-        return cls(
-            group_id=data.get('group_id'),
-            user_id=data.get('user_id'),
-            date=data.get('date'),
-            total_messages=data.get('total_messages', 1),
-            total_size=data.get('total_size', 0),
-            media_type=data.get('media_type'),
-            created_at=data.get('created_at'),
-            **{k: v for k, v in data.items() if k not in [
-                'group_id', 'user_id', 'date', 'total_messages',
-                'total_size', 'media_type', 'created_at'
-            ]}
-        )
-        
-    def to_dict(self) -> Dict[str, Any]:
-        """转换为字典"""
-        result = {
-            'group_id': self.group_id,
-            'user_id': self.user_id,
-            'date': self.date,
-            'total_messages': self.total_messages,
-            'total_size': self.total_size,
-            'media_type': self.media_type,
-            'created_at': self.created_at
-        }
-        # 添加额外数据
-        result.update(self.extra_data)
-        return result
+        """从数据库文档创建消息统计对象"""
+        return cls._load(data, {
+            'id': data.get('_id'), 'group_id': data.get('group_id'), 'user_id': data.get('user_id'),
+            'date': data.get('date'), 'total_messages': data.get('total_messages'),
+            'total_size': data.get('total_size'), 'media_type': data.get('media_type'),
+            'created_at': data.get('created_at'),
+        })
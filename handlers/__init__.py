@@ -3,8 +3,9 @@
 """
 import logging
 from telegram.ext import (
-    CommandHandler, MessageHandler, CallbackQueryHandler, filters
+    CommandHandler, MessageHandler, CallbackQueryHandler, ChatMemberHandler, TypeHandler, filters
 )
+from telegram import Update
 from handlers.command_handlers import (
     handle_start, handle_settings, handle_rank_command, 
     handle_admin_groups, handle_add_admin, handle_del_admin,
@@ -12,13 +13,17 @@ from handlers.command_handlers import (
     handle_deauth_group, handle_check_config, handle_cancel,
     handle_easy_keyword, handle_easy_broadcast, handle_add_default_keywords,
     handle_rank_page_callback, handle_check_stats_settings,
-    handle_cleanup_invalid_groups
+    handle_cleanup_invalid_groups, handle_db_stats, handle_profile
 )
 from handlers.message_handlers import handle_message
 from handlers.callback_handlers import (
     handle_callback, handle_manageable_groups_callback
 )
 from handlers.id_handlers import handle_id_command
+from handlers.group_handlers import (
+    handle_my_chat_member, track_group_title, handle_group_picker_callback
+)
+from handlers.form_state_handlers import restore_form_state, persist_form_state
 
 logger = logging.getLogger(__name__)
 
@@ -46,6 +51,8 @@ def register_all_handlers(application, callback_handler):
     application.add_handler(CommandHandler("authgroup", handle_auth_group))
     application.add_handler(CommandHandler("deauthgroup", handle_deauth_group))
     application.add_handler(CommandHandler("checkconfig", handle_check_config))
+    application.add_handler(CommandHandler("dbstats", handle_db_stats))
+    application.add_handler(CommandHandler("profile", handle_profile))
     application.add_handler(CommandHandler("adddefaultkeywords", handle_add_default_keywords))
     application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
     application.add_handler(MessageHandler(filters.PHOTO, handle_message))
@@ -60,6 +67,21 @@ def register_all_handlers(application, callback_handler):
     application.add_handler(CommandHandler("easykeyword", handle_easy_keyword))
     application.add_handler(CommandHandler("easybroadcast", handle_easy_broadcast))
 
+    # 为命令处理器添加耗时记录
+    from utils.metrics import timed_handler
+    for handler in application.handlers.get(0, []):
+        if isinstance(handler, CommandHandler):
+            command = '/'.join(sorted(handler.commands))
+            handler.callback = timed_handler('command', command, handler.callback)
+
+    # 表单状态持久化：最先恢复未完成的表单，最后写入变化
+    application.add_handler(TypeHandler(Update, restore_form_state), group=-3)
+    application.add_handler(TypeHandler(Update, persist_form_state), group=99)
+
+    # 收集群组标题，独立分组不影响其他处理器
+    application.add_handler(ChatMemberHandler(handle_my_chat_member, ChatMemberHandler.MY_CHAT_MEMBER), group=-2)
+    application.add_handler(MessageHandler(filters.ChatType.GROUPS, track_group_title), group=-2)
+
     # 注册命令自动删除中间件 - 在这里添加
     from handlers.command_auto_delete_middleware import command_auto_delete_middleware
     application.add_handler(MessageHandler(filters.COMMAND, command_auto_delete_middleware), group=-1)
@@ -100,7 +122,7 @@ def register_all_handlers(application, callback_handler):
     callback_handler.register("keyword_preview_", handle_keyword_preview_callback)
     callback_handler.register("keyword_delete_", handle_keyword_delete_callback)
     callback_handler.register("keyword_confirm_delete_", handle_keyword_confirm_delete_callback)
-    callback_handler.register("keyword_list_page_", handle_keyword_detail_callback)  # 假设列表分页由detail处理
+    callback_handler.register("keyword_list_page_", handle_settings_callback)
     
     # 注册轮播消息相关回调前缀
     callback_handler.register("bcform_", handle_broadcast_form_callback)
@@ -126,6 +148,7 @@ def register_all_handlers(application, callback_handler):
     
     # 注册群组列表回调
     callback_handler.register("show_manageable_groups", handle_manageable_groups_callback)
+    callback_handler.register("gpick_", handle_group_picker_callback)
 
     # 添加错误处理程序
     def error_handler(update, context):
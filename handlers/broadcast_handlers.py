@@ -12,6 +12,8 @@ from telegram.ext import CallbackContext
 
 from utils.decorators import handle_callback_errors
 from utils.message_utils import get_media_type, get_file_id
+from utils.interactive_users import begin_input, end_input
+from utils.callback_codec import encode_callback
 from utils.time_utils import validate_time_format, format_datetime, format_duration
 from db.models import GroupPermission
 
@@ -51,14 +53,14 @@ async def handle_send_error(bot_instance, query, broadcast_id, group_id, error_m
         await query.edit_message_text(
             f"❌ 发送失败: 机器人在群组中没有权限\n\n请确保机器人在群组中并有足够权限",
             reply_markup=InlineKeyboardMarkup([[
-                InlineKeyboardButton("返回详情", callback_data=f"broadcast_detail_{broadcast_id}_{group_id}")
+                InlineKeyboardButton("返回详情", callback_data=encode_callback("broadcast_detail_", broadcast_id, group_id))
             ]])
         )
     else:
         await query.edit_message_text(
             f"❌ 发送失败: {error_message}\n\n请检查日志获取详细信息",
             reply_markup=InlineKeyboardMarkup([[
-                InlineKeyboardButton("返回详情", callback_data=f"broadcast_detail_{broadcast_id}_{group_id}")
+                InlineKeyboardButton("返回详情", callback_data=encode_callback("broadcast_detail_", broadcast_id, group_id))
             ]])
         )
 
@@ -199,7 +201,7 @@ async def handle_broadcast_form_callback(update: Update, context: CallbackContex
         if 'broadcast_form' in context.user_data:
             del context.user_data['broadcast_form']
         if 'waiting_for' in context.user_data:
-            del context.user_data['waiting_for']
+            end_input(update, context)
         await query.edit_message_text("✅ 已取消轮播消息添加")
         
     elif action == "select_group":
@@ -222,7 +224,7 @@ async def handle_broadcast_form_callback(update: Update, context: CallbackContex
             "发送完后请点击下方出现的「继续」按钮",
             reply_markup=InlineKeyboardMarkup(keyboard)
         )
-        context.user_data['waiting_for'] = 'broadcast_text'
+        begin_input(update, context, 'broadcast_text')
         
     elif action == "add_media":
         logger.info("执行添加媒体操作")
@@ -236,7 +238,7 @@ async def handle_broadcast_form_callback(update: Update, context: CallbackContex
             "发送完后请点击下方出现的「继续」按钮",
             reply_markup=InlineKeyboardMarkup(keyboard)
         )
-        context.user_data['waiting_for'] = 'broadcast_media'
+        begin_input(update, context, 'broadcast_media')
         
     elif action == "add_button":
         logger.info("执行添加按钮操作")
@@ -254,7 +256,7 @@ async def handle_broadcast_form_callback(update: Update, context: CallbackContex
             "发送完后请点击下方出现的「继续」按钮",
             reply_markup=InlineKeyboardMarkup(keyboard)
         )
-        context.user_data['waiting_for'] = 'broadcast_buttons'
+        begin_input(update, context, 'broadcast_buttons')
         
     elif action == "set_schedule":
         logger.info("执行设置计划操作")
@@ -294,7 +296,7 @@ async def handle_broadcast_form_callback(update: Update, context: CallbackContex
                     "发送完后请点击下方出现的「继续」按钮",
                     reply_markup=InlineKeyboardMarkup(keyboard)
                 )
-                context.user_data['waiting_for'] = 'broadcast_interval'
+                begin_input(update, context, 'broadcast_interval')
                 context.user_data['broadcast_form'] = form_data
                 return
                 
@@ -323,7 +325,7 @@ async def handle_broadcast_form_callback(update: Update, context: CallbackContex
             "发送完后请点击下方出现的「继续」按钮",
             reply_markup=InlineKeyboardMarkup(keyboard)
         )
-        context.user_data['waiting_for'] = 'broadcast_start_time'
+        begin_input(update, context, 'broadcast_start_time')
         logger.info(f"收到消息，用户 {user_id} 的等待状态是: {context.user_data.get('waiting_for')}")
         
     elif action in ["content_received", "media_received", "buttons_received", "time_received", "end_time_received"]:
@@ -362,7 +364,7 @@ async def handle_broadcast_form_callback(update: Update, context: CallbackContex
             "发送完后请点击下方出现的「继续」按钮",
             reply_markup=InlineKeyboardMarkup(keyboard)
         )
-        context.user_data['waiting_for'] = 'broadcast_end_time'
+        begin_input(update, context, 'broadcast_end_time')
         logger.info(f"收到消息，用户 {user_id} 的等待状态是: {context.user_data.get('waiting_for')}")
     
     else:
@@ -454,11 +456,11 @@ async def handle_broadcast_detail_callback(update: Update, context: CallbackCont
             
             # 构建操作按钮
             keyboard = [
-                [InlineKeyboardButton("👁️ 预览", callback_data=f"bc_preview_{broadcast_id}_{group_id}")],
-                [InlineKeyboardButton("✏️ 编辑", callback_data=f"bc_edit_{broadcast_id}_{group_id}")],
-                [InlineKeyboardButton("🚀 强制发送", callback_data=f"bc_force_send_{broadcast_id}_{group_id}")],
-                [InlineKeyboardButton("⏰ 重置为固定时间", callback_data=f"bc_recalibrate_{broadcast_id}_{group_id}")],
-                [InlineKeyboardButton("❌ 删除", callback_data=f"bc_delete_{broadcast_id}_{group_id}")],
+                [InlineKeyboardButton("👁️ 预览", callback_data=encode_callback("bc_preview_", broadcast_id, group_id))],
+                [InlineKeyboardButton("✏️ 编辑", callback_data=encode_callback("bc_edit_", broadcast_id, group_id))],
+                [InlineKeyboardButton("🚀 强制发送", callback_data=encode_callback("bc_force_send_", broadcast_id, group_id))],
+                [InlineKeyboardButton("⏰ 重置为固定时间", callback_data=encode_callback("bc_recalibrate_", broadcast_id, group_id))],
+                [InlineKeyboardButton("❌ 删除", callback_data=encode_callback("bc_delete_", broadcast_id, group_id))],
                 [InlineKeyboardButton("🔙 返回", callback_data=f"settings_broadcast_{group_id}")]
             ]
             
@@ -587,7 +589,7 @@ async def handle_broadcast_preview_callback(update: Update, context: CallbackCon
     
     # 显示返回按钮
     keyboard = [
-        [InlineKeyboardButton("🔙 返回详情", callback_data=f"broadcast_detail_{broadcast_id}_{group_id}")]
+        [InlineKeyboardButton("🔙 返回详情", callback_data=encode_callback("broadcast_detail_", broadcast_id, group_id))]
     ]
     await query.edit_message_text(
         "👆 上方为轮播消息预览\n\n点击「返回详情」继续查看",
@@ -622,8 +624,8 @@ async def handle_broadcast_delete_callback(update: Update, context: CallbackCont
     # 确认删除
     keyboard = [
         [
-            InlineKeyboardButton("✅ 确认删除", callback_data=f"bc_confirm_delete_{broadcast_id}_{group_id}"),
-            InlineKeyboardButton("❌ 取消", callback_data=f"broadcast_detail_{broadcast_id}_{group_id}")
+            InlineKeyboardButton("✅ 确认删除", callback_data=encode_callback("bc_confirm_delete_", broadcast_id, group_id)),
+            InlineKeyboardButton("❌ 取消", callback_data=encode_callback("broadcast_detail_", broadcast_id, group_id))
         ]
     ]
     
@@ -671,7 +673,7 @@ async def handle_broadcast_confirm_delete_callback(update: Update, context: Call
             await query.edit_message_text(
                 "❌ 删除轮播消息失败",
                 reply_markup=InlineKeyboardMarkup([[
-                    InlineKeyboardButton("返回轮播详情", callback_data=f"broadcast_detail_{broadcast_id}_{group_id}")
+                    InlineKeyboardButton("返回轮播详情", callback_data=encode_callback("broadcast_detail_", broadcast_id, group_id))
                 ]])
             )
     except Exception as e:
@@ -679,7 +681,7 @@ async def handle_broadcast_confirm_delete_callback(update: Update, context: Call
         await query.edit_message_text(
             f"❌ 删除轮播消息出错: {str(e)}",
             reply_markup=InlineKeyboardMarkup([[
-                InlineKeyboardButton("返回轮播详情", callback_data=f"broadcast_detail_{broadcast_id}_{group_id}")
+                InlineKeyboardButton("返回轮播详情", callback_data=encode_callback("broadcast_detail_", broadcast_id, group_id))
             ]])
         )
         
@@ -730,7 +732,7 @@ async def handle_broadcast_force_send_callback(update: Update, context: Callback
             await query.edit_message_text(
                 f"⏳ 正在执行强制发送...\n\n详情ID: {broadcast_id}",
                 reply_markup=InlineKeyboardMarkup([[
-                    InlineKeyboardButton("返回详情", callback_data=f"broadcast_detail_{broadcast_id}_{group_id}")
+                    InlineKeyboardButton("返回详情", callback_data=encode_callback("broadcast_detail_", broadcast_id, group_id))
                 ]])
             )
             
@@ -750,7 +752,7 @@ async def handle_broadcast_force_send_callback(update: Update, context: Callback
                     await query.edit_message_text(
                         f"✅ 轮播消息已成功发送\n\n详情ID: {broadcast_id}",
                         reply_markup=InlineKeyboardMarkup([[
-                            InlineKeyboardButton("返回详情", callback_data=f"broadcast_detail_{broadcast_id}_{group_id}")
+                            InlineKeyboardButton("返回详情", callback_data=encode_callback("broadcast_detail_", broadcast_id, group_id))
                         ]])
                     )
                 else:
@@ -758,7 +760,7 @@ async def handle_broadcast_force_send_callback(update: Update, context: Callback
                     await query.edit_message_text(
                         f"❌ 轮播消息发送失败\n\n详情ID: {broadcast_id}",
                         reply_markup=InlineKeyboardMarkup([[
-                            InlineKeyboardButton("返回详情", callback_data=f"broadcast_detail_{broadcast_id}_{group_id}")
+                            InlineKeyboardButton("返回详情", callback_data=encode_callback("broadcast_detail_", broadcast_id, group_id))
                         ]])
                     )
             except telegram.error.BadRequest as e:
@@ -785,7 +787,7 @@ async def handle_broadcast_force_send_callback(update: Update, context: Callback
             await query.edit_message_text(
                 "❌ 轮播管理器未初始化",
                 reply_markup=InlineKeyboardMarkup([[
-                    InlineKeyboardButton("返回详情", callback_data=f"broadcast_detail_{broadcast_id}_{group_id}")
+                    InlineKeyboardButton("返回详情", callback_data=encode_callback("broadcast_detail_", broadcast_id, group_id))
                 ]])
             )
     except Exception as e:
@@ -793,7 +795,7 @@ async def handle_broadcast_force_send_callback(update: Update, context: Callback
         await query.edit_message_text(
             f"❌ 强制发送出错: {str(e)}",
             reply_markup=InlineKeyboardMarkup([[
-                InlineKeyboardButton("返回详情", callback_data=f"broadcast_detail_{broadcast_id}_{group_id}")
+                InlineKeyboardButton("返回详情", callback_data=encode_callback("broadcast_detail_", broadcast_id, group_id))
             ]])
         )
 
@@ -832,21 +834,21 @@ async def handle_broadcast_recalibrate_callback(update: Update, context: Callbac
             await query.edit_message_text(
                 "✅ 已重置轮播消息时间调度，下次将按固定时间锚点发送",
                 reply_markup=InlineKeyboardMarkup([[
-                    InlineKeyboardButton("返回详情", callback_data=f"broadcast_detail_{broadcast_id}_{group_id}")
+                    InlineKeyboardButton("返回详情", callback_data=encode_callback("broadcast_detail_", broadcast_id, group_id))
                 ]])
             )
         else:
             await query.edit_message_text(
                 "❌ 重置轮播消息调度失败",
                 reply_markup=InlineKeyboardMarkup([[
-                    InlineKeyboardButton("返回详情", callback_data=f"broadcast_detail_{broadcast_id}_{group_id}")
+                    InlineKeyboardButton("返回详情", callback_data=encode_callback("broadcast_detail_", broadcast_id, group_id))
                 ]])
             )
     else:
         await query.edit_message_text(
             "❌ 轮播管理器未初始化",
             reply_markup=InlineKeyboardMarkup([[
-                InlineKeyboardButton("返回详情", callback_data=f"broadcast_detail_{broadcast_id}_{group_id}")
+                InlineKeyboardButton("返回详情", callback_data=encode_callback("broadcast_detail_", broadcast_id, group_id))
             ]])
         )
         
@@ -988,7 +990,7 @@ async def submit_broadcast_form(update: Update, context: CallbackContext):
         if 'broadcast_form' in context.user_data:
             del context.user_data['broadcast_form']
         if 'waiting_for' in context.user_data:
-            del context.user_data['waiting_for']
+            end_input(update, context)
         
         # 确定重复类型文本
         repeat_text = "单次发送"
@@ -1399,7 +1401,7 @@ async def handle_broadcast_form_input(update: Update, context: CallbackContext,
     if not form_data:
         logger.warning(f"用户 {user_id} 处于轮播输入模式但无表单数据")
         await message.reply_text("❌ 轮播表单数据丢失，请重新开始")
-        context.user_data.pop('waiting_for', None)
+        end_input(update, context)
         return True
         
     # 根据输入类型处理
@@ -1413,7 +1415,7 @@ async def handle_broadcast_form_input(update: Update, context: CallbackContext,
         # 存储文本
         form_data['text'] = text
         context.user_data['broadcast_form'] = form_data
-        context.user_data.pop('waiting_for', None)
+        end_input(update, context)
         
         # 提供继续按钮
         keyboard = [[InlineKeyboardButton("继续", callback_data="bcform_content_received")]]
@@ -1490,7 +1492,7 @@ async def handle_broadcast_form_input(update: Update, context: CallbackContext,
         # 存储按钮配置
         form_data['buttons'] = buttons
         context.user_data['broadcast_form'] = form_data
-        context.user_data.pop('waiting_for', None)
+        end_input(update, context)
     
         # 提供继续按钮
         keyboard = [[InlineKeyboardButton("继续", callback_data="bcform_buttons_received")]]
@@ -1519,7 +1521,7 @@ async def handle_broadcast_form_input(update: Update, context: CallbackContext,
             'file_id': file_id
         }
         context.user_data['broadcast_form'] = form_data
-        context.user_data.pop('waiting_for', None)
+        end_input(update, context)
         
         # 提供继续按钮
         keyboard = [[InlineKeyboardButton("继续", callback_data="bcform_media_received")]]
@@ -1541,7 +1543,7 @@ async def handle_broadcast_form_input(update: Update, context: CallbackContext,
             form_data['repeat_interval'] = interval
             form_data['repeat_type'] = 'custom'  # 确保设置为自定义类型
             context.user_data['broadcast_form'] = form_data
-            context.user_data.pop('waiting_for', None)
+            end_input(update, context)
             
             # 显示开始时间选项
             keyboard = [[InlineKeyboardButton("继续", callback_data="bcform_interval_received")]]
@@ -1566,7 +1568,7 @@ async def handle_broadcast_form_input(update: Update, context: CallbackContext,
             start_time = now
             form_data['start_time'] = start_time.strftime('%Y-%m-%d %H:%M:%S')
             context.user_data['broadcast_form'] = form_data
-            context.user_data.pop('waiting_for', None)
+            end_input(update, context)
         
             # 提供继续按钮
             keyboard = [[InlineKeyboardButton("继续", callback_data="bcform_time_received")]]
@@ -1587,7 +1589,7 @@ async def handle_broadcast_form_input(update: Update, context: CallbackContext,
                 start_time = now + timedelta(minutes=minutes)
                 form_data['start_time'] = start_time.strftime('%Y-%m-%d %H:%M:%S')
                 context.user_data['broadcast_form'] = form_data
-                context.user_data.pop('waiting_for', None)
+                end_input(update, context)
             
                 keyboard = [[InlineKeyboardButton("继续", callback_data="bcform_time_received")]]
                 await message.reply_text(
@@ -1641,7 +1643,7 @@ async def handle_broadcast_form_input(update: Update, context: CallbackContext,
             # 存储开始时间
             form_data['start_time'] = start_time.strftime('%Y-%m-%d %H:%M:%S')
             context.user_data['broadcast_form'] = form_data
-            context.user_data.pop('waiting_for', None)
+            end_input(update, context)
         
             # 提供继续按钮
             keyboard = [[InlineKeyboardButton("继续", callback_data="bcform_time_received")]]
@@ -1682,7 +1684,7 @@ async def handle_broadcast_form_input(update: Update, context: CallbackContext,
                 end_time = start_time + timedelta(days=days)
                 form_data['end_time'] = end_time.strftime('%Y-%m-%d %H:%M:%S')
                 context.user_data['broadcast_form'] = form_data
-                context.user_data.pop('waiting_for', None)
+                end_input(update, context)
                 
                 keyboard = [[InlineKeyboardButton("继续", callback_data="bcform_end_time_received")]]
                 await message.reply_text(
@@ -1735,7 +1737,7 @@ async def handle_broadcast_form_input(update: Update, context: CallbackContext,
             # 存储结束时间
             form_data['end_time'] = end_time.strftime('%Y-%m-%d %H:%M:%S')
             context.user_data['broadcast_form'] = form_data
-            context.user_data.pop('waiting_for', None)
+            end_input(update, context)
             
             # 提供继续按钮
             keyboard = [[InlineKeyboardButton("继续", callback_data="bcform_end_time_received")]]
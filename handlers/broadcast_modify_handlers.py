@@ -7,6 +7,8 @@ from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import CallbackContext
 
 from utils.decorators import handle_callback_errors
+from utils.interactive_users import end_input
+from utils.callback_codec import encode_callback
 from utils.time_utils import format_datetime
 
 logger = logging.getLogger(__name__)
@@ -143,8 +145,8 @@ async def show_broadcast_edit_options(update: Update, context: CallbackContext):
     
     keyboard.extend([
         [InlineKeyboardButton("👁️ 预览效果", callback_data=f"bcform_preview")],
-        [InlineKeyboardButton("✅ 保存修改", callback_data=f"bc_save_edit_{broadcast_id}_{group_id}")],
-        [InlineKeyboardButton("❌ 取消", callback_data=f"broadcast_detail_{broadcast_id}_{group_id}")]
+        [InlineKeyboardButton("✅ 保存修改", callback_data=encode_callback("bc_save_edit_", broadcast_id, group_id))],
+        [InlineKeyboardButton("❌ 取消", callback_data=encode_callback("broadcast_detail_", broadcast_id, group_id))]
     ])
     
     # 显示编辑选项
@@ -238,7 +240,7 @@ async def handle_broadcast_save_edit_callback(update: Update, context: CallbackC
             if 'broadcast_form' in context.user_data:
                 del context.user_data['broadcast_form']
             if 'waiting_for' in context.user_data:
-                del context.user_data['waiting_for']
+                end_input(update, context)
             
             # 获取更新后的数据用于重新调度
             updated_broadcast = await bot_instance.db.get_broadcast_by_id(broadcast_id)
@@ -271,7 +273,7 @@ async def handle_broadcast_save_edit_callback(update: Update, context: CallbackC
                     await query.edit_message_text(
                         "⚠️ 轮播消息已更新但重新调度失败，请检查日志",
                         reply_markup=InlineKeyboardMarkup([[
-                            InlineKeyboardButton("返回详情", callback_data=f"broadcast_detail_{broadcast_id}_{group_id}")
+                            InlineKeyboardButton("返回详情", callback_data=encode_callback("broadcast_detail_", broadcast_id, group_id))
                         ]])
                     )
                     return
@@ -281,7 +283,7 @@ async def handle_broadcast_save_edit_callback(update: Update, context: CallbackC
             await query.edit_message_text(
                 "✅ 轮播消息已更新",
                 reply_markup=InlineKeyboardMarkup([[
-                    InlineKeyboardButton("返回详情", callback_data=f"broadcast_detail_{broadcast_id}_{group_id}")
+                    InlineKeyboardButton("返回详情", callback_data=encode_callback("broadcast_detail_", broadcast_id, group_id))
                 ]])
             )
         else:
@@ -289,7 +291,7 @@ async def handle_broadcast_save_edit_callback(update: Update, context: CallbackC
             await query.edit_message_text(
                 "❌ 轮播消息更新失败，请重试",
                 reply_markup=InlineKeyboardMarkup([[
-                    InlineKeyboardButton("返回编辑", callback_data=f"bc_edit_{broadcast_id}_{group_id}")
+                    InlineKeyboardButton("返回编辑", callback_data=encode_callback("bc_edit_", broadcast_id, group_id))
                 ]])
             )
     except Exception as e:
@@ -297,6 +299,6 @@ async def handle_broadcast_save_edit_callback(update: Update, context: CallbackC
         await query.edit_message_text(
             f"❌ 更新轮播消息出错: {str(e)}",
             reply_markup=InlineKeyboardMarkup([[
-                InlineKeyboardButton("返回编辑", callback_data=f"bc_edit_{broadcast_id}_{group_id}")
+                InlineKeyboardButton("返回编辑", callback_data=encode_callback("bc_edit_", broadcast_id, group_id))
             ]])
         )
@@ -6,7 +6,6 @@ from typing import Optional, Any, Dict, List
 
 from telegram import Update
 from telegram.ext import CallbackContext
-from telegram import InlineKeyboardButton, InlineKeyboardMarkup
 from utils.decorators import handle_callback_errors
 
 logger = logging.getLogger(__name__)
@@ -53,13 +52,10 @@ async def handle_manageable_groups_callback(update: Update, context: CallbackCon
     
     # 获取用户可管理的群组
     try:
-        # 获取用户可管理的群组 - 修改这里
-        manageable_groups = await bot_instance.db.get_manageable_groups(user_id)
-        # 检查是否为超级管理员 - 修改这里
-        superadmin = await bot_instance.is_superadmin(user_id)
+        from handlers.group_handlers import build_group_picker
+        picker = await build_group_picker(bot_instance, context, user_id, 'settings')
         
-        # 无需使用 get_all_authorized_groups - 直接使用已有的方法
-        if not manageable_groups:
+        if not picker:
             # 没有可管理的群组
             await query.edit_message_text(
                 "您没有可管理的群组权限。\n\n"
@@ -67,28 +63,9 @@ async def handle_manageable_groups_callback(update: Update, context: CallbackCon
             )
             return
             
-        # 构建群组选择按钮
-        keyboard = []
-        for group in manageable_groups:
-            group_id = group['group_id']
-            # 尝试获取群组名称
-            try:
-                group_info = await context.bot.get_chat(group_id)
-                group_title = group_info.title or f"群组 {group_id}"
-            except Exception:
-                group_title = f"群组 {group_id}"
-                
-            keyboard.append([InlineKeyboardButton(group_title, callback_data=f"settings_select_{group_id}")])
-        
-        # 添加一个返回按钮
-        keyboard.append([InlineKeyboardButton("返回", callback_data="settings")])
-        
-        # 显示群组列表
-        await query.edit_message_text(
-            "📋 您可以管理的群组列表：\n\n"
-            "请选择要管理的群组",
-            reply_markup=InlineKeyboardMarkup(keyboard)
-        )
+        # 显示分页的群组列表
+        text, reply_markup = picker
+        await query.edit_message_text(f"📋 您可以管理的群组列表：\n\n{text}", reply_markup=reply_markup)
         
     except Exception as e:
         logger.error(f"获取可管理群组出错: {str(e)}", exc_info=True)
@@ -14,6 +14,9 @@ from utils.message_utils import set_message_expiry
 from db.models import GroupPermission
 from utils.decorators import debounce
 from utils.message_utils import update_message_safely
+from utils.metrics import record_cache
+from utils.interactive_users import begin_input, end_input
+from handlers.group_handlers import build_group_picker, set_picker_search
 
 logger = logging.getLogger(__name__)
 
@@ -71,6 +74,8 @@ async def handle_start(update: Update, context: CallbackContext):
             "✅ /authgroup <群组ID> - 授权群组\n"
             "❌ /deauthgroup <群组ID> - 取消群组授权\n"
             "🔍 /checkconfig - 检查当前配置\n"
+            "⏱ /dbstats - 查看数据库操作耗时统计\n"
+            "🔬 /profile - 采样分析运行耗时\n"
             "🧹 /cleanupinvalidgroups - 清理无效群组\n"
         )
         
@@ -122,26 +127,15 @@ async def handle_settings(update: Update, context: CallbackContext):
     """处理/settings命令 - 显示群组选择菜单"""
     bot_instance = context.application.bot_data.get('bot_instance')
     
-    # 获取用户可管理的群组
-    manageable_groups = await bot_instance.db.get_manageable_groups(update.effective_user.id)
-    if not manageable_groups:
+    # 构建分页的群组选择菜单，命令参数作为搜索关键字
+    set_picker_search(context, 'settings', ' '.join(context.args) if context.args else None)
+    picker = await build_group_picker(bot_instance, context, update.effective_user.id, 'settings')
+    if not picker:
         await update.message.reply_text("❌ 你没有权限管理任何群组")
         return
         
-    # 构建群组选择键盘
-    keyboard = []
-    for group in manageable_groups:
-        try:
-            group_info = await context.bot.get_chat(group['group_id'])
-            group_name = group_info.title or f"群组 {group['group_id']}"
-        except Exception as e:
-            logger.warning(f"获取群组 {group['group_id']} 信息失败: {e}")
-            group_name = f"群组 {group['group_id']}"
-            
-        keyboard.append([InlineKeyboardButton(group_name, callback_data=f"settings_select_{group['group_id']}")])
-        
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    msg = await update.message.reply_text("请选择要管理的群组：", reply_markup=reply_markup)
+    text, reply_markup = picker
+    msg = await update.message.reply_text(text, reply_markup=reply_markup)
     
     # 如果在群组中，设置自动删除
     if update.effective_chat.type in ['group', 'supergroup']:
@@ -249,7 +243,8 @@ def truncate_string_by_width(s, max_width):
 
 # 添加一个简单内存缓存
 class SimpleCache:
-    def __init__(self):
+    def __init__(self, name='memory'):
+        self.name = name
         self.data = {}
         self.expiry = {}
         self._lock = asyncio.Lock()
@@ -266,8 +261,11 @@ class SimpleCache:
                 if key in self.expiry and time.time() > self.expiry[key]:
                     del self.data[key]
                     del self.expiry[key]
+                    record_cache(self.name, False)
                     return None
+                record_cache(self.name, True)
                 return self.data[key]
+            record_cache(self.name, False)
             return None
     
     async def exists(self, key):
@@ -282,7 +280,7 @@ class SimpleCache:
                 del self.expiry[key]
 
 # 初始化缓存
-memory_cache = SimpleCache()
+memory_cache = SimpleCache('display_name')
 
 async def get_user_display_name(chat_id, user_id, context):
     """获取用户显示名称，带缓存"""
@@ -345,63 +343,40 @@ async def get_message_stats_from_db(group_id: int, time_range: str = 'day', limi
         # 设置时间过滤条件
         now = datetime.datetime.now()
         
-        # 基础过滤条件 - 增加更严格的过滤
+        # 基础过滤条件 - 统计写入路径已排除机器人消息并按消息去重
         match = {
             'group_id': group_id,
-            'total_messages': {'$gt': 0},
-            'is_bot': {'$ne': True}  # 排除机器人
+            'total_messages': {'$gt': 0}
         }
         
         # 添加时间范围过滤条件
+        today = now.strftime('%Y-%m-%d')
+        start_date = today
         if time_range == 'day':
             # 当天
-            today = datetime.datetime.now().strftime('%Y-%m-%d')
             match['date'] = today
         elif time_range == 'month':
             # 30天前的日期（YYYY-MM-DD格式）
-            thirty_days_ago = (now - datetime.timedelta(days=30)).strftime('%Y-%m-%d')
-            today = now.strftime('%Y-%m-%d')
-            match['date'] = {'$gte': thirty_days_ago, '$lte': today}
+            start_date = (now - datetime.timedelta(days=30)).strftime('%Y-%m-%d')
+            match['date'] = {'$gte': start_date, '$lte': today}
         
-        # 日志记录查询条件，帮助调试
-        logger.info(f"消息统计查询条件: {match}")
+        logger.debug(f"消息统计查询条件: {match}")
         
-        # 优化的聚合管道，解决重复计数问题
+        # 单次分组完成排行，初始匹配阶段由分区路由在每个分区上执行
         pipeline = [
-            # 1. 初始匹配阶段 - 基本过滤
-            {'$match': match},
-            
-            # 2. 确保每条消息只被计数一次并加强过滤
-            {'$group': {
-                '_id': {'msg_id': '$message_id', 'user_id': '$user_id', 'date': '$date'},
-                'message_count': {'$sum': 1},
-                'user_id': {'$first': '$user_id'},
-                'valid': {'$first': {'$gt': ['$total_messages', 0]}}
-            }},
-            
-            # 3. 按用户ID分组汇总，确保只统计有效消息
-            {'$match': {
-                'valid': True
-            }},
-            
+            # 1. 按用户ID汇总消息数
             {'$group': {
                 '_id': '$user_id',
-                'total_messages': {'$sum': '$message_count'}
+                'total_messages': {'$sum': '$total_messages'}
             }},
             
-            # 4. 更严格的过滤条件，确保排除无效用户和消息数为0的记录
-            {'$match': {
-                '$and': [
-                    {'_id': {'$ne': None}},
-                    {'_id': {'$ne': 0}},
-                    {'total_messages': {'$gt': 0}}
-                ]
-            }},
+            # 2. 排除无效用户
+            {'$match': {'_id': {'$gt': 0}}},
             
-            # 5. 排序
-            {'$sort': {'total_messages': -1}},
+            # 3. 排序，用户ID作为次序键保证分页稳定
+            {'$sort': {'total_messages': -1, '_id': 1}},
             
-            # 6. 分页
+            # 4. 分页
             {'$skip': skip},
             {'$limit': limit}
         ]
@@ -412,7 +387,7 @@ async def get_message_stats_from_db(group_id: int, time_range: str = 'day', limi
         }
         
         # 执行聚合查询
-        stats = await bot_instance.db.db.message_stats.aggregate(pipeline, **options).to_list(None)
+        stats = await bot_instance.db.aggregate_stats(match, start_date, today, pipeline, **options)
         
         # 深度复制结果，避免引用问题
         validated_stats = []
@@ -470,43 +445,22 @@ async def get_total_stats_count(group_id, time_range, context):
         # 基础过滤条件 - 与 get_message_stats_from_db 保持一致
         match = {
             'group_id': group_id,
-            'total_messages': {'$gt': 0},
-            'is_bot': {'$ne': True}
+            'total_messages': {'$gt': 0}
         }
         
         # 添加时间范围过滤条件
+        today = datetime.datetime.now().strftime('%Y-%m-%d')
+        start_date = today
         if time_range == 'day':
-            today = datetime.datetime.now().strftime('%Y-%m-%d')
             match['date'] = today
         elif time_range == 'month':
-            thirty_days_ago = (datetime.datetime.now() - datetime.timedelta(days=30)).strftime('%Y-%m-%d')
-            today = datetime.datetime.now().strftime('%Y-%m-%d')
-            match['date'] = {'$gte': thirty_days_ago, '$lte': today}
+            start_date = (datetime.datetime.now() - datetime.timedelta(days=30)).strftime('%Y-%m-%d')
+            match['date'] = {'$gte': start_date, '$lte': today}
         
-        # 使用与 get_message_stats_from_db 相同的逻辑来计数
+        # 使用与 get_message_stats_from_db 相同的分组和过滤来计数
         pipeline = [
-            {'$match': match},
-            # 确保每条消息只被计数一次
-            {'$group': {
-                '_id': {'msg_id': '$message_id', 'user_id': '$user_id', 'date': '$date'},
-                'user_id': {'$first': '$user_id'},
-                'valid': {'$first': {'$gt': ['$total_messages', 0]}}
-            }},
-            # 确保只统计有效消息
-            {'$match': {
-                'valid': True
-            }},
-            # 按用户ID分组
-            {'$group': {
-                '_id': '$user_id'
-            }},
-            # 过滤无效用户，与主查询保持一致
-            {'$match': {
-                '$and': [
-                    {'_id': {'$ne': None}},
-                    {'_id': {'$ne': 0}}
-                ]
-            }},
+            {'$group': {'_id': '$user_id'}},
+            {'$match': {'_id': {'$gt': 0}}},
             {'$count': 'total'}
         ]
         
@@ -515,7 +469,7 @@ async def get_total_stats_count(group_id, time_range, context):
             'maxTimeMS': 5000  # 5秒超时
         }
         
-        result = await bot_instance.db.db.message_stats.aggregate(pipeline, **options).to_list(None)
+        result = await bot_instance.db.aggregate_stats(match, start_date, today, pipeline, **options)
         if result and len(result) > 0:
             return result[0].get('total', 0)
         return 0
@@ -763,17 +717,17 @@ async def handle_check_stats_settings(update: Update, context: CallbackContext):
     # 检查数据库记录
     try:
         today = datetime.datetime.now().strftime('%Y-%m-%d')
-        count = await bot_instance.db.db.message_stats.count_documents({
+        count = await bot_instance.db.count_stats({
             'group_id': group_id,
             'date': today
-        })
+        }, today, today)
         message += f"今日消息记录数: {count}\n"
         
         thirty_days_ago = (datetime.datetime.now() - datetime.timedelta(days=30)).strftime('%Y-%m-%d')
-        month_count = await bot_instance.db.db.message_stats.count_documents({
+        month_count = await bot_instance.db.count_stats({
             'group_id': group_id,
             'date': {'$gte': thirty_days_ago, '$lte': today}
-        })
+        }, thirty_days_ago, today)
         message += f"30天内消息记录数: {month_count}"
     except Exception as e:
         logger.error(f"检查数据库记录失败: {e}", exc_info=True)
@@ -853,6 +807,7 @@ async def handle_rank_page_callback(update: Update, context: CallbackContext, *a
             # 使用缓存优化总记录数查询
             cache_key = f"total_count:{group_id}:{time_range}"
             total_count = context.user_data.get(cache_key)
+            record_cache('rank_total_count', total_count is not None)
             
             # 如果没有缓存，再进行数据库查询
             if total_count is None:
@@ -1018,14 +973,9 @@ async def handle_admin_groups(update: Update, context: CallbackContext):
         
     # 构建群组列表文本
     text = "📝 你可以管理的群组：\n\n"
+    titles = bot_instance.group_directory.resolve_titles(context.bot, groups)
     for group in groups:
-        try:
-            group_info = await context.bot.get_chat(group['group_id'])
-            group_name = group_info.title
-        except Exception as e:
-            logger.warning(f"获取群组 {group['group_id']} 信息失败: {e}")
-            group_name = f"群组 {group['group_id']}"
-            
+        group_name = titles[group['group_id']]
         text += f"• {group_name}\n  ID: {group['group_id']}\n  权限: {', '.join(group.get('permissions', []))}\n\n"
         
     msg = await update.message.reply_text(text)
@@ -1050,6 +1000,7 @@ async def handle_cancel(update: Update, context: CallbackContext):
     for key in list(context.user_data.keys()):
         if key.startswith(('keyword_', 'broadcast_')) or key == 'waiting_for':
             del context.user_data[key]
+    end_input(update, context)
             
     # 获取活动的设置
     active_settings = await bot_instance.settings_manager.get_active_settings(user_id)
@@ -1098,29 +1049,14 @@ async def handle_easy_keyword(update: Update, context: CallbackContext):
         
     # 如果是私聊，让用户选择要管理的群组
     if not group_id:
-        manageable_groups = await bot_instance.db.get_manageable_groups(user_id)
-        if not manageable_groups:
+        set_picker_search(context, 'kw', ' '.join(context.args) if context.args else None)
+        picker = await build_group_picker(bot_instance, context, user_id, 'kw')
+        if not picker:
             await update.message.reply_text("❌ 你没有权限管理任何群组")
             return
             
-        keyboard = []
-        for group in manageable_groups:
-            try:
-                group_info = await context.bot.get_chat(group['group_id'])
-                group_name = group_info.title or f"群组 {group['group_id']}"
-            except Exception as e:
-                logger.warning(f"获取群组 {group['group_id']} 信息失败: {e}")
-                group_name = f"群组 {group['group_id']}"
-                
-            keyboard.append([InlineKeyboardButton(
-                group_name, 
-                callback_data=f"kwform_select_group_{group['group_id']}"
-            )])
-            
-        await update.message.reply_text(
-            "请选择要添加关键词的群组：", 
-            reply_markup=InlineKeyboardMarkup(keyboard)
-        )
+        text, reply_markup = picker
+        await update.message.reply_text(text, reply_markup=reply_markup)
         return
         
     # 检查群组权限
@@ -1152,29 +1088,14 @@ async def handle_easy_broadcast(update: Update, context: CallbackContext):
         
     # 如果是私聊，让用户选择要管理的群组
     if not group_id:
-        manageable_groups = await bot_instance.db.get_manageable_groups(user_id)
-        if not manageable_groups:
+        set_picker_search(context, 'bc', ' '.join(context.args) if context.args else None)
+        picker = await build_group_picker(bot_instance, context, user_id, 'bc')
+        if not picker:
             await update.message.reply_text("❌ 你没有权限管理任何群组")
             return
             
-        keyboard = []
-        for group in manageable_groups:
-            try:
-                group_info = await context.bot.get_chat(group['group_id'])
-                group_name = group_info.title or f"群组 {group['group_id']}"
-            except Exception as e:
-                logger.warning(f"获取群组 {group['group_id']} 信息失败: {e}")
-                group_name = f"群组 {group['group_id']}"
-                
-            keyboard.append([InlineKeyboardButton(
-                group_name, 
-                callback_data=f"bcform_select_group_{group['group_id']}"
-            )])
-            
-        await update.message.reply_text(
-            "请选择要添加轮播消息的群组：", 
-            reply_markup=InlineKeyboardMarkup(keyboard)
-        )
+        text, reply_markup = picker
+        await update.message.reply_text(text, reply_markup=reply_markup)
         return
         
     # 检查群组权限
@@ -1351,6 +1272,96 @@ async def handle_check_config(update: Update, context: CallbackContext):
     
     await update.message.reply_text(config_text)
 
+@check_command_usage
+@require_superadmin
+async def handle_db_stats(update: Update, context: CallbackContext):
+    """处理/dbstats命令 - 查看或切换数据库操作埋点"""
+    from db.instrumentation import db_instrumentation
+    
+    action = context.args[0].lower() if context.args else None
+    if action in ('on', 'off'):
+        db_instrumentation.configure(enabled=(action == 'on'))
+        await update.message.reply_text(f"✅ 数据库埋点已{'开启' if action == 'on' else '关闭'}")
+        return
+    if action == 'reset':
+        db_instrumentation.reset()
+        await update.message.reply_text("✅ 数据库埋点统计已清空")
+        return
+    
+    rows = db_instrumentation.snapshot(sort_by='p99', limit=15)
+    status = '开启' if db_instrumentation.enabled else '关闭'
+    text = f"⏱ 数据库操作统计（埋点{status}，按p99排序）：\n\n"
+    if not rows:
+        text += "暂无数据"
+    for row in rows:
+        text += (
+            f"• {row['method']}\n"
+            f"  次数 {row['count']}，错误率 {row['error_rate']:.1%}，慢查询 {row['slow']}\n"
+            f"  p50 {row['p50']:.1f}ms / p95 {row['p95']:.1f}ms / p99 {row['p99']:.1f}ms\n"
+        )
+    await update.message.reply_text(text)
+
+@check_command_usage
+@require_superadmin
+async def handle_profile(update: Update, context: CallbackContext):
+    """处理/profile命令 - 采样分析事件循环并返回折叠栈文件"""
+    from config import PROFILER_SETTINGS
+    from utils.profiler import reserve_profile, release_profile
+    
+    try:
+        seconds = float(context.args[0]) if context.args else PROFILER_SETTINGS['default_seconds']
+    except ValueError:
+        await update.message.reply_text("❌ 采样时长必须是数字")
+        return
+    # nan 和 inf 无法被 min/max 限制到有效范围
+    if not math.isfinite(seconds):
+        await update.message.reply_text("❌ 采样时长必须是有限数字")
+        return
+    seconds = min(max(seconds, 1), PROFILER_SETTINGS['max_seconds'])
+    
+    # 在创建任务前同步占用，紧接着的第二次请求会被直接拒绝而不是排队
+    if not reserve_profile():
+        await update.message.reply_text("❌ 已有采样正在进行，请稍后再试")
+        return
+    # 在后台采样，避免Webhook请求在采样期间一直挂起
+    try:
+        task = context.application.create_task(
+            _run_profile(update.message, seconds, PROFILER_SETTINGS['interval_ms'] / 1000)
+        )
+    except Exception:
+        release_profile()
+        raise
+    # 任务结束时释放占用，包括协程开始执行前就被取消的情况
+    task.add_done_callback(lambda _: release_profile())
+    await update.message.reply_text(f"🔬 开始采样 {seconds:g} 秒...")
+
+async def _run_profile(message, seconds: float, interval: float):
+    """执行采样并把结果发送给命令发起者"""
+    from utils.profiler import profile_event_loop, task_counts
+    
+    try:
+        profiler = await profile_event_loop(seconds, interval, reserved=True)
+        
+        text = f"🔬 采样完成：{profiler.samples} 个样本，{profiler.elapsed:.1f} 秒\n\n热点函数（自身耗时）：\n"
+        for frame, count in profiler.top_functions(10):
+            text += f"• {count / max(profiler.samples, 1):.1%} {html.escape(frame)}\n"
+        tasks = task_counts()
+        text += f"\n异步任务（共 {sum(tasks.values())} 个）：\n"
+        for name, count in list(tasks.items())[:15]:
+            text += f"• {html.escape(name)}: {count}\n"
+        await message.reply_text(text, parse_mode='HTML')
+        
+        if profiler.samples:
+            filename = f"profile-{datetime.datetime.now().strftime('%Y%m%d-%H%M%S')}.collapsed"
+            await message.reply_document(
+                document=profiler.collapsed().encode('utf-8'),
+                filename=filename,
+                caption="折叠栈文件，可用 flamegraph.pl 或 speedscope 生成火焰图"
+            )
+    except Exception as e:
+        logger.error(f"采样分析失败: {e}", exc_info=True)
+        await message.reply_text("❌ 采样分析失败")
+
 @check_command_usage
 @require_superadmin
 async def handle_auth_group(update: Update, context: CallbackContext):
@@ -1381,6 +1392,8 @@ async def handle_auth_group(update: Update, context: CallbackContext):
         await bot_instance.db.add_group({
             'group_id': group_id,
             'permissions': all_permissions,
+            'title': group_name,
+            'title_updated_at': datetime.datetime.now(),
             'settings': {'auto_delete': False, 'auto_delete_timeout': config.AUTO_DELETE_SETTINGS['default_timeout']},
             'feature_switches': {'keywords': True, 'stats': True, 'broadcast': True}
         })
@@ -1433,14 +1446,18 @@ async def handle_add_default_keywords(update: Update, context: CallbackContext):
     """处理/adddefaultkeywords命令 - 为所有群组添加默认关键词"""
     bot_instance = context.application.bot_data.get('bot_instance')
     
-    # 获取所有群组
-    groups = await bot_instance.db.find_all_groups()
+    # 流式遍历所有群组
     count = 0
     
-    for group in groups:
-        group_id = group['group_id']
-        await bot_instance.add_default_keywords(group_id)
-        count += 1
+    try:
+        async for group in bot_instance.db.iter_all_groups(projection={'group_id': 1}):
+            group_id = group['group_id']
+            await bot_instance.add_default_keywords(group_id)
+            count += 1
+    except Exception as e:
+        logger.error(f"添加默认关键词时遍历群组出错: {e}", exc_info=True)
+        await update.message.reply_text(f"❌ 遍历群组出错，已为 {count} 个群组添加默认关键词，请稍后重试")
+        return
     
     await update.message.reply_text(f"✅ 已为 {count} 个群组添加默认关键词")
 
@@ -1461,26 +1478,18 @@ async def handle_cleanup_invalid_groups(update: Update, context: CallbackContext
         )
         
         # 设置等待确认状态
-        context.user_data['waiting_for_cleanup_confirm'] = True
+        begin_input(update, context, True, key='waiting_for_cleanup_confirm')
         return
     except Exception as e:
         logger.error(f"清理无效群组命令出错: {e}", exc_info=True)
         await update.message.reply_text(f"❌ 命令处理出错: {str(e)}")
 
-# 优化后新增的消息统计更新函数
+# 消息统计更新函数
 async def update_message_stats(update: Update, context: CallbackContext):
-    """更新消息统计，使用改进的去重逻辑"""
+    """更新消息统计，统一交由 StatsManager 的写入路径处理"""
     if not update.effective_user or not update.effective_chat or not update.message:
         return
     
-    # 跳过机器人消息
-    if update.effective_user.is_bot:
-        return
-    
-    user_id = update.effective_user.id
-    group_id = update.effective_chat.id
-    message_id = update.message.message_id
-    
     # 确保是群组消息
     if update.effective_chat.type not in ['group', 'supergroup']:
         return
@@ -1490,72 +1499,9 @@ async def update_message_stats(update: Update, context: CallbackContext):
         return
     
     # 检查统计权限
-    if not await bot_instance.has_permission(group_id, GroupPermission.STATS):
+    if not await bot_instance.has_permission(update.effective_chat.id, GroupPermission.STATS):
         return
     
-    # 获取当前日期
-    today = datetime.datetime.now().strftime('%Y-%m-%d')
-    
-    # 获取群组设置
-    settings = await bot_instance.db.get_group_settings(group_id)
-    min_bytes = settings.get('min_bytes', 0)
-    count_media = settings.get('count_media', True)
-    
-    # 确定消息类型
-    message_type = 'text'
-    if update.message.photo:
-        message_type = 'photo'
-    elif update.message.video:
-        message_type = 'video'
-    elif update.message.document:
-        message_type = 'document'
-    elif update.message.sticker:
-        message_type = 'sticker'
-    
-    # 检查是否应该计数该消息
-    should_count = True
-    
-    # 对于文本消息，检查长度
-    if message_type == 'text' and update.message.text:
-        if len(update.message.text.encode('utf-8')) < min_bytes:
-            should_count = False
-    
-    # 对于媒体消息，检查是否计数
-    elif not count_media and message_type != 'text':
-        should_count = False
-    
-    # 如果应该计数，则添加到数据库
-    if should_count:
-        try:
-            # 使用更可靠的去重方式 - 尝试使用唯一键插入
-            # 如果数据库支持唯一索引，可以考虑在 group_id 和 message_id 上创建复合唯一索引
-            # 这里使用查询+更新的原子操作
-            result = await bot_instance.db.db.message_stats.update_one(
-                {
-                    'group_id': group_id,
-                    'message_id': message_id
-                },
-                {
-                    '$setOnInsert': {
-                        'group_id': group_id,
-                        'user_id': user_id,
-                        'date': today,
-                        'message_id': message_id,
-                        'message_type': message_type,
-                        'total_messages': 1,
-                        'is_bot': False,
-                        'timestamp': datetime.datetime.now()
-                    }
-                },
-                upsert=True
-            )
-            
-            # 如果没有插入新文档，说明消息已存在
-            if result.matched_count > 0:
-                return
-                
-            logger.debug(f"已记录消息统计: 用户={user_id}, 群组={group_id}, 类型={message_type}")
-        except Exception as e:
-            logger.error(f"记录消息统计失败: {e}", exc_info=True)
-            
-
+    await bot_instance.stats_manager.add_message_stat(
+        update.effective_chat.id, update.effective_user.id, update.message
+    )
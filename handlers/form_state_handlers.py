@@ -0,0 +1,71 @@
+"""
+表单状态持久化：处理更新前恢复未完成的表单，处理完成后写入变化
+"""
+import logging
+from telegram import Update
+from telegram.ext import Application, CallbackContext
+
+from core.state_store import PersistentStateStore
+from utils.interactive_users import interactive_users
+
+logger = logging.getLogger(__name__)
+
+# 需要持久化的 user_data 键
+FORM_STATE_KEYS = ('waiting_for', 'waiting_for_cleanup_confirm', 'keyword_form', 'broadcast_form')
+# 其中表示等待输入的键，恢复时重新登记为交互中用户
+INPUT_KEYS = ('waiting_for', 'waiting_for_cleanup_confirm')
+
+def attach_form_state(store: PersistentStateStore, application: Application):
+    """
+    表单状态被淘汰出内存时，同时从 user_data 中移除，下次使用时重新加载
+
+    参数:
+        store: 表单状态存储
+        application: 应用实例
+    """
+    def evict(user_id: int):
+        user_data = application.user_data.get(user_id)
+        if user_data:
+            for key in FORM_STATE_KEYS:
+                user_data.pop(key, None)
+    store.on_evict = evict
+
+async def restore_form_state(update: Update, context: CallbackContext):
+    """在其他处理器之前恢复只保存在数据库中的表单状态"""
+    bot_instance = context.application.bot_data.get('bot_instance')
+    user = update.effective_user
+    if not user or not bot_instance or not bot_instance.form_state:
+        return
+    store = bot_instance.form_state
+    if not store.needs_load(user.id):
+        return
+    try:
+        data = await store.load(user.id)
+    except Exception as e:
+        logger.error(f"加载用户 {user.id} 的表单状态失败: {e}", exc_info=True)
+        return
+    if not data:
+        return
+    context.user_data.update(data)
+    for key in INPUT_KEYS:
+        if key in data:
+            interactive_users.add(user.id, key)
+
+async def persist_form_state(update: Update, context: CallbackContext):
+    """在其他处理器之后把交互中用户的表单状态写入数据库"""
+    bot_instance = context.application.bot_data.get('bot_instance')
+    user = update.effective_user
+    if not user or not bot_instance or not bot_instance.form_state:
+        return
+    store = bot_instance.form_state
+    if user.id not in interactive_users and not store.has_state(user.id):
+        return
+    user_data = context.user_data
+    snapshot = {key: user_data[key] for key in FORM_STATE_KEYS if key in user_data}
+    try:
+        if snapshot:
+            await store.save(user.id, snapshot)
+        else:
+            await store.delete(user.id)
+    except Exception as e:
+        logger.error(f"保存用户 {user.id} 的表单状态失败: {e}", exc_info=True)
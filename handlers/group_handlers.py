@@ -0,0 +1,114 @@
+"""
+群组相关处理函数：从更新中收集群组标题，以及分页的群组选择菜单
+"""
+import logging
+import math
+from typing import Optional, Tuple
+from telegram import Update, InlineKeyboardMarkup
+from telegram.ext import CallbackContext
+from utils.decorators import handle_callback_errors
+from utils.keyboard_utils import KeyboardBuilder
+
+logger = logging.getLogger(__name__)
+
+# 群组选择菜单 {类型: (选中群组的回调前缀, 提示文本)}
+GROUP_PICKERS = {
+    'settings': ('settings_select_', "请选择要管理的群组："),
+    'kw': ('kwform_select_group_', "请选择要添加关键词的群组："),
+    'bc': ('bcform_select_group_', "请选择要添加轮播消息的群组："),
+}
+
+async def handle_my_chat_member(update: Update, context: CallbackContext):
+    """处理机器人在群组中的成员状态变化，记录群组标题"""
+    bot_instance = context.application.bot_data.get('bot_instance')
+    member_update = update.my_chat_member
+    if not bot_instance or not member_update:
+        return
+    logger.info(
+        "机器人在群组 %s 中的状态: %s -> %s",
+        member_update.chat.id, member_update.old_chat_member.status, member_update.new_chat_member.status
+    )
+    bot_instance.group_directory.observe(member_update.chat)
+
+async def track_group_title(update: Update, context: CallbackContext):
+    """从普通群组消息中记录群组标题，标题未变化时不访问数据库"""
+    bot_instance = context.application.bot_data.get('bot_instance')
+    if bot_instance and bot_instance.group_directory:
+        bot_instance.group_directory.observe(update.effective_chat)
+
+def set_picker_search(context: CallbackContext, kind: str, search: Optional[str]):
+    """保存群组选择菜单的搜索关键字，翻页时沿用"""
+    searches = context.user_data.setdefault('group_picker_search', {})
+    if search:
+        searches[kind] = search
+    else:
+        searches.pop(kind, None)
+
+async def build_group_picker(bot_instance, context: CallbackContext, user_id: int, kind: str,
+                             page: int = 1) -> Optional[Tuple[str, InlineKeyboardMarkup]]:
+    """
+    构建分页的群组选择菜单，每页只查询当前页的群组
+    
+    参数:
+        bot_instance: 机器人实例
+        context: 上下文对象
+        user_id: 用户ID
+        kind: 菜单类型，GROUP_PICKERS 中的键
+        page: 页码
+        
+    返回:
+        (文本, 键盘)，用户没有可管理的群组时返回None
+    """
+    from config import GROUP_DIRECTORY_SETTINGS
+    select_prefix, prompt = GROUP_PICKERS[kind]
+    page_size = GROUP_DIRECTORY_SETTINGS['page_size']
+    search = context.user_data.get('group_picker_search', {}).get(kind)
+    
+    page = max(page, 1)
+    groups, total = await bot_instance.db.get_manageable_groups_page(user_id, page, page_size, search)
+    if not total:
+        if search:
+            return f"❌ 没有标题或ID包含「{search}」的群组", InlineKeyboardMarkup([])
+        return None
+    total_pages = math.ceil(total / page_size)
+    if page > total_pages:
+        page = total_pages
+        groups, total = await bot_instance.db.get_manageable_groups_page(user_id, page, page_size, search)
+    
+    titles = bot_instance.group_directory.resolve_titles(context.bot, groups)
+    items = [(titles[group['group_id']], f"{select_prefix}{group['group_id']}") for group in groups]
+    keyboard = KeyboardBuilder.create_paginated_keyboard(items, page, total_pages, f"gpick_{kind}")
+    
+    text = prompt
+    if search:
+        text += f"\n🔍 搜索：{search}"
+    if total_pages > 1:
+        text += f"\n第 {page}/{total_pages} 页，共 {total} 个群组"
+    return text, keyboard
+
+@handle_callback_errors
+async def handle_group_picker_callback(update: Update, context: CallbackContext, data: str):
+    """处理群组选择菜单的翻页和返回"""
+    query = update.callback_query
+    await query.answer()
+    bot_instance = context.application.bot_data.get('bot_instance')
+    
+    # gpick_{类型}_page_{页码} 或 gpick_{类型}_back，参数已由回调路由解析
+    args = data.args
+    kind = args[0] if args else None
+    if kind not in GROUP_PICKERS:
+        return
+    if args[1:] == ('back',):
+        set_picker_search(context, kind, None)
+        await query.edit_message_text("已关闭群组选择")
+        return
+    if len(args) != 3 or args[1] != 'page' or not isinstance(args[2], int):
+        return
+    
+    page = args[2]
+    picker = await build_group_picker(bot_instance, context, update.effective_user.id, kind, page)
+    if not picker:
+        await query.edit_message_text("❌ 你没有权限管理任何群组")
+        return
+    text, keyboard = picker
+    await query.edit_message_text(text, reply_markup=keyboard)
@@ -9,6 +9,8 @@ from telegram.ext import CallbackContext
 
 from utils.decorators import handle_callback_errors
 from utils.message_utils import get_media_type, get_file_id
+from utils.interactive_users import begin_input, end_input
+from utils.callback_codec import encode_callback
 from db.models import GroupPermission
 
 logger = logging.getLogger(__name__)
@@ -58,7 +60,7 @@ async def handle_keyword_form_callback(update: Update, context: CallbackContext,
         if 'keyword_form' in context.user_data:
             del context.user_data['keyword_form']
         if 'waiting_for' in context.user_data:
-            del context.user_data['waiting_for']
+            end_input(update, context)
         await query.edit_message_text("✅ 已取消关键词添加")
         
     elif action == "select" and len(params) >= 2 and params[0] == "group":
@@ -92,7 +94,7 @@ async def handle_keyword_form_callback(update: Update, context: CallbackContext,
         )
         
         # 设置等待输入状态
-        context.user_data['waiting_for'] = 'keyword_pattern'
+        begin_input(update, context, 'keyword_pattern')
         
     elif action == "pattern" and len(params) >= 1 and params[0] == "received":
         # 已收到关键词模式: kwform_pattern_received
@@ -107,7 +109,7 @@ async def handle_keyword_form_callback(update: Update, context: CallbackContext,
             "发送完后请点击下方出现的「继续」按钮",
             reply_markup=InlineKeyboardMarkup(keyboard)
         )
-        context.user_data['waiting_for'] = 'keyword_pattern'
+        begin_input(update, context, 'keyword_pattern')
         
     elif action == "add" and len(params) >= 1:
         # 添加各种回复: kwform_add_text, kwform_add_media, kwform_add_button
@@ -121,7 +123,7 @@ async def handle_keyword_form_callback(update: Update, context: CallbackContext,
                 "发送完后请点击下方出现的「继续」按钮",
                 reply_markup=InlineKeyboardMarkup(keyboard)
             )
-            context.user_data['waiting_for'] = 'keyword_response'
+            begin_input(update, context, 'keyword_response')
             
         elif add_type == "media":
             # 添加媒体响应
@@ -134,7 +136,7 @@ async def handle_keyword_form_callback(update: Update, context: CallbackContext,
                 "发送完后请点击下方出现的「继续」按钮",
                 reply_markup=InlineKeyboardMarkup(keyboard)
             )
-            context.user_data['waiting_for'] = 'keyword_media'
+            begin_input(update, context, 'keyword_media')
             
         elif add_type == "button":
             # 添加按钮
@@ -151,7 +153,7 @@ async def handle_keyword_form_callback(update: Update, context: CallbackContext,
                 "发送完后请点击下方出现的「继续」按钮",
                 reply_markup=InlineKeyboardMarkup(keyboard)
             )
-            context.user_data['waiting_for'] = 'keyword_buttons'
+            begin_input(update, context, 'keyword_buttons')
             
         else:
             logger.warning(f"未知的添加类型: {add_type}")
@@ -240,8 +242,8 @@ async def handle_keyword_detail_callback(update: Update, context: CallbackContex
             
             # 构建操作按钮
             keyboard = [
-                [InlineKeyboardButton("👁️ 预览", callback_data=f"keyword_preview_{keyword_id}_{group_id}")],
-                [InlineKeyboardButton("❌ 删除", callback_data=f"keyword_delete_{keyword_id}_{group_id}")],
+                [InlineKeyboardButton("👁️ 预览", callback_data=encode_callback("keyword_preview_", keyword_id, group_id))],
+                [InlineKeyboardButton("❌ 删除", callback_data=encode_callback("keyword_delete_", keyword_id, group_id))],
                 [InlineKeyboardButton("🔙 返回", callback_data=f"settings_keywords_{group_id}")]
             ]
             
@@ -344,7 +346,7 @@ async def handle_keyword_preview_callback(update: Update, context: CallbackConte
     
     # 显示返回按钮
     keyboard = [
-        [InlineKeyboardButton("🔙 返回详情", callback_data=f"keyword_detail_{keyword_id}_{group_id}")]
+        [InlineKeyboardButton("🔙 返回详情", callback_data=encode_callback("keyword_detail_", keyword_id, group_id))]
     ]
     await query.edit_message_text(
         "👆 上方为关键词回复预览\n\n点击「返回详情」继续查看",
@@ -379,8 +381,8 @@ async def handle_keyword_delete_callback(update: Update, context: CallbackContex
     # 确认删除
     keyboard = [
         [
-            InlineKeyboardButton("✅ 确认删除", callback_data=f"keyword_confirm_delete_{keyword_id}_{group_id}"),
-            InlineKeyboardButton("❌ 取消", callback_data=f"keyword_detail_{keyword_id}_{group_id}")
+            InlineKeyboardButton("✅ 确认删除", callback_data=encode_callback("keyword_confirm_delete_", keyword_id, group_id)),
+            InlineKeyboardButton("❌ 取消", callback_data=encode_callback("keyword_detail_", keyword_id, group_id))
         ]
     ]
     
@@ -428,7 +430,7 @@ async def handle_keyword_confirm_delete_callback(update: Update, context: Callba
         await query.edit_message_text(
             f"❌ 删除关键词出错: {str(e)}",
             reply_markup=InlineKeyboardMarkup([[
-                InlineKeyboardButton("返回关键词详情", callback_data=f"keyword_detail_{keyword_id}_{group_id}")
+                InlineKeyboardButton("返回关键词详情", callback_data=encode_callback("keyword_detail_", keyword_id, group_id))
             ]])
         )
     except Exception as e:
@@ -436,7 +438,7 @@ async def handle_keyword_confirm_delete_callback(update: Update, context: Callba
         await query.edit_message_text(
             f"❌ 删除关键词出错: {str(e)}",
             reply_markup=InlineKeyboardMarkup([[
-                InlineKeyboardButton("返回关键词详情", callback_data=f"keyword_detail_{keyword_id}_{group_id}")
+                InlineKeyboardButton("返回关键词详情", callback_data=encode_callback("keyword_detail_", keyword_id, group_id))
             ]])
         )
         
@@ -465,7 +467,7 @@ async def handle_keyword_form_input(update: Update, context: CallbackContext, in
     if not form_data:
         logger.warning(f"用户 {user_id} 处于关键词输入模式但无表单数据")
         await message.reply_text("❌ 关键词表单数据丢失，请重新开始")
-        context.user_data.pop('waiting_for', None)
+        end_input(update, context)
         return True
         
     # 根据输入类型处理
@@ -482,7 +484,7 @@ async def handle_keyword_form_input(update: Update, context: CallbackContext, in
         # 存储关键词模式
         form_data['pattern'] = pattern
         context.user_data['keyword_form'] = form_data
-        context.user_data.pop('waiting_for', None)
+        end_input(update, context)
         logger.info(f"成功设置关键词模式: {pattern}")
         
         # 提供继续按钮
@@ -510,7 +512,7 @@ async def handle_keyword_form_input(update: Update, context: CallbackContext, in
         # 存储回复文本
         form_data['response'] = response
         context.user_data['keyword_form'] = form_data
-        context.user_data.pop('waiting_for', None)
+        end_input(update, context)
         logger.info(f"成功设置关键词回复文本, 长度: {len(response)}")
         
         # 提供继续按钮
@@ -549,7 +551,7 @@ async def handle_keyword_form_input(update: Update, context: CallbackContext, in
             
         form_data['media'] = {'type': media_type, 'file_id': file_id}
         context.user_data['keyword_form'] = form_data
-        context.user_data.pop('waiting_for', None)
+        end_input(update, context)
         logger.info(f"成功设置媒体: type={media_type}, file_id={file_id}")
         
         # 提供继续按钮
@@ -624,7 +626,7 @@ async def handle_keyword_form_input(update: Update, context: CallbackContext, in
         # 存储按钮配置
         form_data['buttons'] = buttons
         context.user_data['keyword_form'] = form_data
-        context.user_data.pop('waiting_for', None)
+        end_input(update, context)
         logger.info(f"成功设置 {len(buttons)} 个按钮")
         
         # 提供继续按钮
@@ -882,7 +884,7 @@ async def submit_keyword_form(update: Update, context: CallbackContext):
         if 'keyword_form' in context.user_data:
             del context.user_data['keyword_form']
         if 'waiting_for' in context.user_data:
-            del context.user_data['waiting_for']
+            end_input(update, context)
         
         # 显示成功消息
         keyboard = [
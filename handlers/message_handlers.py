@@ -10,6 +10,7 @@ from telegram.ext import CallbackContext
 
 from utils.decorators import error_handler
 from utils.message_utils import get_media_type, get_file_id, validate_delete_timeout
+from utils.interactive_users import end_input, interactive_users
 from db.models import GroupPermission
 
 logger = logging.getLogger(__name__)
@@ -28,22 +29,23 @@ async def handle_message(update: Update, context: CallbackContext):
     message = update.effective_message
     user_id = update.effective_user.id
     group_id = update.effective_chat.id
-    
-    if message.text:
-        logger.info(f"处理消息 - 用户ID: {user_id}, 消息内容: {message.text}")
-    else:
-        media_type = get_media_type(message)
-        logger.info(f"处理消息 - 用户ID: {user_id}, 消息类型: {media_type or '未知'}")
-    if update.effective_user:
-        logger.info(f"用户 {user_id} 的上下文数据: {context.user_data}")
-    
-    logger.debug(f"处理消息 - 用户ID: {user_id}, 群组ID: {group_id}, 消息类型: {get_media_type(message) or 'text'}")
+
+    # 普通群组成员没有待处理的表单或设置，直接处理群组消息，
+    # 也避免为每个成员创建 user_data
+    if update.effective_chat.type != 'private' and user_id not in interactive_users:
+        await handle_group_message(update, context)
+        return
+
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("处理消息 - 用户ID: %s, 群组ID: %s, 消息类型: %s, 消息内容: %s",
+                     user_id, group_id, get_media_type(message) or 'text', message.text)
+        logger.debug("用户 %s 的上下文数据: %s", user_id, context.user_data)
 
     # 处理确认删除无效群组
     if context.user_data.get('waiting_for_cleanup_confirm'):
         if message.text.lower() == 'confirm':
             # 清除等待状态
-            del context.user_data['waiting_for_cleanup_confirm']
+            end_input(update, context, key='waiting_for_cleanup_confirm')
             
             # 执行清理
             await message.reply_text("🔄 正在清理无效群组...")
@@ -55,7 +57,7 @@ async def handle_message(update: Update, context: CallbackContext):
                 await message.reply_text(f"❌ 清理过程中出错: {str(e)}")
         elif message.text.lower() == 'cancel':
             # 清除等待状态
-            del context.user_data['waiting_for_cleanup_confirm']
+            end_input(update, context, key='waiting_for_cleanup_confirm')
             await message.reply_text("❌ 已取消清理操作")
         else:
             await message.reply_text("请回复 'confirm' 确认执行，或 'cancel' 取消操作")
@@ -63,12 +65,12 @@ async def handle_message(update: Update, context: CallbackContext):
     
     # 处理表单输入
     if await handle_form_input(update, context):
-        logger.debug(f"消息被表单处理器处理")
+        logger.debug("消息被表单处理器处理")
         return
     
     # 处理设置输入
     if await handle_settings_input(update, context):
-        logger.debug(f"消息被设置处理器处理")
+        logger.debug("消息被设置处理器处理")
         return
     
     # 私聊消息单独处理
@@ -94,7 +96,7 @@ async def handle_form_input(update: Update, context: CallbackContext) -> bool:
     waiting_for = context.user_data.get('waiting_for')
     
     if not waiting_for:
-        logger.debug(f"用户 {user_id} 没有等待中的表单输入")
+        logger.debug("用户 %s 没有等待中的表单输入", user_id)
         return False
         
     message = update.effective_message
@@ -310,15 +312,15 @@ async def handle_group_message(update: Update, context: CallbackContext):
     
     # 处理关键词回复
     if message.text and await bot_instance.has_permission(group_id, GroupPermission.KEYWORDS):
-        logger.debug(f"检查关键词匹配 - 群组: {group_id}, 文本: {message.text[:20]}...")
+        logger.debug("检查关键词匹配 - 群组: %s, 文本: %.20s...", group_id, message.text)
         try:
             keyword_id = await bot_instance.keyword_manager.match_keyword(group_id, message.text, message)
             if keyword_id:
-                logger.info(f"找到匹配关键词: {keyword_id}")
+                logger.info("找到匹配关键词: %s", keyword_id)
                 # 检查这是否是内置处理函数的结果（一般为模式本身）
                 if keyword_id in bot_instance.keyword_manager._built_in_handlers:
                     # 内置处理函数已经处理了响应，不需要再发送回复
-                    logger.info(f"内置处理函数已处理关键词: {keyword_id}")
+                    logger.info("内置处理函数已处理关键词: %s", keyword_id)
                 else:
                     # 只有自定义关键词才需要查询和发送回复
                     await send_keyword_response(bot_instance, message, keyword_id, group_id)
@@ -328,9 +330,8 @@ async def handle_group_message(update: Update, context: CallbackContext):
     # 处理消息统计
     if await bot_instance.has_permission(group_id, GroupPermission.STATS):
         try:
-            logger.info(f"开始处理消息统计 - 群组: {group_id}, 用户: {user_id}")
             await bot_instance.stats_manager.add_message_stat(group_id, user_id, message)
-            logger.info(f"消息统计处理完成 - 群组: {group_id}, 用户: {user_id}")
+            logger.debug("消息统计处理完成 - 群组: %s, 用户: %s", group_id, user_id)
         except Exception as e:
             logger.error(f"添加消息统计失败: {e}", exc_info=True)
 
@@ -10,6 +10,7 @@ from telegram.ext import CallbackContext
 from utils.decorators import handle_callback_errors, require_admin
 from utils.time_utils import format_duration
 from utils.keyboard_utils import KeyboardBuilder
+from utils.callback_codec import encode_callback
 from db.models import GroupPermission
 
 logger = logging.getLogger(__name__)
@@ -81,6 +82,16 @@ async def handle_settings_callback(update: Update, context: CallbackContext, dat
             logger.error(f"处理自动删除设置开关时出错: {e}")
             await query.edit_message_text("❌ 无效的群组ID")
             return
+    elif data.startswith("keyword_list_page_"):  # 关键词列表翻页: keyword_list_page_{页码}_{群组ID}
+        try:
+            page, group_id = (int(part) for part in data[18:].split('_', 1))
+        except ValueError:
+            await query.edit_message_text("❌ 无效的回调数据")
+            return
+        if not await bot_instance.db.can_manage_group(update.effective_user.id, group_id):
+            await query.edit_message_text("❌ 你没有权限管理此群组")
+            return
+        return await show_keyword_settings(bot_instance, query, group_id, page)
     else:
         logger.warning(f"未知的设置回调前缀: {data}")
         await query.edit_message_text("❌ 未知的设置操作")
@@ -475,23 +486,14 @@ async def show_manageable_groups(bot_instance, query, context):
         query: 回调查询
         context: 上下文对象
     """
-    manageable_groups = await bot_instance.db.get_manageable_groups(query.from_user.id)
-    if not manageable_groups:
+    from handlers.group_handlers import build_group_picker
+    picker = await build_group_picker(bot_instance, context, query.from_user.id, 'settings')
+    if not picker:
         await query.edit_message_text("❌ 你没有权限管理任何群组")
         return  
         
-    keyboard = []
-    for group in manageable_groups:
-        try:
-            group_info = await context.bot.get_chat(group['group_id'])
-            group_name = group_info.title or f"群组 {group['group_id']}"
-        except Exception as e:
-            logger.warning(f"获取群组 {group['group_id']} 信息失败: {e}")
-            group_name = f"群组 {group['group_id']}"   
-            
-        keyboard.append([InlineKeyboardButton(group_name, callback_data=f"settings_select_{group['group_id']}")])
-        
-    await query.edit_message_text("请选择要管理的群组：", reply_markup=InlineKeyboardMarkup(keyboard))
+    text, reply_markup = picker
+    await query.edit_message_text(text, reply_markup=reply_markup)
 
 async def show_settings_menu(bot_instance, query, group_id: int):
     """
@@ -548,11 +550,10 @@ async def show_broadcast_settings(bot_instance, query, group_id: int):
         query: 回调查询
         group_id: 群组ID
     """
-    broadcasts = await bot_instance.db.get_broadcasts(group_id)
     keyboard = []  
     
-    # 显示现有的轮播消息
-    for bc in broadcasts:
+    # 显示现有的轮播消息，只读取按钮需要的字段
+    async for bc in bot_instance.db.iter_broadcasts(group_id, projection={'text': 1, 'media': 1}):
         if bc is None:
             continue  # 跳过None值
         
@@ -568,7 +569,7 @@ async def show_broadcast_settings(bot_instance, query, group_id: int):
             keyboard.append([
                 InlineKeyboardButton(
                     f"📢 {broadcast_type}: {content_preview}", 
-                    callback_data=f"broadcast_detail_{bc['_id']}_{group_id}"
+                    callback_data=encode_callback("broadcast_detail_", bc['_id'], group_id)
                 )
             ])
         except Exception as e:
@@ -591,25 +592,21 @@ async def show_keyword_settings(bot_instance, query, group_id: int, page: int =
         group_id: 群组ID
         page: 页码
     """
-    # 获取关键词列表
-    keywords = await bot_instance.db.get_keywords(group_id)
+    # 只获取当前页关键词的 _id 和 pattern
+    page_size = 10
+    page = max(page, 1)
+    page_keywords, total = await bot_instance.db.get_keywords_page(group_id, page, page_size)
     
     # 计算分页信息
-    total_pages = (len(keywords) + 9) // 10
-    if page < 1:
-        page = 1
+    total_pages = (total + page_size - 1) // page_size
     if page > total_pages and total_pages > 0:
         page = total_pages
-        
-    # 获取当前页的关键词
-    start_idx = (page - 1) * 10
-    end_idx = min(start_idx + 10, len(keywords))
-    page_keywords = keywords[start_idx:end_idx] if keywords else []
+        page_keywords, total = await bot_instance.db.get_keywords_page(group_id, page, page_size)
     
     # 构建关键词按钮
     keyboard = [
         [InlineKeyboardButton(f"🔑 {kw['pattern'][:20] + '...' if len(kw['pattern']) > 20 else kw['pattern']}", 
-                            callback_data=f"keyword_detail_{kw['_id']}_{group_id}")] 
+                            callback_data=encode_callback("keyword_detail_", kw['_id'], group_id))] 
         for kw in page_keywords
     ]
     
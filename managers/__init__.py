@@ -6,10 +6,12 @@ from managers.keyword_manager import KeywordManager
 from managers.stats_manager import StatsManager
 from managers.broadcast_manager import BroadcastManager
 from managers.recovery_manager import RecoveryManager 
+from managers.group_directory import GroupDirectory
 
 __all__ = [
     'SettingsManager',
     'KeywordManager',
     'StatsManager',
-    'BroadcastManager'
+    'BroadcastManager',
+    'GroupDirectory'
 ]
@@ -90,28 +90,18 @@ class AutoDeleteManager:
             from config import AUTO_DELETE_SETTINGS
             logger.info("应用默认自动删除设置...")
             
-            # 获取所有群组
-            groups = await self.db.find_all_groups()
-            
-            for group in groups:
-                group_id = group.get('group_id')
-                settings = await self.db.get_group_settings(group_id)
-                
-                # 只在设置不存在时应用默认值
-                if 'auto_delete' not in settings:
-                    settings['auto_delete'] = AUTO_DELETE_SETTINGS.get('default_enabled', False)
-                
-                if 'auto_delete_timeout' not in settings:
-                    settings['auto_delete_timeout'] = AUTO_DELETE_SETTINGS.get('default_timeout', 300)
-                
-                # 确保 auto_delete_timeouts 存在
-                if 'auto_delete_timeouts' not in settings:
-                    settings['auto_delete_timeouts'] = {
-                        'default': settings.get('auto_delete_timeout', 300),
-                        'keyword': settings.get('auto_delete_timeout', 300),
-                        'broadcast': settings.get('auto_delete_timeout', 300),
-                        'ranking': settings.get('auto_delete_timeout', 300),
-                        'command': settings.get('auto_delete_timeout', 300),
+            def defaults_for(settings: Dict[str, Any]) -> Dict[str, Any]:
+                """按群组当前设置计算默认值，各类型超时默认沿用群组的通用超时"""
+                timeout = settings.get('auto_delete_timeout', AUTO_DELETE_SETTINGS.get('default_timeout', 300))
+                return {
+                    'auto_delete': AUTO_DELETE_SETTINGS.get('default_enabled', False),
+                    'auto_delete_timeout': timeout,
+                    'auto_delete_timeouts': {
+                        'default': timeout,
+                        'keyword': timeout,
+                        'broadcast': timeout,
+                        'ranking': timeout,
+                        'command': timeout,
                         # 增加新消息类型的默认超时设置
                         'error': 30,
                         'warning': 30,
@@ -119,9 +109,10 @@ class AutoDeleteManager:
                         'feedback': 30,
                         'interaction': 180
                     }
-                
-                await self.db.update_group_settings(group_id, settings)
-                logger.info(f"已更新群组 {group_id} 的自动删除设置")
+                }
+            
+            updated = await self.db.apply_group_settings_defaults(defaults_for)
+            logger.info(f"已更新 {updated} 个群组的自动删除设置")
         except Exception as e:
             logger.error(f"应用默认自动删除设置失败: {e}", exc_info=True)
 
@@ -13,8 +13,18 @@ import random
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Bot, Message
 from telegram.error import BadRequest, Forbidden, TelegramError, TimedOut, RetryAfter
 
+from utils.metrics import metrics
+
 logger = logging.getLogger(__name__)
 
+# 轮播发送指标
+BROADCAST_SENDS = metrics.counter(
+    'bot_broadcast_sends_total', '轮播消息发送次数', ('result',)
+)
+BROADCAST_TICK = metrics.gauge(
+    'bot_broadcast_last_tick', '最近一轮轮播处理的发送数', ('result',)
+)
+
 class BroadcastManager:
     """
     增强版轮播消息管理器，处理定时消息的发送
@@ -342,7 +352,7 @@ class BroadcastManager:
             
     async def get_broadcasts(self, group_id: int) -> List[Dict[str, Any]]:
         """
-        获取群组的轮播消息
+        获取群组的轮播消息，最多返回每个群组的轮播消息上限条
         
         参数:
             group_id: 群组ID
@@ -350,9 +360,10 @@ class BroadcastManager:
         返回:
             轮播消息列表
         """
+        from config import BROADCAST_SETTINGS
         try:
             # 从数据库获取
-            broadcasts = await self.db.get_broadcasts(group_id)
+            broadcasts = await self.db.get_broadcasts(group_id, limit=BROADCAST_SETTINGS['max_broadcasts'])
             
             # 优化轮播消息显示状态
             for broadcast in broadcasts:
@@ -481,10 +492,9 @@ class BroadcastManager:
                     base_minute = minute
                     current_minute = now.hour * 60 + now.minute
                     next_minute = ((current_minute // interval) + 1) * interval
-                    next_hour = next_minute // 60
-                    next_minute = next_minute % 60
-                    
-                    next_time = now.replace(hour=next_hour, minute=next_minute, second=0, microsecond=0)
+                    # 按当天零点加分钟数计算，跨过午夜时自动进入次日
+                    midnight = now.replace(hour=0, minute=0, second=0, microsecond=0)
+                    next_time = midnight + timedelta(minutes=next_minute)
                     if next_time <= now:
                         next_time += timedelta(hours=1)
                     return next_time
@@ -508,29 +518,23 @@ class BroadcastManager:
         try:
             logger.info("======= 开始处理轮播消息 =======")
             from db.models import GroupPermission
+            sent_before = BROADCAST_SENDS.get(result='success')
+            failed_before = BROADCAST_SENDS.get(result='failure')
             
             # 获取所有应发送的轮播消息
             due_broadcasts = await self.db.get_due_broadcasts()
-            logger.info(f"找到 {len(due_broadcasts)} 条待发送的轮播消息")
+            logger.info("找到 %s 条待发送的轮播消息", len(due_broadcasts))
             
-            if len(due_broadcasts) > 0:
+            if due_broadcasts and logger.isEnabledFor(logging.DEBUG):
                 for broadcast in due_broadcasts:
-                    broadcast_id = str(broadcast.get('_id', ''))
-                    logger.info(f"待发送轮播: ID={broadcast_id}, 群组={broadcast['group_id']}")
-                    if broadcast.get('start_time'):
-                        logger.info(f"  开始时间={broadcast['start_time']}")
-                    if broadcast.get('end_time'):
-                        logger.info(f"  结束时间={broadcast['end_time']}")
-                    if broadcast.get('repeat_type'):
-                        logger.info(f"  重复类型={broadcast['repeat_type']}")
-                    if broadcast.get('interval'):
-                        logger.info(f"  间隔={broadcast['interval']} 分钟")
-                    if broadcast.get('use_fixed_time') is not None:
-                        logger.info(f"  使用固定时间={broadcast['use_fixed_time']}")
-                    if broadcast.get('schedule_time'):
-                        logger.info(f"  调度时间={broadcast['schedule_time']}")
-                    if broadcast.get('last_broadcast'):
-                        logger.info(f"  上次发送时间={broadcast['last_broadcast']}")
+                    logger.debug(
+                        "待发送轮播: ID=%s, 群组=%s, 开始时间=%s, 结束时间=%s, 重复类型=%s, "
+                        "间隔=%s 分钟, 使用固定时间=%s, 调度时间=%s, 上次发送时间=%s",
+                        broadcast.get('_id', ''), broadcast['group_id'], broadcast.get('start_time'),
+                        broadcast.get('end_time'), broadcast.get('repeat_type'), broadcast.get('interval'),
+                        broadcast.get('use_fixed_time'), broadcast.get('schedule_time'),
+                        broadcast.get('last_broadcast')
+                    )
             
             # 优化处理逻辑，使用asyncio.gather进行并行处理
             tasks = []
@@ -586,6 +590,8 @@ class BroadcastManager:
             else:
                 logger.info("没有需要处理的轮播任务")
             
+            BROADCAST_TICK.set(BROADCAST_SENDS.get(result='success') - sent_before, result='success')
+            BROADCAST_TICK.set(BROADCAST_SENDS.get(result='failure') - failed_before, result='failure')
             logger.info("======= 轮播消息处理完成 =======")
         except Exception as e:
             logger.error(f"处理轮播消息出错: {e}", exc_info=True)
@@ -615,6 +621,7 @@ class BroadcastManager:
                 # 发送轮播消息
                 logger.info(f"准备发送轮播消息: {broadcast_id}")
                 success = await self.send_broadcast(broadcast)
+                BROADCAST_SENDS.inc(result='success' if success else 'failure')
                 
                 if success:
                     # 更新最后发送时间
@@ -638,6 +645,7 @@ class BroadcastManager:
                     self.error_tracker[broadcast_id]['timestamp'] = datetime.now()
                     logger.warning(f"轮播消息 {broadcast_id} 发送失败，当前错误计数: {self.error_tracker[broadcast_id]['count']}")
         except Exception as e:
+            BROADCAST_SENDS.inc(result='failure')
             logger.error(f"处理轮播消息 {broadcast_id} 出错: {e}", exc_info=True)
             
             # 记录错误
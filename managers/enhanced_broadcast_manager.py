@@ -13,8 +13,19 @@ import random
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Bot, Message
 from telegram.error import BadRequest, Forbidden, TelegramError, TimedOut, RetryAfter
 
+from db.models import Broadcast
+from utils.metrics import metrics
+
 logger = logging.getLogger(__name__)
 
+# 轮播发送指标
+BROADCAST_SENDS = metrics.counter(
+    'bot_broadcast_sends_total', '轮播消息发送次数', ('result',)
+)
+BROADCAST_TICK = metrics.gauge(
+    'bot_broadcast_last_tick', '最近一轮轮播处理的发送数', ('result',)
+)
+
 class EnhancedBroadcastManager:
     """
     增强版轮播消息管理器，处理定时消息的发送
@@ -496,7 +507,7 @@ class EnhancedBroadcastManager:
             
     async def get_broadcasts(self, group_id: int) -> List[Dict[str, Any]]:
         """
-        获取群组的轮播消息
+        获取群组的轮播消息，最多返回每个群组的轮播消息上限条
         
         参数:
             group_id: 群组ID
@@ -504,9 +515,10 @@ class EnhancedBroadcastManager:
         返回:
             轮播消息列表
         """
+        from config import BROADCAST_SETTINGS
         try:
             # 从数据库获取
-            broadcasts = await self.db.get_broadcasts(group_id)
+            broadcasts = await self.db.get_broadcasts(group_id, limit=BROADCAST_SETTINGS['max_broadcasts'])
             
             # 优化轮播消息显示状态
             for broadcast in broadcasts:
@@ -623,10 +635,9 @@ class EnhancedBroadcastManager:
                 base_minute = minute
                 current_minute = now.hour * 60 + now.minute
                 next_minute = ((current_minute // interval) + 1) * interval
-                next_hour = next_minute // 60
-                next_minute = next_minute % 60
-                
-                next_time = now.replace(hour=next_hour, minute=next_minute, second=0, microsecond=0)
+                # 按当天零点加分钟数计算，跨过午夜时自动进入次日
+                midnight = now.replace(hour=0, minute=0, second=0, microsecond=0)
+                next_time = midnight + timedelta(minutes=next_minute)
                 if next_time <= now:
                     next_time += timedelta(hours=1)
                 return next_time
@@ -652,23 +663,24 @@ class EnhancedBroadcastManager:
         try:
             logger.info("======= 开始处理轮播消息 =======")
             from db.models import GroupPermission
+            sent_before = BROADCAST_SENDS.get(result='success')
+            failed_before = BROADCAST_SENDS.get(result='failure')
             
             # 获取所有应发送的轮播消息
             due_broadcasts = await self.db.get_due_broadcasts()
-            logger.info(f"找到 {len(due_broadcasts)} 条待发送的轮播消息")
+            logger.info("找到 %s 条待发送的轮播消息", len(due_broadcasts))
             
             # 增加详细日志
-            for broadcast in due_broadcasts:
-                broadcast_id = str(broadcast.get('_id', ''))
-                logger.info(f"轮播消息详情 ID={broadcast_id}:")
-                logger.info(f"  group_id={broadcast['group_id']}")
-                logger.info(f"  start_time={broadcast.get('start_time')}")
-                logger.info(f"  end_time={broadcast.get('end_time')}")
-                logger.info(f"  repeat_type={broadcast.get('repeat_type')}")
-                logger.info(f"  interval={broadcast.get('interval')}")
-                logger.info(f"  use_fixed_time={broadcast.get('use_fixed_time')}")
-                logger.info(f"  schedule_time={broadcast.get('schedule_time')}")
-                logger.info(f"  last_broadcast={broadcast.get('last_broadcast')}")
+            if logger.isEnabledFor(logging.DEBUG):
+                for broadcast in due_broadcasts:
+                    logger.debug(
+                        "轮播消息详情 ID=%s: group_id=%s, start_time=%s, end_time=%s, repeat_type=%s, "
+                        "interval=%s, use_fixed_time=%s, schedule_time=%s, last_broadcast=%s",
+                        broadcast.get('_id', ''), broadcast['group_id'], broadcast.get('start_time'),
+                        broadcast.get('end_time'), broadcast.get('repeat_type'), broadcast.get('interval'),
+                        broadcast.get('use_fixed_time'), broadcast.get('schedule_time'),
+                        broadcast.get('last_broadcast')
+                    )
             
             # 检查需要重试的消息
             now = datetime.now()
@@ -676,7 +688,8 @@ class EnhancedBroadcastManager:
             for broadcast_id, retry_info in list(self.retry_tracker.items()):
                 if now >= retry_info['next_retry']:
                     logger.info(f"轮播消息 {broadcast_id} 需要重试，第 {retry_info['attempt']} 次尝试")
-                    retry_broadcasts.append(retry_info['broadcast'])
+                    # 处理过程中会写入字段，重试时使用可变的副本
+                    retry_broadcasts.append(retry_info['broadcast'].to_dict())
                 else:
                     remaining = (retry_info['next_retry'] - now).total_seconds()
                     logger.info(f"轮播消息 {broadcast_id} 将在 {remaining:.1f} 秒后重试")
@@ -745,6 +758,8 @@ class EnhancedBroadcastManager:
             else:
                 logger.info("没有需要处理的轮播任务")
             
+            BROADCAST_TICK.set(BROADCAST_SENDS.get(result='success') - sent_before, result='success')
+            BROADCAST_TICK.set(BROADCAST_SENDS.get(result='failure') - failed_before, result='failure')
             logger.info("======= 轮播消息处理完成 =======")
         except Exception as e:
             logger.error(f"处理轮播消息出错: {e}", exc_info=True)
@@ -790,6 +805,7 @@ class EnhancedBroadcastManager:
             # 发送轮播消息
             logger.info(f"准备{'重试' if is_retry else ''}发送轮播消息: {broadcast_id}")
             success = await self.send_broadcast(broadcast)
+            BROADCAST_SENDS.inc(result='success' if success else 'failure')
             
             if success:
                 # 如果是强制发送，只更新last_forced_send，不更新last_broadcast
@@ -824,7 +840,7 @@ class EnhancedBroadcastManager:
                     self.retry_tracker[broadcast_id] = {
                         'attempt': 1,
                         'next_retry': datetime.now() + timedelta(seconds=self.RETRY_INTERVALS[0]),
-                        'broadcast': broadcast
+                        'broadcast': Broadcast.from_dict(broadcast)
                     }
                     logger.info(f"轮播消息 {broadcast_id} 首次发送失败，将在 {self.RETRY_INTERVALS[0]} 秒后重试")
                 else:
@@ -860,6 +876,7 @@ class EnhancedBroadcastManager:
                         logger.warning(f"轮播消息 {broadcast_id} 发送失败，当前错误计数: {self.error_tracker[broadcast_id]['count']}")
 
         except Exception as e:
+            BROADCAST_SENDS.inc(result='failure')
             logger.error(f"处理轮播消息 {broadcast_id} 出错: {e}", exc_info=True)
             # 更新数据库中的错误状态
             try:
@@ -0,0 +1,111 @@
+"""
+群组标题目录，菜单直接使用保存在群组文档中的标题，避免逐个调用 get_chat
+"""
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Iterable, Set
+
+from telegram import Bot, Chat
+
+logger = logging.getLogger(__name__)
+
+class GroupDirectory:
+    """
+    群组标题目录
+
+    标题从 my_chat_member 和普通群组消息中获取并写入群组文档；
+    菜单显示时缺失或过期的标题在后台以有限并发通过 get_chat 刷新
+    """
+    def __init__(self, db, refresh_concurrency: int = 5, title_ttl: timedelta = timedelta(days=7)):
+        """
+        初始化群组标题目录
+
+        参数:
+            db: 数据库实例
+            refresh_concurrency: 后台刷新时并发的 get_chat 请求数
+            title_ttl: 标题的有效期，过期后在下次显示时刷新
+        """
+        self.db = db
+        self.title_ttl = title_ttl
+        self._titles: Dict[int, str] = {}  # 已写入数据库的标题，用于跳过重复写入
+        self._refreshing: Set[int] = set()
+        self._semaphore = asyncio.Semaphore(refresh_concurrency)
+        self._tasks: Set[asyncio.Task] = set()
+
+    def _spawn(self, coro):
+        """启动后台任务并保留引用直到完成"""
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def observe(self, chat: Chat):
+        """
+        记录更新中携带的群组标题，标题变化时写入数据库
+
+        参数:
+            chat: 更新中的聊天对象
+        """
+        if chat is None or chat.type not in (Chat.GROUP, Chat.SUPERGROUP) or not chat.title:
+            return
+        if self._titles.get(chat.id) == chat.title:
+            return
+        self._titles[chat.id] = chat.title
+        self._spawn(self.db.update_group_titles({chat.id: chat.title}))
+
+    @staticmethod
+    def label(group: Dict[str, Any]) -> str:
+        """群组的显示名称，没有标题时使用群组ID"""
+        return group.get('title') or f"群组 {group['group_id']}"
+
+    def resolve_titles(self, bot: Bot, groups: Iterable[Dict[str, Any]]) -> Dict[int, str]:
+        """
+        获取群组的显示名称
+
+        立即返回数据库中的标题，缺失或过期的标题在后台刷新，下次显示时生效
+
+        参数:
+            bot: 用于调用 get_chat 的机器人实例
+            groups: 群组文档
+
+        返回:
+            {群组ID: 显示名称}
+        """
+        expire_before = datetime.now() - self.title_ttl
+        titles = {}
+        stale = []
+        for group in groups:
+            group_id = group['group_id']
+            titles[group_id] = self.label(group)
+            if group.get('title'):
+                self._titles.setdefault(group_id, group['title'])
+            updated_at = group.get('title_updated_at')
+            if not group.get('title') or not updated_at or updated_at < expire_before:
+                if group_id not in self._refreshing:
+                    stale.append(group_id)
+
+        if stale:
+            self._refreshing.update(stale)
+            self._spawn(self._refresh(bot, stale))
+        return titles
+
+    async def _fetch_title(self, bot: Bot, group_id: int):
+        """通过 get_chat 获取群组标题"""
+        async with self._semaphore:
+            try:
+                chat = await bot.get_chat(group_id)
+                return chat.title
+            except Exception as e:
+                logger.warning(f"获取群组 {group_id} 信息失败: {e}")
+                return None
+
+    async def _refresh(self, bot: Bot, group_ids: List[int]):
+        """后台刷新群组标题"""
+        try:
+            results = await asyncio.gather(*(self._fetch_title(bot, group_id) for group_id in group_ids))
+            titles = {group_id: title for group_id, title in zip(group_ids, results) if title}
+            self._titles.update(titles)
+            await self.db.update_group_titles(titles)
+            logger.info(f"已刷新 {len(titles)}/{len(group_ids)} 个群组的标题")
+        finally:
+            self._refreshing.difference_update(group_ids)
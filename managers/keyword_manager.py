@@ -65,7 +65,7 @@ class KeywordManager:
         # 首先检查内置处理函数
         for pattern, handler in self._built_in_handlers.items():
             if self._match_pattern(pattern, text, 'exact'):
-                logger.info(f"内置关键词匹配成功: {pattern}")
+                logger.info("内置关键词匹配成功: %s", pattern)
                 try:
                     result = await handler(message)
                     return result
@@ -73,32 +73,41 @@ class KeywordManager:
                     logger.error(f"执行内置关键词处理函数失败: {e}", exc_info=True)
                     return None
         
-        # 然后检查自定义关键词
-        keywords = await self.db.get_keywords(group_id)
-        logger.debug(f"群组 {group_id} 有 {len(keywords)} 个关键词")
+        # 然后检查自定义关键词，读取前取得失效代数，读取期间关键词被修改时不缓存旧文档
+        generation = self.db.keyword_cache.generation()
+        has_url = bool(re.search(r'https?://(?:[-\w.]|(?:%[\da-fA-F]{2}))+', text))
         
-        # 先精确匹配
-        for keyword in keywords:
-            if keyword.get('match_type', 'exact') == 'exact' and self._match_pattern(keyword['pattern'], text, 'exact'):
-                logger.info(f"精确匹配关键词成功: {keyword['pattern']}")
-                return str(keyword['_id'])
-                
-        # 再正则匹配
-        for keyword in keywords:
-            if keyword.get('match_type', 'exact') == 'regex' and self._match_pattern(keyword['pattern'], text, 'regex'):
-                logger.info(f"正则匹配关键词成功: {keyword['pattern']}")
-                return str(keyword['_id'])
+        # 流式遍历一次：精确匹配立即返回，正则和URL处理器记下第一个命中，
+        # 遍历结束后按 精确 > 正则 > URL处理器 的优先级返回
+        regex_hit = url_hit = None
+        try:
+            async for keyword in self.db.iter_keywords(group_id):
+                match_type = keyword.get('match_type', 'exact')
+                if match_type == 'exact' and self._match_pattern(keyword['pattern'], text, 'exact'):
+                    logger.info("精确匹配关键词成功: %s", keyword['pattern'])
+                    return self._matched(keyword, generation)
+                if regex_hit is None and match_type == 'regex' and self._match_pattern(keyword['pattern'], text, 'regex'):
+                    regex_hit = keyword
+                if url_hit is None and has_url and keyword.get('is_url_handler', False):
+                    url_hit = keyword
+        except Exception as e:
+            logger.error(f"匹配关键词失败: {e}", exc_info=True)
+            return None
                 
-        # 最后检查URL处理器
-        has_url = bool(re.search(r'https?://(?:[-\w.]|(?:%[\da-fA-F]{2}))+', text))
-        if has_url:
-            for keyword in keywords:
-                if keyword.get('is_url_handler', False):
-                    logger.info(f"URL处理器匹配成功: {keyword['pattern']}")
-                    return str(keyword['_id'])
+        if regex_hit is not None:
+            logger.info("正则匹配关键词成功: %s", regex_hit['pattern'])
+            return self._matched(regex_hit, generation)
+        if url_hit is not None:
+            logger.info("URL处理器匹配成功: %s", url_hit['pattern'])
+            return self._matched(url_hit, generation)
                     
         return None
         
+    def _matched(self, keyword: Dict[str, Any], generation: int) -> str:
+        """缓存匹配到的关键词文档，回复时无需再次查询，返回关键词ID"""
+        self.db.keyword_cache.put(keyword, generation)
+        return str(keyword['_id'])
+        
     def _match_pattern(self, pattern: str, text: str, match_type: str) -> bool:
         """
         匹配模式
@@ -175,7 +184,7 @@ class KeywordManager:
             
     async def get_keywords(self, group_id: int) -> List[Dict[str, Any]]:
         """
-        获取群组的所有关键词
+        获取群组的关键词，最多返回每个群组的关键词上限条
         
         参数:
             group_id: 群组ID
@@ -183,8 +192,9 @@ class KeywordManager:
         返回:
             关键词列表
         """
+        from config import KEYWORD_SETTINGS
         try:
-            return await self.db.get_keywords(group_id)
+            return await self.db.get_keywords(group_id, limit=KEYWORD_SETTINGS['max_keywords'])
         except Exception as e:
             logger.error(f"获取关键词列表失败: {e}", exc_info=True)
             return []
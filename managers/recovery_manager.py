@@ -67,3 +67,6 @@ class SimpleRecoveryManager:
             except asyncio.CancelledError:
                 pass
         logger.info("恢复管理器已关闭")
+
+# managers 包和 TelegramBot 按此名称导入
+RecoveryManager = SimpleRecoveryManager
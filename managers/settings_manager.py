@@ -3,13 +3,107 @@
 """
 import logging
 import asyncio
-from datetime import datetime, timedelta
-from typing import Dict, Any, Optional, List
+import time
+from datetime import datetime
+from typing import Dict, Any, Optional, List, Set, Tuple
 
 from telegram import Message, Update
 
+from utils.interactive_users import interactive_users
+
 logger = logging.getLogger(__name__)
 
+class SettingStateStore:
+    """
+    按用户分片的设置状态存储
+
+    状态按 用户ID -> {设置类型: 状态} 存放，查询只访问该用户的分片；
+    过期时间记录在时间轮中，清理时只处理已到期的刻度，不扫描全部状态；
+    用户的最后一个状态删除时回收该用户的分片。有状态的用户登记在交互中用户集合里。
+    所有操作都是同步的，在事件循环中不会被其他协程打断，因此不需要锁
+    """
+    def __init__(self, timeout: float = 600, tick: float = 60):
+        """
+        初始化状态存储
+
+        参数:
+            timeout: 状态无操作后的过期时间（秒）
+            tick: 时间轮刻度（秒）
+        """
+        self.timeout = timeout
+        self.tick = tick
+        self._shards: Dict[int, Dict[str, Dict[str, Any]]] = {}
+        self._wheel: Dict[int, Set[Tuple[int, str]]] = {}
+        # (用户ID, 设置类型) -> 当前过期刻度，与状态分开保存，不出现在返回给调用方的状态中
+        self._expire_slots: Dict[Tuple[int, str], int] = {}
+        self._swept_slot = self._slot(time.monotonic())
+
+    def __len__(self) -> int:
+        return sum(len(shard) for shard in self._shards.values())
+
+    def _slot(self, when: float) -> int:
+        """时间对应的时间轮刻度"""
+        return int(when // self.tick)
+
+    def _schedule(self, user_id: int, setting_type: str, state: Dict[str, Any]):
+        """刷新状态的过期时间，过期刻度变化时才写入时间轮"""
+        slot = self._slot(time.monotonic() + self.timeout) + 1
+        key = (user_id, setting_type)
+        if self._expire_slots.get(key) != slot:
+            self._expire_slots[key] = slot
+            self._wheel.setdefault(slot, set()).add(key)
+        state['timestamp'] = datetime.now()
+
+    def get(self, user_id: int, setting_type: str) -> Optional[Dict[str, Any]]:
+        """获取状态"""
+        shard = self._shards.get(user_id)
+        return shard.get(setting_type) if shard else None
+
+    def set(self, user_id: int, setting_type: str, state: Dict[str, Any]):
+        """保存状态"""
+        self._shards.setdefault(user_id, {})[setting_type] = state
+        interactive_users.add(user_id, 'settings')
+        self._schedule(user_id, setting_type, state)
+
+    def touch(self, user_id: int, setting_type: str, state: Dict[str, Any]):
+        """刷新状态的过期时间"""
+        self._schedule(user_id, setting_type, state)
+
+    def pop(self, user_id: int, setting_type: str) -> Optional[Dict[str, Any]]:
+        """删除状态，时间轮中的记录在到期时自动忽略"""
+        shard = self._shards.get(user_id)
+        if not shard:
+            return None
+        state = shard.pop(setting_type, None)
+        self._expire_slots.pop((user_id, setting_type), None)
+        if not shard:
+            del self._shards[user_id]
+            interactive_users.discard(user_id, 'settings')
+        return state
+
+    def types(self, user_id: int) -> List[str]:
+        """用户当前的设置类型"""
+        shard = self._shards.get(user_id)
+        return list(shard) if shard else []
+
+    def sweep(self) -> List[Tuple[int, str]]:
+        """
+        清理已到期刻度中的过期状态
+
+        返回:
+            被清理的 (用户ID, 设置类型)
+        """
+        current = self._slot(time.monotonic())
+        expired = []
+        for slot in range(self._swept_slot + 1, current + 1):
+            for user_id, setting_type in self._wheel.pop(slot, ()):
+                # 状态在登记后被刷新或重新创建时，过期刻度已经改变；已删除的状态没有过期刻度
+                if self._expire_slots.get((user_id, setting_type)) == slot:
+                    self.pop(user_id, setting_type)
+                    expired.append((user_id, setting_type))
+        self._swept_slot = max(self._swept_slot, current)
+        return expired
+
 class SettingsManager:
     """
     管理用户设置状态的类
@@ -22,10 +116,11 @@ class SettingsManager:
         参数:
             db: 数据库实例
         """
+        from config import SETTING_STATE_SETTINGS
         self.db = db
-        self._states = {}  # 存储用户设置状态
-        self._global_lock = asyncio.Lock()  # 全局锁
-        self._user_locks = {}  # 用户锁
+        self._store = SettingStateStore(
+            SETTING_STATE_SETTINGS['state_timeout'], SETTING_STATE_SETTINGS['wheel_tick']
+        )
         self._cleanup_task = None
         
     async def start(self, apply_defaults_if_missing=True):
@@ -35,44 +130,22 @@ class SettingsManager:
         参数:
             apply_defaults_if_missing: 是否在设置不存在时应用默认设置
         """
-        # 初始化设置状态字典
-        self._states = {}
         self._cleanup_task = asyncio.create_task(self._cleanup_loop())
         
         if apply_defaults_if_missing:
-            logger.info("应用默认设置...")
-            # 从这里开始是原有的设置默认值代码
-            from config import DEFAULT_SETTINGS
-            
-            # 获取所有群组
-            groups = await self.db.find_all_groups()
-            logger.info(f"找到 {len(groups)} 个群组准备应用默认设置")
-            
-            for group in groups:
-                group_id = group.get('group_id')
-                
-                # 获取当前设置
-                current_settings = group.get('settings', {})
-                
-                # 应用默认设置（只更新不存在的设置）
-                updated_settings = {}
-                for key, default_value in DEFAULT_SETTINGS.items():
-                    if key not in current_settings:
-                        updated_settings[key] = default_value
-                
-                # 只有在有新设置时才更新
-                if updated_settings:
-                    # 合并设置
-                    merged_settings = {**current_settings, **updated_settings}
-                    await self.db.update_group_settings(group_id, merged_settings)
-                    logger.info(f"为群组 {group_id} 应用了默认设置")
-                else:
-                    logger.info(f"群组 {group_id} 的设置已存在，跳过应用默认设置")
+            await self.apply_default_settings()
         else:
             logger.info("跳过应用默认设置")
             
         logger.info("设置管理器已启动")
         
+    async def apply_default_settings(self):
+        """为缺少设置项的群组应用默认设置（只补充不存在的设置）"""
+        logger.info("应用默认设置...")
+        from config import DEFAULT_SETTINGS
+        updated = await self.db.apply_group_settings_defaults(DEFAULT_SETTINGS)
+        logger.info(f"默认设置已应用，更新了 {updated} 个群组")
+        
     async def stop(self):
         """停止设置管理器"""
         if self._cleanup_task:
@@ -82,35 +155,14 @@ class SettingsManager:
             except asyncio.CancelledError:
                 pass
         logger.info("设置管理器已停止")
-        
-    async def _get_user_lock(self, user_id: int) -> asyncio.Lock:
-        """获取用户锁"""
-        async with self._global_lock:
-            if user_id not in self._user_locks:
-                self._user_locks[user_id] = asyncio.Lock()
-            return self._user_locks[user_id]
             
     async def _cleanup_loop(self):
-        """定期清理过期状态"""
+        """按时间轮刻度清理过期状态"""
         while True:
             try:
-                await asyncio.sleep(300)  # 每5分钟清理一次
-                
-                now = datetime.now()
-                expired_keys = []
-                
-                async with self._global_lock:
-                    # 查找过期的设置状态
-                    for key, state in self._states.items():
-                        if now - state.get('timestamp', now) > timedelta(minutes=10):
-                            expired_keys.append(key)
-                    
-                    # 删除过期的设置状态
-                    for key in expired_keys:
-                        if key in self._states:
-                            del self._states[key]
-                            logger.info(f"已清理过期的设置状态: {key}")
-                            
+                await asyncio.sleep(self._store.tick)
+                for user_id, setting_type in self._store.sweep():
+                    logger.info(f"已清理过期的设置状态: {user_id}_{setting_type}")
             except asyncio.CancelledError:
                 break
             except Exception as e:
@@ -126,23 +178,13 @@ class SettingsManager:
             setting_type: 设置类型
             group_id: 群组ID
         """
-        key = f"{user_id}_{setting_type}"
-        user_lock = await self._get_user_lock(user_id)
-        
-        async with user_lock:
-            # 如果已存在，先清理
-            await self.clear_setting_state(user_id, setting_type)
-            
-            # 初始化新状态
-            async with self._global_lock:
-                self._states[key] = {
-                    'group_id': group_id,
-                    'step': 1,
-                    'data': {},
-                    'timestamp': datetime.now()
-                }
-            
-            logger.info(f"已开始设置过程: user_id={user_id}, type={setting_type}, group_id={group_id}")
+        # 新状态直接覆盖旧状态
+        self._store.set(user_id, setting_type, {
+            'group_id': group_id,
+            'step': 1,
+            'data': {},
+        })
+        logger.info(f"已开始设置过程: user_id={user_id}, type={setting_type}, group_id={group_id}")
             
     async def get_setting_state(self, user_id: int, setting_type: str) -> Optional[Dict[str, Any]]:
         """
@@ -155,14 +197,11 @@ class SettingsManager:
         返回:
             设置状态或None
         """
-        key = f"{user_id}_{setting_type}"
-        
-        async with self._global_lock:
-            state = self._states.get(key)
-            if state:
-                # 更新时间戳
-                state['timestamp'] = datetime.now()
-            return state.copy() if state else None
+        state = self._store.get(user_id, setting_type)
+        if state is None:
+            return None
+        self._store.touch(user_id, setting_type, state)
+        return state.copy()
             
     async def update_setting_state(self, user_id: int, setting_type: str, data: Dict[str, Any], next_step: bool = False):
         """
@@ -175,25 +214,20 @@ class SettingsManager:
             next_step: 是否进入下一步
         """
         key = f"{user_id}_{setting_type}"
-        user_lock = await self._get_user_lock(user_id)
+        state = self._store.get(user_id, setting_type)
+        if state is None:
+            logger.warning(f"尝试更新不存在的设置状态: {key}")
+            return
+            
+        # 更新数据
+        state['data'].update(data)
         
-        async with user_lock:
-            async with self._global_lock:
-                if key not in self._states:
-                    logger.warning(f"尝试更新不存在的设置状态: {key}")
-                    return
-                    
-                # 更新数据
-                self._states[key]['data'].update(data)
-                
-                # 更新步骤（如果需要）
-                if next_step:
-                    self._states[key]['step'] += 1
-                    
-                # 更新时间戳
-                self._states[key]['timestamp'] = datetime.now()
-                
-            logger.info(f"已更新设置状态: {key}, step={self._states[key]['step']}")
+        # 更新步骤（如果需要）
+        if next_step:
+            state['step'] += 1
+            
+        self._store.touch(user_id, setting_type, state)
+        logger.info(f"已更新设置状态: {key}, step={state['step']}")
             
     async def clear_setting_state(self, user_id: int, setting_type: str):
         """
@@ -203,12 +237,8 @@ class SettingsManager:
             user_id: 用户ID
             setting_type: 设置类型
         """
-        key = f"{user_id}_{setting_type}"
-        
-        async with self._global_lock:
-            if key in self._states:
-                del self._states[key]
-                logger.info(f"已清除设置状态: {key}")
+        if self._store.pop(user_id, setting_type) is not None:
+            logger.info(f"已清除设置状态: {user_id}_{setting_type}")
                 
     async def get_active_settings(self, user_id: int) -> List[str]:
         """
@@ -220,15 +250,7 @@ class SettingsManager:
         返回:
             设置类型列表
         """
-        user_id_str = str(user_id) + "_"
-        
-        async with self._global_lock:
-            active_settings = []
-            for key in self._states:
-                if key.startswith(str(user_id) + "_"):
-                    setting_type = key[len(str(user_id)) + 1:]
-                    active_settings.append(setting_type)
-            return active_settings
+        return self._store.types(user_id)
             
     async def process_setting(self, user_id: int, setting_type: str, message: Message, processor):
         """
@@ -2,13 +2,20 @@
 统计管理器，处理消息统计
 """
 import logging
+import asyncio
 from datetime import datetime, timedelta
 from typing import Dict, Any, Optional, List, Tuple
 
 from telegram import Message
 
+from utils.dedupe_utils import ChatIdDeduper
+from utils.metrics import record_cache
+
 logger = logging.getLogger(__name__)
 
+# 计入统计的媒体类型，按识别优先级排列
+STAT_MEDIA_TYPES = ('photo', 'video', 'animation', 'document', 'audio', 'voice', 'video_note', 'sticker')
+
 class StatsManager:
     """
     统计管理器，处理消息统计相关功能
@@ -21,61 +28,202 @@ class StatsManager:
             db: 数据库实例
         """
         self.db = db
+        self._summary_task = None
+        # 最近一次摘要重建的窗口，用于判断摘要是否可直接使用
+        self._summary_window_end = None
+        self._summary_window_days = None
+        # 摘要截止点，之后写入的统计记录查询时实时补齐
+        self._summary_cutoff = None
+        # 最近消息ID窗口，重复投递的消息在访问数据库前即被丢弃
+        from config import STATS_DEDUPE_SETTINGS
+        self._deduper = ChatIdDeduper(
+            window_size=STATS_DEDUPE_SETTINGS.get('window_size', 1024),
+            max_chats=STATS_DEDUPE_SETTINGS.get('max_chats', 10000)
+        )
         
-    async def add_message_stat(self, group_id: int, user_id: int, message: Message):
-        try:
-            # 获取消息元数据
-            date = datetime.now().strftime('%Y-%m-%d')
-            message_size = len(message.text or '') if message.text else 0
-            media_type = None
-            
-            logger.info(f"开始处理消息统计 - 群组: {group_id}, 用户: {user_id}, 初始消息大小: {message_size}")
+    async def start(self):
+        """启动统计管理器，开始定期重建统计摘要"""
+        if self._summary_task is None or self._summary_task.done():
+            self._summary_task = asyncio.create_task(self._summary_loop())
+        logger.info("统计管理器已启动")
+        
+    async def stop(self):
+        """停止统计管理器"""
+        if self._summary_task:
+            self._summary_task.cancel()
+            try:
+                await self._summary_task
+            except asyncio.CancelledError:
+                pass
+        logger.info("统计管理器已停止")
+        
+    async def _summary_loop(self):
+        """定期重建统计摘要"""
+        from config import STATS_SUMMARY_SETTINGS
+        interval = STATS_SUMMARY_SETTINGS.get('refresh_interval', 3600)
+        
+        while True:
+            try:
+                await self.refresh_summaries()
+                await asyncio.sleep(interval)
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logger.error(f"重建统计摘要失败: {e}", exc_info=True)
+                await asyncio.sleep(300)  # 出错后5分钟重试
+                
+    async def refresh_summaries(self):
+        """立即重建统计摘要"""
+        from config import STATS_SUMMARY_SETTINGS
+        window_days = STATS_SUMMARY_SETTINGS.get('window_days', 30)
+        self._summary_window_end, self._summary_cutoff = await self.db.rebuild_stats_summaries(window_days)
+        self._summary_window_days = window_days
+        
+    def _summary_available(self, days: int) -> bool:
+        """检查摘要是否覆盖今天且窗口与请求一致"""
+        available = (
+            self._summary_window_end == datetime.now().strftime('%Y-%m-%d')
+            and self._summary_window_days == days
+        )
+        record_cache('stats_summary', available)
+        return available
+        
+    async def _summary_delta(self, match: Dict[str, Any], group_by: Any) -> List[Dict[str, Any]]:
+        """
+        聚合摘要截止点之后写入的统计记录
+        
+        摘要可用时窗口结束日即今天，新记录只写入今天的分区，因此只扫描今天的分区
+        
+        参数:
+            match: 群组/用户过滤条件
+            group_by: 分组键
             
-            # 检查是否是媒体消息
-            if message.photo:
-                media_type = 'photo'
-                if message.photo:
-                    message_size += message.photo[-1].file_size
-                    logger.info(f"处理照片消息，文件大小: {message.photo[-1].file_size}")
-            elif message.video:
-                media_type = 'video'
-                message_size += message.video.file_size
-                logger.info(f"处理视频消息，文件大小: {message.video.file_size}")
-            elif message.document:
-                media_type = 'document'
-                message_size += message.document.file_size
-                logger.info(f"处理文档消息，文件大小: {message.document.file_size}")
-            # ... 其他媒体类型检查 ...
+        返回:
+            按分组键汇总的消息数和字节数
+        """
+        today = self._summary_window_end
+        match = {**match, 'date': today, '_id': {'$gte': self._summary_cutoff}}
+        return await self.db.aggregate_stats(match, today, today, [
+            {
+                '$group': {
+                    '_id': group_by,
+                    'total_messages': {'$sum': '$total_messages'},
+                    'total_size': {'$sum': '$total_size'}
+                }
+            }
+        ])
+        
+    @staticmethod
+    def _add_delta(stat: Dict[str, Any], delta: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """把截止点之后的记录累加到摘要上，有新记录时今天（位图第0位）计为活跃"""
+        if not delta:
+            return stat
+        return {
+            **stat,
+            'total_messages': stat.get('total_messages', 0) + sum(row['total_messages'] for row in delta),
+            'total_size': stat.get('total_size', 0) + sum(row['total_size'] for row in delta),
+            'active_days': stat.get('active_days', 0) | 1
+        }
+    
+    def is_duplicate_message(self, group_id: int, message_id: int) -> bool:
+        """
+        检查消息是否已处理过，并记录到最近消息ID窗口
+        
+        参数:
+            group_id: 群组ID
+            message_id: 消息ID
             
-            logger.info(f"消息处理结果 - 类型: {media_type or '文本'}, 最终大小: {message_size} 字节")
+        返回:
+            是否重复
+        """
+        return self._deduper.is_duplicate(group_id, message_id)
+        
+    @staticmethod
+    def classify_message(message: Message) -> Tuple[str, int, int]:
+        """
+        识别消息类型并计算大小
+        
+        参数:
+            message: 消息对象
             
-            # 获取群组设置，检查是否需要忽略某些消息
-            group_settings = await self.db.get_group_settings(group_id)
-            min_bytes = group_settings.get('min_bytes', 0)
-            count_media = group_settings.get('count_media', True)
+        返回:
+            (消息类型, 文本UTF-8字节数, 总字节数)
+        """
+        text_bytes = len((message.text or message.caption or '').encode('utf-8'))
+        for media_type in STAT_MEDIA_TYPES:
+            media = getattr(message, media_type, None)
+            if media:
+                # 照片是多尺寸数组，取最大尺寸
+                if media_type == 'photo':
+                    media = media[-1]
+                return media_type, text_bytes, text_bytes + (getattr(media, 'file_size', None) or 0)
+        return 'text', text_bytes, text_bytes
+        
+    @staticmethod
+    def should_count(message_type: str, text_bytes: int, settings: Dict[str, Any]) -> bool:
+        """
+        根据群组设置判断消息是否计入统计
+        
+        文本消息按UTF-8字节数与 min_bytes 比较，媒体消息由 count_media 决定
+        
+        参数:
+            message_type: 消息类型
+            text_bytes: 文本UTF-8字节数
+            settings: 群组设置
             
-            logger.info(f"群组设置 - 最小字节: {min_bytes}, 统计媒体: {count_media}")
+        返回:
+            是否计入统计
+        """
+        if message_type == 'text':
+            return text_bytes >= settings.get('min_bytes', 0)
+        return settings.get('count_media', True)
+        
+    async def add_message_stat(self, group_id: int, user_id: int, message: Message):
+        """
+        记录一条消息统计，所有统计写入的唯一入口
+        
+        参数:
+            group_id: 群组ID
+            user_id: 用户ID
+            message: 消息对象
+        """
+        recorded = True
+        try:
+            # 机器人消息不计入统计
+            if message.from_user and message.from_user.is_bot:
+                return
+                
+            # 重复投递的消息直接丢弃
+            if self.is_duplicate_message(group_id, message.message_id):
+                logger.debug("跳过重复消息统计: group_id=%s, message_id=%s", group_id, message.message_id)
+                return
+                
+            # 写入统计文档前失败时释放消息ID，重新投递的消息仍可计入
+            recorded = False
+            message_type, text_bytes, total_size = self.classify_message(message)
             
-            # 判断是否满足统计条件
-            if (message_size < min_bytes) or (media_type and not count_media):
-                logger.warning(f"消息不满足统计条件: size={message_size}, min_bytes={min_bytes}, media_type={media_type}, count_media={count_media}")
+            # 获取群组设置，检查是否需要忽略该消息
+            group_settings = await self.db.get_group_settings(group_id)
+            if not self.should_count(message_type, text_bytes, group_settings):
+                logger.debug("消息不满足统计条件: group_id=%s, type=%s, bytes=%s", group_id, message_type, text_bytes)
                 return
             
-            # 准备统计数据
+            # 统一的统计文档结构
             stat_data = {
                 'group_id': group_id,
                 'user_id': user_id,
-                'date': date,
+                'message_id': message.message_id,
+                'date': datetime.now().strftime('%Y-%m-%d'),
+                'message_type': message_type,
                 'total_messages': 1,
-                'total_size': message_size,
-                'media_type': media_type
+                'total_size': total_size
             }
             
-            logger.info(f"即将添加统计数据: {stat_data}")
-            
-            # 添加到数据库
-            await self.db.add_message_stat(stat_data)
-            logger.info(f"成功添加消息统计: group_id={group_id}, user_id={user_id}, size={message_size}")
+            # 添加到数据库，唯一索引拦截到重复时不再累加用户消息数
+            inserted = await self.db.add_message_stat(stat_data)
+            recorded = True
+            if not inserted:
+                return
             
             # 更新用户总消息数
             await self.db.db.users.update_one(
@@ -83,10 +231,12 @@ class StatsManager:
                 {'$inc': {'total_messages': 1}},
                 upsert=True
             )
-            logger.info(f"已更新用户 {user_id} 的总消息数")
+            logger.debug("已记录消息统计: group_id=%s, user_id=%s, type=%s, size=%s", group_id, user_id, message_type, total_size)
             
         except Exception as e:
             logger.error(f"添加消息统计失败: {e}", exc_info=True)
+            if not recorded:
+                self._deduper.release(group_id, message.message_id)
                    
     async def get_daily_stats(self, group_id: int, page: int = 1) -> Tuple[List[Dict[str, Any]], int]:
         """
@@ -107,11 +257,10 @@ class StatsManager:
             # 获取当天日期
             today = datetime.now().strftime('%Y-%m-%d')
             
-            # 获取统计数据
-            stats = await self.db.get_daily_stats(group_id, today)
-            
             # 计算总页数
-            total_users = len(stats)
+            total_users = await self.db.count_stats_users(
+                {'group_id': group_id, 'date': today}, today, today
+            )
             total_pages = max(1, (total_users + limit - 1) // limit)
             
             # 调整页码
@@ -120,10 +269,10 @@ class StatsManager:
             if page > total_pages:
                 page = total_pages
                 
-            # 分页处理
-            start_idx = (page - 1) * limit
-            end_idx = min(start_idx + limit, total_users)
-            page_stats = stats[start_idx:end_idx]
+            # 分页在服务器端完成，只取回当前页
+            page_stats = await self.db.get_daily_stats(
+                group_id, today, skip=(page - 1) * limit, limit=limit
+            )
             
             return page_stats, total_pages
             
@@ -152,11 +301,11 @@ class StatsManager:
             thirty_days_ago = (today - timedelta(days=30)).strftime('%Y-%m-%d')
             today_str = today.strftime('%Y-%m-%d')
             
-            # 获取统计数据
-            stats = await self.db.get_monthly_stats(group_id, thirty_days_ago, today_str)
-            
             # 计算总页数
-            total_users = len(stats)
+            total_users = await self.db.count_stats_users(
+                {'group_id': group_id, 'date': {'$gte': thirty_days_ago, '$lte': today_str}},
+                thirty_days_ago, today_str
+            )
             total_pages = max(1, (total_users + limit - 1) // limit)
             
             # 调整页码
@@ -165,10 +314,10 @@ class StatsManager:
             if page > total_pages:
                 page = total_pages
                 
-            # 分页处理
-            start_idx = (page - 1) * limit
-            end_idx = min(start_idx + limit, total_users)
-            page_stats = stats[start_idx:end_idx]
+            # 分页在服务器端完成，只取回当前页
+            page_stats = await self.db.get_monthly_stats(
+                group_id, thirty_days_ago, today_str, skip=(page - 1) * limit, limit=limit
+            )
             
             return page_stats, total_pages
             
@@ -179,6 +328,8 @@ class StatsManager:
     async def get_user_stats(self, group_id: int, user_id: int, days: int = 30) -> Dict[str, Any]:
         """
         获取用户统计数据
+        
+        摘要可用时读取摘要文档并补齐截止点之后的记录，否则回退到实时聚合
     
         参数:
             group_id: 群组ID
@@ -189,45 +340,46 @@ class StatsManager:
             用户统计数据
         """
         try:
-            # 计算日期范围
-            today = datetime.now()
-            start_date = (today - timedelta(days=days)).strftime('%Y-%m-%d')
-            end_date = today.strftime('%Y-%m-%d')
-            
-            # 构建聚合管道
-            pipeline = [
-                {
-                    '$match': {
-                        'group_id': group_id,
-                        'user_id': user_id,
-                        'date': {'$gte': start_date, '$lte': end_date}
-                    }
-                },
-                {
-                    '$group': {
-                        '_id': None,
-                        'total_messages': {'$sum': '$total_messages'},
-                        'total_size': {'$sum': '$total_size'},
-                        'days_active': {'$addToSet': '$date'}
-                    }
-                }
-            ]
-            
-            # 执行聚合查询
-            result = await self.db.db.message_stats.aggregate(pipeline).to_list(None)
-            
-            if not result:
-                return {
+            if self._summary_available(days):
+                stat = await self.db.get_user_stat_summary(group_id, user_id) or {}
+                delta = await self._summary_delta({'group_id': group_id, 'user_id': user_id}, None)
+                stat = self._add_delta(stat, delta)
+                days_active = bin(stat.get('active_days', 0)).count('1')
+            else:
+                # 计算日期范围
+                today = datetime.now()
+                start_date = (today - timedelta(days=days)).strftime('%Y-%m-%d')
+                end_date = today.strftime('%Y-%m-%d')
+                
+                # 先按日期汇总，再计数活跃天数，避免在服务器端构建日期数组
+                match = {
+                    'group_id': group_id,
                     'user_id': user_id,
-                    'total_messages': 0,
-                    'total_size': 0,
-                    'days_active': 0,
-                    'avg_messages_per_day': 0
+                    'date': {'$gte': start_date, '$lte': end_date}
                 }
+                pipeline = [
+                    {
+                        '$group': {
+                            '_id': '$date',
+                            'total_messages': {'$sum': '$total_messages'},
+                            'total_size': {'$sum': '$total_size'}
+                        }
+                    },
+                    {
+                        '$group': {
+                            '_id': None,
+                            'total_messages': {'$sum': '$total_messages'},
+                            'total_size': {'$sum': '$total_size'},
+                            'days_active': {'$sum': 1}
+                        }
+                    }
+                ]
+                
+                # 执行聚合查询（仅涉及日期范围内的分区）
+                result = await self.db.aggregate_stats(match, start_date, end_date, pipeline)
+                stat = result[0] if result else {}
+                days_active = stat.get('days_active', 0)
                 
-            # 处理结果
-            stat = result[0]
-            days_active = len(stat.get('days_active', []))
             total_messages = stat.get('total_messages', 0)
             
             return {
@@ -252,6 +404,8 @@ class StatsManager:
         """
         获取群组统计数据
         
+        摘要可用时读取摘要文档并补齐截止点之后的记录，否则回退到实时聚合
+        
         参数:
             group_id: 群组ID
             days: 天数
@@ -260,48 +414,55 @@ class StatsManager:
             群组统计数据
         """
         try:
-            # 计算日期范围
-            today = datetime.now()
-            start_date = (today - timedelta(days=days)).strftime('%Y-%m-%d')
-            end_date = today.strftime('%Y-%m-%d')
-            
-            # 构建聚合管道
-            pipeline = [
-                {
-                    '$match': {
-                        'group_id': group_id,
-                        'date': {'$gte': start_date, '$lte': end_date}
-                    }
-                },
-                {
-                    '$group': {
-                        '_id': None,
-                        'total_messages': {'$sum': '$total_messages'},
-                        'total_size': {'$sum': '$total_size'},
-                        'unique_users': {'$addToSet': '$user_id'},
-                        'days_active': {'$addToSet': '$date'}
-                    }
-                }
-            ]
-            
-            # 执行聚合查询
-            result = await self.db.db.message_stats.aggregate(pipeline).to_list(None)
-            
-            if not result:
-                return {
+            if self._summary_available(days):
+                stat = await self.db.get_group_stat_summary(group_id) or {}
+                delta = await self._summary_delta({'group_id': group_id}, '$user_id')
+                # 截止点之后才出现的用户没有用户摘要，计入去重用户数
+                user_ids = [row['_id'] for row in delta]
+                new_users = len(user_ids) - await self.db.count_user_stat_summaries(group_id, user_ids)
+                stat = self._add_delta(stat, delta)
+                days_active = bin(stat.get('active_days', 0)).count('1')
+                unique_users = stat.get('unique_users', 0) + new_users
+            else:
+                # 计算日期范围
+                today = datetime.now()
+                start_date = (today - timedelta(days=days)).strftime('%Y-%m-%d')
+                end_date = today.strftime('%Y-%m-%d')
+                
+                # 先按(日期, 用户)汇总，再分别计数，避免在服务器端构建用户和日期数组
+                match = {
                     'group_id': group_id,
-                    'total_messages': 0,
-                    'total_size': 0,
-                    'unique_users': 0,
-                    'days_active': 0,
-                    'avg_messages_per_day': 0
+                    'date': {'$gte': start_date, '$lte': end_date}
                 }
+                pipeline = [
+                    {
+                        '$group': {
+                            '_id': {'date': '$date', 'user_id': '$user_id'},
+                            'total_messages': {'$sum': '$total_messages'},
+                            'total_size': {'$sum': '$total_size'}
+                        }
+                    },
+                    {
+                        '$facet': {
+                            'totals': [{'$group': {
+                                '_id': None,
+                                'total_messages': {'$sum': '$total_messages'},
+                                'total_size': {'$sum': '$total_size'}
+                            }}],
+                            'days': [{'$group': {'_id': '$_id.date'}}, {'$count': 'count'}],
+                            'users': [{'$group': {'_id': '$_id.user_id'}}, {'$count': 'count'}]
+                        }
+                    }
+                ]
+                
+                # 执行聚合查询（仅涉及日期范围内的分区）
+                result = await self.db.aggregate_stats(match, start_date, end_date, pipeline)
+                facet = result[0] if result else {}
+                stat = (facet.get('totals') or [{}])[0]
+                days_active = (facet.get('days') or [{}])[0].get('count', 0)
+                unique_users = (facet.get('users') or [{}])[0].get('count', 0)
                 
-            # 处理结果
-            stat = result[0]
-            days_active = len(stat.get('days_active', []))
             total_messages = stat.get('total_messages', 0)
-            unique_users = len(stat.get('unique_users', []))
             
             return {
                 'group_id': group_id,
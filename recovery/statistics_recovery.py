@@ -4,7 +4,7 @@
 import logging
 import asyncio
 from datetime import datetime, timedelta
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, AsyncIterator, Tuple
 
 logger = logging.getLogger(__name__)
 
@@ -125,10 +125,9 @@ class StatisticsRecoverySystem:
             # 只恢复启用了统计功能的群组
             from db.models import GroupPermission
             
-            all_groups = await self.db.find_all_groups()
             groups_to_recover = []
             
-            for group in all_groups:
+            async for group in self.db.iter_all_groups(projection={'group_id': 1}):
                 group_id = group['group_id']
                 # 检查群组是否启用统计功能
                 if await self.bot.has_permission(group_id, GroupPermission.STATS):
@@ -200,9 +199,6 @@ class StatisticsRecoverySystem:
             days = (end_time - start_time).days + 1
             estimated_total = avg_messages * days
             
-            # 获取用户统计比例
-            user_ratios = await self.get_user_message_ratios(group_id)
-            
             # 估算每个用户的消息数
             recovered_count = 0
             
@@ -215,8 +211,8 @@ class StatisticsRecoverySystem:
                 date_range.append(current_date.strftime("%Y-%m-%d"))
                 current_date += timedelta(days=1)
                 
-            # 为每个活跃用户在每个日期添加估算的消息数
-            for user_id, ratio in user_ratios.items():
+            # 为每个活跃用户在每个日期添加估算的消息数，用户比例按流式读取
+            async for user_id, ratio in self.iter_user_message_ratios(group_id):
                 # 估算该用户在该时间段的消息数
                 estimated_user_messages = int(estimated_total * ratio)
                 
@@ -235,19 +231,20 @@ class StatisticsRecoverySystem:
                         'date': date_str,
                         'total_messages': daily_messages,
                         'total_size': daily_messages * 50,  # 假设平均每条消息50字节
-                        'media_type': None,
+                        'message_type': 'text',
                         'recovered': True  # 标记为恢复的数据
                     }
                     
                     # 避免重复添加
-                    existing = await self.db.db.message_stats.find_one({
+                    collection = await self.db.get_stats_collection(date_str)
+                    existing = await collection.find_one({
                         'group_id': group_id,
                         'user_id': user_id,
                         'date': date_str
                     })
                     
                     if not existing:
-                        await self.db.db.message_stats.insert_one(stat_data)
+                        await collection.insert_one(stat_data)
                         recovered_count += daily_messages
                         
             logger.info(f"群组 {group_id} 恢复完成，估算添加了 {recovered_count} 条消息记录")
@@ -272,16 +269,13 @@ class StatisticsRecoverySystem:
             end_date = datetime.now().date()
             start_date = end_date - timedelta(days=10)
             
+            start_str = start_date.strftime("%Y-%m-%d")
+            end_str = end_date.strftime("%Y-%m-%d")
+            match = {
+                'group_id': group_id,
+                'date': {'$gte': start_str, '$lte': end_str}
+            }
             pipeline = [
-                {
-                    '$match': {
-                        'group_id': group_id,
-                        'date': {
-                            '$gte': start_date.strftime("%Y-%m-%d"),
-                            '$lte': end_date.strftime("%Y-%m-%d")
-                        }
-                    }
-                },
                 {
                     '$group': {
                         '_id': '$date',
@@ -291,7 +285,7 @@ class StatisticsRecoverySystem:
             ]
             
             # 执行聚合查询
-            daily_stats = await self.db.db.message_stats.aggregate(pipeline).to_list(None)
+            daily_stats = await self.db.aggregate_stats(match, start_str, end_str, pipeline)
             
             if not daily_stats:
                 return 0
@@ -304,54 +298,45 @@ class StatisticsRecoverySystem:
             logger.error(f"计算日均消息数失败: {e}", exc_info=True)
             return 0
     
-    async def get_user_message_ratios(self, group_id: int) -> Dict[int, float]:
+    async def iter_user_message_ratios(self, group_id: int) -> AsyncIterator[Tuple[int, float]]:
         """
-        获取群组中各用户的消息比例
-        
+        逐个产出群组中各用户的消息比例
+
+        先聚合出总消息数，再流式读取每个用户的消息数，内存占用与用户数无关
+
         参数:
             group_id: 群组ID
-            
+
         返回:
-            用户ID到消息比例的映射
+            (用户ID, 消息比例) 的异步迭代器
         """
-        try:
-            # 获取最近30天的用户消息统计
-            end_date = datetime.now().date()
-            start_date = end_date - timedelta(days=30)
-            
-            pipeline = [
-                {
-                    '$match': {
-                        'group_id': group_id,
-                        'date': {
-                            '$gte': start_date.strftime("%Y-%m-%d"),
-                            '$lte': end_date.strftime("%Y-%m-%d")
-                        }
-                    }
-                },
-                {
-                    '$group': {
-                        '_id': '$user_id',
-                        'total': {'$sum': '$total_messages'}
-                    }
+        # 获取最近30天的用户消息统计
+        end_date = datetime.now().date()
+        start_date = end_date - timedelta(days=30)
+        
+        start_str = start_date.strftime("%Y-%m-%d")
+        end_str = end_date.strftime("%Y-%m-%d")
+        match = {
+            'group_id': group_id,
+            'date': {'$gte': start_str, '$lte': end_str}
+        }
+        
+        # 计算总消息数
+        totals = await self.db.aggregate_stats(match, start_str, end_str, [
+            {'$group': {'_id': None, 'total': {'$sum': '$total_messages'}}}
+        ])
+        total_messages = totals[0]['total'] if totals else 0
+        if total_messages <= 0:
+            return
+        
+        # 流式读取每个用户的消息数
+        pipeline = [
+            {
+                '$group': {
+                    '_id': '$user_id',
+                    'total': {'$sum': '$total_messages'}
                 }
-            ]
-            
-            # 执行聚合查询
-            user_stats = await self.db.db.message_stats.aggregate(pipeline).to_list(None)
-            
-            if not user_stats:
-                return {}
-                
-            # 计算总消息数
-            total_messages = sum(stat['total'] for stat in user_stats)
-            
-            if total_messages <= 0:
-                return {}
-                
-            # 计算每个用户的消息比例
-            return {stat['_id']: stat['total'] / total_messages for stat in user_stats}
-            
-        except Exception as e:
-            logger.error(f"获取用户消息比例失败: {e}", exc_info=True)
-            return {}
+            }
+        ]
+        async for stat in self.db.iter_stats(match, start_str, end_str, pipeline):
+            yield stat['_id'], stat['total'] / total_messages
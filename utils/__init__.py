@@ -22,7 +22,13 @@ from utils.time_utils import (
     get_date_string
 )
 from utils.keyboard_utils import KeyboardBuilder, CallbackDataBuilder
+from utils.callback_codec import CallbackCodec, callback_codec, encode_callback
 from utils.command_helper import CommandHelper
+from utils.dedupe_utils import MonotonicIdWindow, ChatIdDeduper
+from utils.metrics import MetricsRegistry, metrics, record_cache, timed_handler
+from utils.logging_utils import setup_logging, shutdown_logging
+from utils.profiler import SamplingProfiler, profile_event_loop, task_counts
+from utils.interactive_users import InteractiveUsers, interactive_users, begin_input, end_input
 
 __all__ = [
     # 装饰器
@@ -47,7 +53,23 @@ __all__ = [
     
     # 键盘工具
     'KeyboardBuilder', 'CallbackDataBuilder',
+    'CallbackCodec', 'callback_codec', 'encode_callback',
     
     # 命令帮助
-    'CommandHelper'
+    'CommandHelper',
+    
+    # 去重工具
+    'MonotonicIdWindow', 'ChatIdDeduper',
+    
+    # 运行指标
+    'MetricsRegistry', 'metrics', 'record_cache', 'timed_handler',
+    
+    # 日志配置
+    'setup_logging', 'shutdown_logging',
+    
+    # 采样分析
+    'SamplingProfiler', 'profile_event_loop', 'task_counts',
+    
+    # 交互中用户
+    'InteractiveUsers', 'interactive_users', 'begin_input', 'end_input'
 ]
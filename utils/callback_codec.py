@@ -0,0 +1,199 @@
+"""
+紧凑的回调数据编码
+
+Telegram 限制 callback_data 最长64字节，"broadcast_detail_{ObjectId}_{群组ID}" 这类数据
+已接近上限。编码后的格式:
+    ~{操作码}{参数}  操作码为2个字符，参数按类型打包后用URL安全的base64编码
+                      （ObjectId 12字节，整数为zigzag变长编码）
+    #{令牌}          参数无法打包时，原始回调数据保存在服务端并设置有效期，按钮只携带令牌
+解码后还原为原始格式的回调数据，处理函数无需修改
+"""
+import base64
+import secrets
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from bson import ObjectId
+from bson.errors import InvalidId
+
+COMPACT_MARKER = '~'
+TOKEN_MARKER = '#'
+
+# 回调前缀 -> (操作码, 参数类型)，'o' 为 ObjectId，'i' 为整数
+CALLBACK_OPCODES = {
+    'keyword_detail_': ('kd', 'oi'),
+    'keyword_preview_': ('kp', 'oi'),
+    'keyword_delete_': ('kx', 'oi'),
+    'keyword_confirm_delete_': ('kc', 'oi'),
+    'broadcast_detail_': ('bd', 'oi'),
+    'bc_preview_': ('bp', 'oi'),
+    'bc_edit_': ('be', 'oi'),
+    'bc_save_edit_': ('bs', 'oi'),
+    'bc_force_send_': ('bf', 'oi'),
+    'bc_recalibrate_': ('br', 'oi'),
+    'bc_delete_': ('bx', 'oi'),
+    'bc_confirm_delete_': ('bc', 'oi'),
+}
+
+def _pack_int(value: int, out: bytearray):
+    """zigzag变长编码整数"""
+    value = value * 2 if value >= 0 else -value * 2 - 1
+    while value > 0x7f:
+        out.append((value & 0x7f) | 0x80)
+        value >>= 7
+    out.append(value)
+
+def _unpack_int(data: bytes, pos: int) -> Tuple[int, int]:
+    """解码zigzag变长整数，返回 (值, 下一个位置)"""
+    value = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7f) << shift
+        if not byte & 0x80:
+            break
+        shift += 7
+    return (value >> 1) if not value & 1 else -((value + 1) >> 1), pos
+
+class CallbackCodec:
+    """
+    回调数据编解码器
+
+    可打包的参数直接编码进回调数据，否则使用带有效期的服务端令牌
+    """
+    def __init__(self, opcodes: Dict[str, Tuple[str, str]], max_age: float = 3600, max_tokens: int = 10000):
+        """
+        初始化编解码器
+
+        参数:
+            opcodes: {回调前缀: (2字符操作码, 参数类型)}
+            max_age: 令牌有效期（秒）
+            max_tokens: 最多保存的令牌数，超出时淘汰最早的令牌
+        """
+        self.opcodes = opcodes
+        self.prefixes = {opcode: (prefix, types) for prefix, (opcode, types) in opcodes.items()}
+        self.max_age = max_age
+        self.max_tokens = max_tokens
+        self._tokens: 'OrderedDict[str, Tuple[float, str]]' = OrderedDict()
+
+    def configure(self, max_age: float = None, max_tokens: int = None):
+        """
+        更新令牌设置
+
+        参数:
+            max_age: 令牌有效期（秒）
+            max_tokens: 最多保存的令牌数
+        """
+        if max_age is not None:
+            self.max_age = max_age
+        if max_tokens is not None:
+            self.max_tokens = max_tokens
+
+    def encode(self, prefix: str, *args: Any) -> str:
+        """
+        编码回调数据
+
+        参数:
+            prefix: 回调前缀，如 'keyword_detail_'
+            *args: 参数
+
+        返回:
+            编码后的回调数据
+        """
+        spec = self.opcodes.get(prefix)
+        if spec and len(args) == len(spec[1]):
+            opcode, types = spec
+            packed = bytearray()
+            try:
+                for field_type, arg in zip(types, args):
+                    if field_type == 'o':
+                        packed += ObjectId(arg).binary
+                    else:
+                        _pack_int(int(arg), packed)
+                return COMPACT_MARKER + opcode + base64.urlsafe_b64encode(bytes(packed)).decode().rstrip('=')
+            except (InvalidId, TypeError, ValueError):
+                pass
+        return self.store(prefix + '_'.join(str(arg) for arg in args))
+
+    def store(self, data: str) -> str:
+        """
+        把回调数据保存在服务端，返回携带令牌的回调数据
+
+        参数:
+            data: 原始回调数据
+
+        返回:
+            "#令牌"
+        """
+        token = secrets.token_urlsafe(6)
+        self._tokens[token] = (time.monotonic() + self.max_age, data)
+        while len(self._tokens) > self.max_tokens:
+            self._tokens.popitem(last=False)
+        return TOKEN_MARKER + token
+
+    def decode(self, data: str) -> Optional[Tuple[str, Tuple[Any, ...]]]:
+        """
+        解码回调数据
+
+        参数:
+            data: 编码后的回调数据
+
+        返回:
+            (原始格式的回调数据, 类型化的参数)；令牌过期或数据无效时返回None
+        """
+        if data.startswith(TOKEN_MARKER):
+            entry = self._tokens.get(data[1:])
+            if entry is None or entry[0] < time.monotonic():
+                self._tokens.pop(data[1:], None)
+                return None
+            return entry[1], ()
+
+        spec = self.prefixes.get(data[1:3])
+        if not data.startswith(COMPACT_MARKER) or spec is None:
+            return None
+        prefix, types = spec
+        try:
+            payload = data[3:]
+            raw = base64.urlsafe_b64decode(payload + '=' * (-len(payload) % 4))
+            args = []
+            pos = 0
+            for field_type in types:
+                if field_type == 'o':
+                    args.append(ObjectId(raw[pos:pos + 12]))
+                    pos += 12
+                else:
+                    value, pos = _unpack_int(raw, pos)
+                    args.append(value)
+            if pos != len(raw):
+                return None
+        except (ValueError, TypeError, IndexError, InvalidId):
+            return None
+        return prefix + '_'.join(str(arg) for arg in args), tuple(args)
+
+    def prefix_of(self, data: str) -> Optional[str]:
+        """
+        紧凑编码的回调数据对应的回调前缀
+
+        参数:
+            data: 编码后的回调数据
+
+        返回:
+            回调前缀，令牌或无法识别的数据返回None
+        """
+        if not data.startswith(COMPACT_MARKER):
+            return None
+        spec = self.prefixes.get(data[1:3])
+        return spec[0] if spec else None
+
+    @staticmethod
+    def is_encoded(data: str) -> bool:
+        """是否为编码后的回调数据"""
+        return data[:1] in (COMPACT_MARKER, TOKEN_MARKER)
+
+# 有效期在启动时由 TelegramBot 按 CALLBACK_SETTINGS 配置
+callback_codec = CallbackCodec(CALLBACK_OPCODES)
+
+def encode_callback(prefix: str, *args: Any) -> str:
+    """使用全局编解码器编码回调数据"""
+    return callback_codec.encode(prefix, *args)
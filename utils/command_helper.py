@@ -18,9 +18,9 @@ class CommandHelper:
             'admin_only': False
         },
         'settings': {
-            'usage': '/settings',
+            'usage': '/settings [群组搜索]',
             'description': '打开设置菜单',
-            'example': None,
+            'example': '/settings 测试群',
             'admin_only': True
         },
         'tongji': {
@@ -48,15 +48,15 @@ class CommandHelper:
             'admin_only': True
         },
         'easykeyword': {
-            'usage': '/easykeyword',
+            'usage': '/easykeyword [群组搜索]',
             'description': '添加关键词回复',
-            'example': None,
+            'example': '/easykeyword 测试群',
             'admin_only': True
         },
         'easybroadcast': {
-            'usage': '/easybroadcast',
+            'usage': '/easybroadcast [群组搜索]',
             'description': '添加轮播消息',
-            'example': None,
+            'example': '/easybroadcast 测试群',
             'admin_only': True
         },
         'addsuperadmin': {
@@ -101,6 +101,18 @@ class CommandHelper:
             'example': None,
             'admin_only': True
         },
+        'dbstats': {
+            'usage': '/dbstats [on|off|reset]',
+            'description': '查看数据库操作耗时统计',
+            'example': '/dbstats',
+            'admin_only': True
+        },
+        'profile': {
+            'usage': '/profile [秒数]',
+            'description': '采样分析事件循环耗时并统计异步任务',
+            'example': '/profile 15',
+            'admin_only': True
+        },
         'cancel': {
             'usage': '/cancel',
             'description': '取消当前操作',
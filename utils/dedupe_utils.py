@@ -0,0 +1,125 @@
+"""
+去重工具，基于单调递增ID的滑动窗口判断重复
+"""
+import logging
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+class MonotonicIdWindow:
+    """
+    单调递增ID的滑动窗口
+
+    记录最近见过的最大ID，以及其之前 size 个ID是否出现过（使用整数位图），
+    适用于Telegram中按聊天单调递增的 message_id 和全局单调递增的 update_id
+    """
+    def __init__(self, size: int = 1024):
+        """
+        初始化滑动窗口
+
+        参数:
+            size: 窗口大小，即最大ID之前可追踪的ID数量
+        """
+        self.size = size
+        self._mask = (1 << size) - 1
+        self._high = None
+        self._bits = 0
+
+    def check_and_add(self, item_id: int) -> bool:
+        """
+        检查ID是否重复，并将其记录到窗口中
+
+        参数:
+            item_id: 待检查的ID
+
+        返回:
+            确定重复时返回True；早于窗口的ID无法判断，返回False
+        """
+        if self._high is None:
+            self._high, self._bits = item_id, 1
+            return False
+
+        if item_id > self._high:
+            shift = item_id - self._high
+            self._bits = ((self._bits << shift) | 1) & self._mask if shift < self.size else 1
+            self._high = item_id
+            return False
+
+        offset = self._high - item_id
+        if offset >= self.size:
+            return False
+
+        bit = 1 << offset
+        if self._bits & bit:
+            return True
+        self._bits |= bit
+        return False
+
+    def discard(self, item_id: int):
+        """
+        从窗口中移除ID，使其再次出现时不被视为重复
+
+        参数:
+            item_id: 待移除的ID
+        """
+        if self._high is None:
+            return
+        offset = self._high - item_id
+        if 0 <= offset < self.size:
+            self._bits &= ~(1 << offset)
+
+class ChatIdDeduper:
+    """
+    按聊天划分的ID去重器
+
+    每个聊天维护一个 MonotonicIdWindow，聊天数量超过上限时淘汰最久未活跃的聊天
+    """
+    def __init__(self, window_size: int = 1024, max_chats: int = 10000):
+        """
+        初始化去重器
+
+        参数:
+            window_size: 每个聊天的窗口大小
+            max_chats: 同时追踪的最大聊天数
+        """
+        self.window_size = window_size
+        self.max_chats = max_chats
+        self._windows = OrderedDict()
+        self.duplicates = 0
+
+    def is_duplicate(self, chat_id: int, item_id: int) -> bool:
+        """
+        检查聊天中的ID是否重复，并记录该ID
+
+        参数:
+            chat_id: 聊天ID
+            item_id: 消息ID
+
+        返回:
+            是否重复
+        """
+        window = self._windows.get(chat_id)
+        if window is None:
+            window = MonotonicIdWindow(self.window_size)
+            self._windows[chat_id] = window
+            if len(self._windows) > self.max_chats:
+                self._windows.popitem(last=False)
+        else:
+            self._windows.move_to_end(chat_id)
+
+        if window.check_and_add(item_id):
+            self.duplicates += 1
+            return True
+        return False
+
+    def release(self, chat_id: int, item_id: int):
+        """
+        处理失败时释放ID，使重新投递的消息能够再次被处理
+
+        参数:
+            chat_id: 聊天ID
+            item_id: 消息ID
+        """
+        window = self._windows.get(chat_id)
+        if window is not None:
+            window.discard(item_id)
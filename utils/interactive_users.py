@@ -0,0 +1,79 @@
+"""
+交互中用户集合
+
+记录正在填写表单、等待确认或处于设置流程中的用户，普通群组成员的消息
+只需一次集合查询即可跳过表单和设置处理
+"""
+from typing import Any, Dict, Set
+
+from telegram import Update
+from telegram.ext import CallbackContext
+
+class InteractiveUsers:
+    """
+    交互中用户集合
+
+    每个用户按来源（如 'waiting_for'、'settings'）分别登记，
+    所有来源都结束后才移出集合
+    """
+    def __init__(self):
+        """初始化集合"""
+        self._sources: Dict[int, Set[str]] = {}
+
+    def __contains__(self, user_id: int) -> bool:
+        return user_id in self._sources
+
+    def __len__(self) -> int:
+        return len(self._sources)
+
+    def add(self, user_id: int, source: str):
+        """
+        登记用户
+
+        参数:
+            user_id: 用户ID
+            source: 交互来源
+        """
+        self._sources.setdefault(user_id, set()).add(source)
+
+    def discard(self, user_id: int, source: str):
+        """
+        移除用户的一个交互来源，没有其他来源时移出集合
+
+        参数:
+            user_id: 用户ID
+            source: 交互来源
+        """
+        sources = self._sources.get(user_id)
+        if sources is None:
+            return
+        sources.discard(source)
+        if not sources:
+            del self._sources[user_id]
+
+interactive_users = InteractiveUsers()
+
+def begin_input(update: Update, context: CallbackContext, value: Any, key: str = 'waiting_for'):
+    """
+    设置等待的输入并登记为交互中用户
+
+    参数:
+        update: 更新对象
+        context: 上下文对象
+        value: 等待的输入类型
+        key: user_data 中的键
+    """
+    context.user_data[key] = value
+    interactive_users.add(update.effective_user.id, key)
+
+def end_input(update: Update, context: CallbackContext, key: str = 'waiting_for'):
+    """
+    清除等待的输入并取消该来源的登记
+
+    参数:
+        update: 更新对象
+        context: 上下文对象
+        key: user_data 中的键
+    """
+    context.user_data.pop(key, None)
+    interactive_users.discard(update.effective_user.id, key)
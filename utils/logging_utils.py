@@ -0,0 +1,131 @@
+"""
+日志配置，提供非阻塞的队列日志、按日志器采样和每秒限流
+"""
+import atexit
+import logging
+import logging.handlers
+import queue
+import time
+from typing import Any, Dict, Optional
+
+from utils.metrics import metrics
+
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# 被采样或限流丢弃的日志数
+LOGS_SUPPRESSED = metrics.counter(
+    'bot_log_suppressed_total', '被采样或限流丢弃的日志数', ('logger', 'reason')
+)
+
+class HotPathFilter(logging.Filter):
+    """
+    热路径日志过滤器
+
+    按日志器名前缀匹配规则，对低于 WARNING 的日志进行采样（每N条保留1条）
+    和每秒限流；WARNING 及以上级别始终保留
+    """
+    def __init__(self, rules: Dict[str, Dict[str, Any]]):
+        """
+        初始化过滤器
+
+        参数:
+            rules: {日志器名前缀: {'sample': 保留比例(0-1], 'max_per_second': 每秒上限}}
+        """
+        super().__init__()
+        self.rules = rules
+        self._resolved = {}  # {日志器名: 规则或None}
+        self._seen = {}      # {日志器名: 已见条数}
+        self._window = {}    # {日志器名: [当前秒, 已放行条数]}
+
+    def _rule_for(self, name: str) -> Optional[Dict[str, Any]]:
+        """查找日志器对应的规则，取最长匹配前缀"""
+        if name not in self._resolved:
+            best = None
+            for prefix in self.rules:
+                if (name == prefix or name.startswith(prefix + '.')) and (best is None or len(prefix) > len(best)):
+                    best = prefix
+            self._resolved[name] = self.rules[best] if best else None
+        return self._resolved[name]
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        rule = self._rule_for(record.name)
+        if not rule:
+            return True
+
+        sample = rule.get('sample', 1.0)
+        if sample < 1.0:
+            seen = self._seen.get(record.name, 0)
+            self._seen[record.name] = seen + 1
+            if seen % max(1, round(1 / sample)):
+                LOGS_SUPPRESSED.inc(logger=record.name, reason='sample')
+                return False
+
+        budget = rule.get('max_per_second')
+        if budget is not None:
+            now = int(time.monotonic())
+            window = self._window.get(record.name)
+            if window is None or window[0] != now:
+                window = self._window[record.name] = [now, 0]
+            if window[1] >= budget:
+                LOGS_SUPPRESSED.inc(logger=record.name, reason='rate_limit')
+                return False
+            window[1] += 1
+        return True
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    队列日志处理器
+
+    调用方线程只做消息插值后入队，时间格式化、异常堆栈格式化和写入
+    都由监听线程完成
+    """
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+_listener = None
+
+def setup_logging(settings: Dict[str, Any]):
+    """
+    按配置初始化根日志器
+
+    参数:
+        settings: 日志设置，包含 profile、file 和 profiles
+    """
+    global _listener
+    profile = settings['profiles'].get(settings.get('profile'), {})
+
+    formatter = logging.Formatter(LOG_FORMAT)
+    handlers = [logging.StreamHandler()]
+    if settings.get('file'):
+        handlers.append(logging.FileHandler(settings['file'], encoding='utf-8'))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    if _listener:
+        _listener.stop()
+    root.setLevel(profile.get('level', 'INFO'))
+
+    queue_handler = DeferredQueueHandler(queue.SimpleQueue())
+    queue_handler.addFilter(HotPathFilter(profile.get('hot_loggers', {})))
+    root.addHandler(queue_handler)
+    _listener = logging.handlers.QueueListener(queue_handler.queue, *handlers, respect_handler_level=True)
+    _listener.start()
+
+    for name, level in profile.get('levels', {}).items():
+        logging.getLogger(name).setLevel(level)
+
+def shutdown_logging():
+    """停止监听线程，写出队列中剩余的日志"""
+    global _listener
+    if _listener:
+        _listener.stop()
+        _listener = None
+
+atexit.register(shutdown_logging)
@@ -0,0 +1,264 @@
+"""
+进程内指标注册表，以Prometheus文本格式导出
+"""
+import bisect
+import functools
+import logging
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 默认延迟分桶（秒）
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = '') -> str:
+    """格式化标签集合"""
+    parts = [
+        '{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in zip(names, values)
+    ]
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+def _format_value(value: float) -> str:
+    """格式化指标数值"""
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+class _Metric:
+    """指标基类"""
+    kind = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labels: Tuple[str, ...] = ()):
+        """
+        初始化指标
+
+        参数:
+            name: 指标名
+            documentation: 指标说明
+            labels: 标签名列表
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        """将标签字典转换为有序键"""
+        return tuple(str(labels.get(name, '')) for name in self.labels)
+
+    def render(self):
+        """生成该指标的导出行"""
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} {self.kind}"
+        yield from self._samples()
+
+    def _samples(self):
+        return iter(())
+
+class Counter(_Metric):
+    """只增计数器"""
+    kind = 'counter'
+
+    def __init__(self, name: str, documentation: str, labels: Tuple[str, ...] = ()):
+        super().__init__(name, documentation, labels)
+        self._values = {}
+
+    def inc(self, amount: float = 1, **labels):
+        """
+        增加计数
+
+        参数:
+            amount: 增量
+            labels: 标签值
+        """
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def get(self, **labels) -> float:
+        """获取当前计数"""
+        return self._values.get(self._key(labels), 0)
+
+    def _samples(self):
+        for key, value in sorted(self._values.items()):
+            yield f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}"
+
+class Gauge(_Metric):
+    """可增可减的瞬时值，可绑定回调在导出时取值"""
+    kind = 'gauge'
+
+    def __init__(self, name: str, documentation: str, labels: Tuple[str, ...] = ()):
+        super().__init__(name, documentation, labels)
+        self._values = {}
+        self._callbacks = {}
+
+    def set(self, value: float, **labels):
+        """设置当前值"""
+        self._values[self._key(labels)] = value
+
+    def set_function(self, func: Callable[[], float], **labels):
+        """
+        绑定取值回调，导出时调用
+
+        参数:
+            func: 返回当前值的无参函数
+            labels: 标签值
+        """
+        self._callbacks[self._key(labels)] = func
+
+    def _samples(self):
+        values = dict(self._values)
+        for key, func in self._callbacks.items():
+            try:
+                values[key] = func()
+            except Exception as e:
+                logger.debug(f"读取指标 {self.name} 失败: {e}")
+        for key, value in sorted(values.items()):
+            yield f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}"
+
+class Histogram(_Metric):
+    """固定分桶直方图"""
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labels: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # {标签键: [各桶计数..., 溢出桶计数, 总数, 总和]}
+
+    def observe(self, value: float, **labels):
+        """
+        记录一次观测值
+
+        参数:
+            value: 观测值（秒）
+            labels: 标签值
+        """
+        key = self._key(labels)
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = [0] * (len(self.buckets) + 3)
+        series[bisect.bisect_left(self.buckets, value)] += 1
+        series[-2] += 1
+        series[-1] += value
+
+    def time(self, **labels):
+        """返回记录代码块耗时的上下文管理器"""
+        return _Timer(self, labels)
+
+    def _samples(self):
+        for key, series in sorted(self._series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), series):
+                cumulative += count
+                le = 'le="{}"'.format(_format_value(float(bound)))
+                yield f"{self.name}_bucket{_format_labels(self.labels, key, le)} {cumulative}"
+            yield f"{self.name}_count{_format_labels(self.labels, key)} {series[-2]}"
+            yield f"{self.name}_sum{_format_labels(self.labels, key)} {_format_value(series[-1])}"
+
+class _Timer:
+    """直方图计时上下文管理器"""
+    def __init__(self, histogram: Histogram, labels: Dict[str, str]):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+        return False
+
+class MetricsRegistry:
+    """
+    指标注册表
+
+    同名指标只注册一次，重复注册返回已有实例
+    """
+    def __init__(self):
+        """初始化注册表"""
+        self._metrics: Dict[str, _Metric] = {}
+
+    def _register(self, cls, name: str, documentation: str, labels, **kwargs):
+        metric = self._metrics.get(name)
+        if metric is None:
+            metric = self._metrics[name] = cls(name, documentation, tuple(labels), **kwargs)
+        elif not isinstance(metric, cls):
+            raise ValueError(f"指标 {name} 已注册为 {metric.kind}")
+        return metric
+
+    def counter(self, name: str, documentation: str, labels=()) -> Counter:
+        """获取或注册计数器"""
+        return self._register(Counter, name, documentation, labels)
+
+    def gauge(self, name: str, documentation: str, labels=()) -> Gauge:
+        """获取或注册瞬时值"""
+        return self._register(Gauge, name, documentation, labels)
+
+    def histogram(self, name: str, documentation: str, labels=(),
+                  buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        """获取或注册直方图"""
+        return self._register(Histogram, name, documentation, labels, buckets=buckets)
+
+    def get(self, name: str) -> Optional[_Metric]:
+        """按名称获取指标"""
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        """
+        以Prometheus文本格式导出所有指标
+
+        返回:
+            导出文本
+        """
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+# 全局注册表
+metrics = MetricsRegistry()
+
+# 通用指标
+HANDLER_LATENCY = metrics.histogram(
+    'bot_handler_duration_seconds', '处理器耗时', ('kind', 'name')
+)
+CACHE_REQUESTS = metrics.counter(
+    'bot_cache_requests_total', '缓存访问次数', ('cache', 'result')
+)
+
+def record_cache(cache: str, hit: bool):
+    """
+    记录一次缓存访问
+
+    参数:
+        cache: 缓存名称
+        hit: 是否命中
+    """
+    CACHE_REQUESTS.inc(cache=cache, result='hit' if hit else 'miss')
+
+def timed_handler(kind: str, name: str, func: Callable) -> Callable:
+    """
+    包装异步处理函数，记录其耗时
+
+    参数:
+        kind: 处理器类型，如 command、callback
+        name: 处理器名称
+        func: 异步处理函数
+
+    返回:
+        包装后的函数
+    """
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await func(*args, **kwargs)
+        finally:
+            HANDLER_LATENCY.observe(time.perf_counter() - start, kind=kind, name=name)
+    return wrapper
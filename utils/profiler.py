@@ -0,0 +1,168 @@
+"""
+运行时采样分析，用于线上诊断事件循环的耗时分布
+
+采样线程按固定间隔读取事件循环线程的调用栈，结果为折叠栈格式
+（每行 "帧;帧;帧 次数"），可直接交给 flamegraph.pl 或 speedscope 生成火焰图
+"""
+import asyncio
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Tuple
+
+# 同一时间只允许一个采样任务，占用标记在检查时同步设置，两次请求之间没有 await 间隙
+_profile_active = False
+
+def _frame_label(frame) -> str:
+    """生成帧的显示名称: 函数名 (文件:首行号)"""
+    code = frame.f_code
+    name = getattr(code, 'co_qualname', code.co_name)
+    filename = os.path.join(*code.co_filename.replace('\\', '/').split('/')[-2:])
+    return f"{name} ({filename}:{code.co_firstlineno})"
+
+class SamplingProfiler:
+    """
+    采样分析器
+
+    在独立线程中定期采集目标线程的调用栈，不需要在被分析的代码中插桩
+    """
+    def __init__(self, thread_id: int, interval: float = 0.005, max_depth: int = 128):
+        """
+        初始化采样分析器
+
+        参数:
+            thread_id: 被采样的线程ID
+            interval: 采样间隔（秒）
+            max_depth: 每个调用栈保留的最大帧数
+        """
+        self.thread_id = thread_id
+        self.interval = interval
+        self.max_depth = max_depth
+        self.stacks = Counter()
+        self.samples = 0
+        self.elapsed = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self):
+        """采集一次目标线程的调用栈"""
+        frame = sys._current_frames().get(self.thread_id)
+        if frame is None:
+            return
+        stack = []
+        while frame is not None and len(stack) < self.max_depth:
+            stack.append(_frame_label(frame))
+            frame = frame.f_back
+        stack.reverse()
+        self.stacks[';'.join(stack)] += 1
+        self.samples += 1
+
+    def _run(self):
+        """采样线程主循环"""
+        start = time.perf_counter()
+        while not self._stop.wait(self.interval):
+            self._sample()
+        self.elapsed = time.perf_counter() - start
+
+    def start(self):
+        """开始采样"""
+        self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """停止采样并等待采样线程退出"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+
+    def collapsed(self) -> str:
+        """
+        导出折叠栈
+
+        返回:
+            每行 "帧;帧;帧 次数"，按次数降序
+        """
+        return '\n'.join(f"{stack} {count}" for stack, count in self.stacks.most_common()) + '\n'
+
+    def top_functions(self, limit: int = 10) -> List[Tuple[str, int]]:
+        """
+        按自身耗时（位于栈顶的采样数）排序的函数
+
+        参数:
+            limit: 返回的数量
+
+        返回:
+            [(帧名称, 采样数)]
+        """
+        leaves = Counter()
+        for stack, count in self.stacks.items():
+            leaves[stack.rsplit(';', 1)[-1]] += count
+        return leaves.most_common(limit)
+
+def task_counts() -> Dict[str, int]:
+    """
+    按协程名统计当前事件循环中未完成的任务数
+
+    返回:
+        {协程名: 任务数}，按数量降序
+    """
+    counts = Counter()
+    for task in asyncio.all_tasks():
+        coro = task.get_coro()
+        counts[getattr(coro, '__qualname__', None) or task.get_name()] += 1
+    return dict(counts.most_common())
+
+def profile_in_progress() -> bool:
+    """是否已有采样任务在运行"""
+    return _profile_active
+
+def reserve_profile() -> bool:
+    """
+    同步占用采样，供在后台任务中采样的调用方在创建任务前调用
+
+    返回:
+        是否占用成功，已有采样在进行时返回False
+    """
+    global _profile_active
+    if _profile_active:
+        return False
+    _profile_active = True
+    return True
+
+def release_profile():
+    """释放采样占用"""
+    global _profile_active
+    _profile_active = False
+
+async def profile_event_loop(duration: float, interval: float = 0.005, reserved: bool = False) -> SamplingProfiler:
+    """
+    对当前事件循环线程采样指定时长
+
+    采样期间事件循环照常处理请求
+
+    参数:
+        duration: 采样时长（秒）
+        interval: 采样间隔（秒）
+        reserved: 调用方是否已通过 reserve_profile 占用采样，此时由调用方负责释放
+
+    返回:
+        采样完成的分析器
+
+    抛出:
+        RuntimeError: 已有采样在进行
+    """
+    if not reserved and not reserve_profile():
+        raise RuntimeError("已有采样正在进行")
+    try:
+        profiler = SamplingProfiler(threading.get_ident(), interval)
+        profiler.start()
+        try:
+            await asyncio.sleep(duration)
+        finally:
+            profiler.stop()
+        return profiler
+    finally:
+        if not reserved:
+            release_profile()